@@ -0,0 +1,458 @@
+"""
+Single-pass aggregation engine for the trip metrics in analyzer.py.
+
+Every metric of analyzer.tripsdata_analysis is computed from the integer
+codes of the already-loaded (categorical) columns with np.bincount, instead
+of one value_counts / groupby scan of the DataFrame per metric. Completion
+rate and trips per user come from utils.raw_trips_summary, which is filled
+while the raw trips are loaded, so trips.csv is not read a second time.
+
+AnalyticsState keeps the same aggregates in a persistent, mergeable form,
+so the nightly job only has to absorb the new day of trips.
+"""
+
+import calendar
+import os
+
+import numpy as np
+import pandas as pd
+
+from sketches import DurationQuantiles, KLLSketch
+
+
+def encode_column(col: pd.Series) -> tuple[np.ndarray, pd.Index]:
+    """Integer codes and labels of a column.
+
+    Categoricals are used as they are; other columns are factorized once.
+    """
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        return col.cat.codes.to_numpy(), col.cat.categories
+    codes, uniques = pd.factorize(col, sort=True)
+    return codes, pd.Index(uniques)
+
+
+def encode_pair(first: pd.Series, second: pd.Series) -> tuple[np.ndarray, np.ndarray, pd.Index]:
+    """Codes of two columns over one shared set of labels (e.g. start/end station)."""
+    if (
+        isinstance(first.dtype, pd.CategoricalDtype)
+        and isinstance(second.dtype, pd.CategoricalDtype)
+        and first.cat.categories.equals(second.cat.categories)
+    ):
+        return first.cat.codes.to_numpy(), second.cat.codes.to_numpy(), first.cat.categories
+    both = pd.concat([first.astype("str"), second.astype("str")], ignore_index=True)
+    codes, uniques = pd.factorize(both, sort=True)
+    return codes[: len(first)], codes[len(first):], pd.Index(uniques)
+
+
+def top_codes(counts: np.ndarray, n: int) -> np.ndarray:
+    """Positions of the n largest non-zero counts, ties kept in code order."""
+    order = np.argsort(-counts, kind="stable")[:n]
+    return order[counts[order] > 0]
+
+
+def count_pairs(first: np.ndarray, second: np.ndarray, n_labels: int) -> tuple[np.ndarray, np.ndarray]:
+    """Count (first, second) code pairs.
+
+    Returns:
+        (keys, counts) with key = first * n_labels + second, only for pairs
+        that occur. A dense bincount is used while n_labels² stays small,
+        np.unique otherwise, so large networks never allocate n² counters.
+    """
+    keys = first.astype(np.int64) * n_labels + second
+    if n_labels * n_labels <= max(len(keys), 1 << 20):
+        counts = np.bincount(keys, minlength=n_labels * n_labels)
+        present = np.flatnonzero(counts)
+        return present, counts[present]
+    return np.unique(keys, return_counts=True)
+
+
+def top_routes(start_codes: np.ndarray, end_codes: np.ndarray, stations: pd.Index, n: int) -> pd.Series:
+    """n busiest (start, end) routes from station codes, ties in station order."""
+    route_keys, route_counts = count_pairs(start_codes, end_codes, len(stations))
+    top = top_codes(route_counts, n)
+    origin, destination = np.divmod(route_keys[top], len(stations))
+    return pd.Series(
+        route_counts[top].astype(np.int64),
+        index=pd.MultiIndex.from_arrays(
+            [stations[origin], stations[destination]], names=["start_station_id", "end_station_id"]
+        ),
+    )
+
+
+def trip_metrics(df: pd.DataFrame, raw_summary: dict, quartiles=None, od=None) -> dict:
+    """Compute all trip metrics of analyzer.tripsdata_analysis in one go.
+
+    Args:
+        df: cleaned trips (compact schema or plain columns).
+        raw_summary: utils.summarize_raw_trips of the raw trips.
+        quartiles: (Q1, Q3) of duration_minutes for the IQR outlier bounds,
+            e.g. from a quantile sketch; computed exactly from df if None.
+        od: od_matrix.ODMatrix of df; if given the top routes are read
+            from it instead of being counted again.
+
+    Returns:
+        Dict with the same keys and value types as tripsdata_analysis.
+    """
+    total_trips = len(df)
+    distance = df["distance_km"].to_numpy(dtype=np.float64)
+    duration = df["duration_minutes"].to_numpy(dtype=np.float64)
+    start = df["start_time"].to_numpy(dtype="datetime64[us]")
+    end = df["end_time"].to_numpy(dtype="datetime64[us]")
+
+    # totals
+    total_distance = round(distance.sum(), 2)
+    elapsed_us = (end - start).astype(np.int64)
+    average_duration = round(elapsed_us.mean() / 60e6, 2) if total_trips else np.nan
+
+    # start / end stations share labels, so one encode serves both and routes
+    start_codes, end_codes, stations = encode_pair(df["start_station_id"], df["end_station_id"])
+    start_counts = np.bincount(start_codes, minlength=len(stations))
+    end_counts = np.bincount(end_codes, minlength=len(stations))
+    top_start_stations = stations[top_codes(start_counts, 10)].tolist()
+    top_end_stations = stations[top_codes(end_counts, 10)].tolist()
+
+    # peak hours, weekdays and months; rows without a start_time are not counted
+    timed = start[~np.isnat(start)]
+
+    # peak hours
+    hours = timed.astype("datetime64[h]").astype(np.int64) % 24
+    hour_counts = np.bincount(hours, minlength=24)
+    peak = top_codes(hour_counts, 10)
+    peak_usage_hours = pd.DataFrame({"start_time": peak.astype(np.int32), "counts": hour_counts[peak]})
+
+    # trips per weekday and per month
+    # 1970-01-01 was a Thursday, shift so Monday == 0 like dt.weekday
+    weekday_counts = np.bincount((timed.astype("datetime64[D]").astype(np.int64) + 3) % 7, minlength=7)
+    trips_by_weekday = pd.Series(weekday_counts, index=pd.Index(range(7), name="weekday"), name="counts")
+    months = timed.astype("datetime64[M]").astype(np.int64)
+    first_month = months.min() if len(months) else 0
+    month_counts = np.bincount(months - first_month)
+    observed_months = np.flatnonzero(month_counts)
+    monthly_trips = pd.Series(
+        month_counts[observed_months],
+        index=pd.Index((observed_months + first_month).astype("datetime64[M]").astype("str"), name="year_month"),
+        name="trip_count",
+    )
+
+    # average distance by user type
+    type_codes, user_types = encode_column(df["user_type"])
+    type_counts = np.bincount(type_codes, minlength=len(user_types))
+    type_distance = np.bincount(type_codes, weights=distance, minlength=len(user_types))
+    observed = type_counts > 0
+    average_distance_by_user_type = pd.Series(
+        np.round(type_distance[observed] / type_counts[observed], 2),
+        index=pd.Index(user_types[observed], name="user_type"),
+        name="distance_km",
+    )
+
+    # bike utilization
+    bike_codes, bikes = encode_column(df["bike_id"])
+    n_bikes = np.count_nonzero(np.bincount(bike_codes, minlength=len(bikes)))
+    avg_usage_hours_per_bike = (duration.sum() / 60) / n_bikes if n_bikes else np.nan
+    bike_utilization_rate = np.round(avg_usage_hours_per_bike / 24 * 100, 2)
+
+    # most active users
+    user_codes, users = encode_column(df["user_id"])
+    user_counts = np.bincount(user_codes, minlength=len(users))
+    active_users_top_15 = users[top_codes(user_counts, 15)].tolist()
+
+    # top routes
+    if od is not None:
+        station_to_station_top10 = od.top_routes(10)
+    else:
+        station_to_station_top10 = top_routes(start_codes, end_codes, stations, 10)
+
+    # completion rate and trips per user, from the raw trips
+    status_counts = raw_summary["status_counts"]
+    total_rows = raw_summary["total_rows"]
+    trips_cancelled_rate = np.round(status_counts.get("cancelled", 0) / total_rows * 100, 2)
+    trips_completed_rate = np.round(status_counts.get("completed", 0) / total_rows * 100, 2)
+    avg_trips = pd.Series(raw_summary["unique_users"], name="user_id", dtype=np.int64).rename_axis("user_type")
+    avg_trips_casual = np.round(raw_summary["trips"]["casual"] / avg_trips["casual"], 2)
+    avg_trips_member = np.round(raw_summary["trips"]["member"] / avg_trips["member"], 2)
+
+    # IQR outliers, both quartiles from one partition of the column
+    if quartiles is None:
+        quartiles = np.percentile(duration, [25, 75]) if total_trips else (np.nan, np.nan)
+    Q1, Q3 = quartiles
+    lower_bound, upper_bound = iqr_bounds(Q1, Q3)
+    outliers_duration = df[(duration < lower_bound) | (duration > upper_bound)]
+
+    return {
+        "total_trips": total_trips,
+        "total_distance": total_distance,
+        "average_duration": average_duration,
+        "top_start_stations": top_start_stations,
+        "top_end_stations": top_end_stations,
+        "peak_usage_hours": peak_usage_hours,
+        "trips_by_weekday": trips_by_weekday,
+        "busiest_weekday": calendar.day_name[int(np.argmax(weekday_counts))],
+        "monthly_trips": monthly_trips,
+        "average_distance_by_user_type": average_distance_by_user_type,
+        "average_distance_casual": average_distance_by_user_type.get("casual"),
+        "average_distance_member": average_distance_by_user_type.get("member"),
+        "bike_utilization_rate": bike_utilization_rate,
+        "active_users_top_15": active_users_top_15,
+        "station_to_station_top10": station_to_station_top10,
+        "trips_cancelled_rate": trips_cancelled_rate,
+        "trips_completed_rate": trips_completed_rate,
+        "avg_trips": avg_trips,
+        "avg_trips_casual": avg_trips_casual,
+        "avg_trips_member": avg_trips_member,
+        "outliers_duration": outliers_duration,
+    }
+
+
+def iqr_bounds(Q1: float, Q3: float) -> tuple[float, float]:
+    """Lower and upper outlier bounds of the 1.5 * IQR rule."""
+    IQR = round(Q3 - Q1, 2)
+    return Q1 - 1.5 * IQR, Q3 + 1.5 * IQR
+
+
+# ---------------------------------------------------------------------------
+# Incremental, mergeable state
+# ---------------------------------------------------------------------------
+
+def _add_counts(a: pd.Series, b: pd.Series) -> pd.Series:
+    """Sum two label-indexed counters, keys present in either side."""
+    if a.empty:
+        return b.copy()
+    if b.empty:
+        return a.copy()
+    return a.add(b, fill_value=0).astype(np.result_type(a.dtype, b.dtype))
+
+
+def _count_labels(col: pd.Series) -> pd.Series:
+    """value_counts keyed by plain string labels, only observed values."""
+    if not isinstance(col.dtype, pd.CategoricalDtype):
+        col = col.astype("str")
+    counts = col.value_counts(sort=False)
+    counts = counts[counts > 0]
+    counts.index = counts.index.astype("str")
+    return counts.astype(np.int64).sort_index()
+
+
+def _top_labels(counts: pd.Series, n: int) -> pd.Series:
+    """n largest counts, ties in label order (as top_codes does)."""
+    return counts.sort_index().sort_values(ascending=False, kind="stable").head(n)
+
+
+class AnalyticsState:
+    """Persistent aggregates that absorb new batches without rescanning history.
+
+    Every field is a count, a sum, a label-indexed counter, a fixed-size
+    histogram or a set of user labels, so absorbing a batch and merging two
+    states built on separate partitions are both plain additions / unions.
+    results() turns the state into the data_analysis_results keys.
+    """
+
+    COUNTERS = (
+        "start_stations", "end_stations", "users", "bikes", "months",
+        "user_type_trips", "user_type_distance",
+        "raw_status", "raw_user_type_trips",
+        "maintenance_cost", "maintenance_types", "maintenance_bikes",
+    )
+
+    def __init__(self):
+        self.n_trips = 0
+        self.total_distance = 0.0
+        self.total_duration = 0.0
+        self.total_elapsed_us = 0
+        self.raw_rows = 0
+        self.n_maintenance = 0
+        self.hours = np.zeros(24, dtype=np.int64)
+        self.weekdays = np.zeros(7, dtype=np.int64)
+        for name in self.COUNTERS:
+            setattr(self, name, pd.Series(dtype=np.int64))
+        self.routes = pd.Series(
+            dtype=np.int64,
+            index=pd.MultiIndex.from_arrays([[], []], names=["start_station_id", "end_station_id"]),
+        )
+        # unique user labels per user_type, over the raw trips
+        self.raw_users = {}
+        self.durations = DurationQuantiles()
+
+    # -------- absorbing batches --------
+    def add_trips(self, df: pd.DataFrame, raw_df: pd.DataFrame | None = None) -> "AnalyticsState":
+        """Absorb a batch of cleaned trips and, optionally, the raw rows it came from."""
+        if len(df):
+            distance = df["distance_km"].to_numpy(dtype=np.float64)
+            start = df["start_time"].to_numpy(dtype="datetime64[us]")
+            end = df["end_time"].to_numpy(dtype="datetime64[us]")
+
+            self.n_trips += len(df)
+            self.total_distance += distance.sum()
+            self.total_duration += df["duration_minutes"].to_numpy(dtype=np.float64).sum()
+            self.total_elapsed_us += int((end - start).astype(np.int64).sum())
+
+            # rows without a start_time are left out of the hour / weekday / month counters
+            timed = start[~np.isnat(start)]
+            self.hours += np.bincount(timed.astype("datetime64[h]").astype(np.int64) % 24, minlength=24)
+            # 1970-01-01 was a Thursday, shift so Monday == 0 like dt.weekday
+            self.weekdays += np.bincount((timed.astype("datetime64[D]").astype(np.int64) + 3) % 7, minlength=7)
+
+            self.start_stations = _add_counts(self.start_stations, _count_labels(df["start_station_id"]))
+            self.end_stations = _add_counts(self.end_stations, _count_labels(df["end_station_id"]))
+            self.users = _add_counts(self.users, _count_labels(df["user_id"]))
+            self.bikes = _add_counts(self.bikes, _count_labels(df["bike_id"]))
+            self.months = _add_counts(
+                self.months, _count_labels(pd.Series(timed.astype("datetime64[M]").astype("str")))
+            )
+            self.user_type_trips = _add_counts(self.user_type_trips, _count_labels(df["user_type"]))
+            type_distance = pd.Series(distance).groupby(df["user_type"].astype("str").to_numpy()).sum()
+            self.user_type_distance = _add_counts(self.user_type_distance, type_distance)
+
+            routes = df.groupby(["start_station_id", "end_station_id"], observed=True).size().astype(np.int64)
+            routes.index = pd.MultiIndex.from_arrays(
+                [routes.index.get_level_values(i).astype("str") for i in range(2)],
+                names=["start_station_id", "end_station_id"],
+            )
+            self.routes = _add_counts(self.routes, routes)
+            self.durations.update(df)
+
+        if raw_df is not None:
+            self.raw_rows += len(raw_df)
+            self.raw_status = _add_counts(self.raw_status, _count_labels(raw_df["status"].dropna()))
+            typed = raw_df.dropna(subset=["user_type", "user_id"])
+            self.raw_user_type_trips = _add_counts(self.raw_user_type_trips, _count_labels(typed["user_type"]))
+            for user_type, users in typed.groupby(typed["user_type"].astype("str"))["user_id"]:
+                new_users = users.astype("str").unique()
+                self.raw_users[user_type] = np.union1d(self.raw_users.get(user_type, np.array([], dtype=str)), new_users)
+        return self
+
+    def add_maintenance(self, df: pd.DataFrame) -> "AnalyticsState":
+        """Absorb a batch of maintenance records."""
+        self.n_maintenance += len(df)
+        cost = df["cost"].astype("float64").groupby(df["bike_type"].astype("str").to_numpy()).sum()
+        self.maintenance_cost = _add_counts(self.maintenance_cost, cost)
+        self.maintenance_types = _add_counts(self.maintenance_types, _count_labels(df["maintenance_type"]))
+        self.maintenance_bikes = _add_counts(self.maintenance_bikes, _count_labels(df["bike_id"]))
+        return self
+
+    def merge(self, other: "AnalyticsState") -> "AnalyticsState":
+        """Fold another state (e.g. built on a separate partition) into this one."""
+        for name in ("n_trips", "total_distance", "total_duration", "total_elapsed_us", "raw_rows", "n_maintenance"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.hours = self.hours + other.hours
+        self.weekdays = self.weekdays + other.weekdays
+        for name in self.COUNTERS + ("routes",):
+            setattr(self, name, _add_counts(getattr(self, name), getattr(other, name)))
+        for user_type, users in other.raw_users.items():
+            self.raw_users[user_type] = np.union1d(self.raw_users.get(user_type, np.array([], dtype=str)), users)
+        self.durations.merge(other.durations)
+        return self
+
+    # -------- report --------
+    def results(self) -> dict:
+        """The data_analysis_results keys that aggregates can answer.
+
+        outliers_duration needs the individual rows and is not part of the
+        state; its IQR bounds are given as outlier_bounds from the duration
+        sketch. Everything else matches trip_metrics / maintenance_data_analysis.
+        """
+        results = {}
+        if self.n_trips:
+            peak = np.argsort(-self.hours, kind="stable")[:10]
+            peak = peak[self.hours[peak] > 0]
+            average_distance_by_user_type = (
+                (self.user_type_distance / self.user_type_trips).round(2).rename_axis("user_type").rename("distance_km")
+            )
+            n_bikes = len(self.bikes)
+            results.update({
+                "total_trips": self.n_trips,
+                "total_distance": round(self.total_distance, 2),
+                "average_duration": round(self.total_elapsed_us / self.n_trips / 60e6, 2),
+                "top_start_stations": _top_labels(self.start_stations, 10).index.tolist(),
+                "top_end_stations": _top_labels(self.end_stations, 10).index.tolist(),
+                "peak_usage_hours": pd.DataFrame({"start_time": peak.astype(np.int32), "counts": self.hours[peak]}),
+                "trips_by_weekday": pd.Series(self.weekdays, index=pd.Index(range(7), name="weekday"), name="counts"),
+                "busiest_weekday": calendar.day_name[int(np.argmax(self.weekdays))],
+                "monthly_trips": self.months.sort_index().rename_axis("year_month").rename("trip_count"),
+                "average_distance_by_user_type": average_distance_by_user_type,
+                "average_distance_casual": average_distance_by_user_type.get("casual"),
+                "average_distance_member": average_distance_by_user_type.get("member"),
+                "bike_utilization_rate": np.round((self.total_duration / 60) / n_bikes / 24 * 100, 2),
+                "active_users_top_15": _top_labels(self.users, 15).index.tolist(),
+                "station_to_station_top10": _top_labels(self.routes, 10),
+                "duration_quantiles": self.durations.summary(),
+                "outlier_bounds": iqr_bounds(*self.durations.quantiles(("all", "all"), (0.25, 0.75))),
+            })
+        if self.raw_rows:
+            avg_trips = pd.Series(
+                {k: len(v) for k, v in sorted(self.raw_users.items())}, name="user_id", dtype=np.int64
+            ).rename_axis("user_type")
+            per_user = (self.raw_user_type_trips / avg_trips).round(2)
+            results.update({
+                "trips_cancelled_rate": np.round(self.raw_status.get("cancelled", 0) / self.raw_rows * 100, 2),
+                "trips_completed_rate": np.round(self.raw_status.get("completed", 0) / self.raw_rows * 100, 2),
+                "avg_trips": avg_trips,
+                "avg_trips_casual": per_user.get("casual"),
+                "avg_trips_member": per_user.get("member"),
+            })
+        if self.n_maintenance:
+            maintenance_frequency = _top_labels(self.maintenance_types, len(self.maintenance_types))
+            maintenance_cost = self.maintenance_cost.round(2)
+            results.update({
+                "maintenance_cost_classic": maintenance_cost.get("classic"),
+                "maintenance_cost_electric": maintenance_cost.get("electric"),
+                "maintenance_frequency": maintenance_frequency.rename_axis("maintenance_type").rename("count"),
+                "highest_maintenance_frequency": maintenance_frequency.index[0],
+                "bikes_most_maintained": _top_labels(self.maintenance_bikes, 10).index.tolist(),
+            })
+        return results
+
+    # -------- persistence --------
+    def save(self, path: str) -> None:
+        """Write the state to a .npz file (no pickling)."""
+        arrays = {
+            "scalars": np.array([self.n_trips, self.total_distance, self.total_duration,
+                                 self.total_elapsed_us, self.raw_rows, self.n_maintenance], dtype=np.float64),
+            "hours": self.hours,
+            "weekdays": self.weekdays,
+            "routes_start": np.array(self.routes.index.get_level_values(0), dtype=str),
+            "routes_end": np.array(self.routes.index.get_level_values(1), dtype=str),
+            "routes_values": self.routes.to_numpy(),
+        }
+        for name in self.COUNTERS:
+            counter = getattr(self, name)
+            arrays[f"{name}_keys"] = np.array(counter.index, dtype=str)
+            arrays[f"{name}_values"] = counter.to_numpy()
+        for user_type, users in self.raw_users.items():
+            arrays[f"users__{user_type}"] = np.asarray(users, dtype=str)
+        for (group, value), sketch in self.durations.sketches.items():
+            arrays.update(sketch.to_arrays(f"durations__{group}__{value}"))
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> "AnalyticsState":
+        """Read a state written by save(); a missing file gives an empty state."""
+        state = cls()
+        if not os.path.exists(path):
+            return state
+        with np.load(path, allow_pickle=False) as arrays:
+            n_trips, total_distance, total_duration, total_elapsed_us, raw_rows, n_maintenance = arrays["scalars"]
+            state.n_trips, state.raw_rows, state.n_maintenance = int(n_trips), int(raw_rows), int(n_maintenance)
+            state.total_distance, state.total_duration = float(total_distance), float(total_duration)
+            state.total_elapsed_us = int(total_elapsed_us)
+            state.hours = arrays["hours"]
+            state.weekdays = arrays["weekdays"]
+            state.routes = pd.Series(
+                arrays["routes_values"],
+                index=pd.MultiIndex.from_arrays(
+                    [arrays["routes_start"], arrays["routes_end"]], names=["start_station_id", "end_station_id"]
+                ),
+            )
+            for name in cls.COUNTERS:
+                setattr(state, name, pd.Series(arrays[f"{name}_values"], index=arrays[f"{name}_keys"]))
+            for key in arrays.files:
+                if key.startswith("users__"):
+                    state.raw_users[key[len("users__"):]] = arrays[key]
+                elif key.startswith("durations__") and key.endswith("__meta"):
+                    prefix = key[: -len("__meta")]
+                    _, group, value = prefix.split("__")
+                    state.durations.sketches[(group, value)] = KLLSketch.from_arrays(arrays, prefix)
+        return state
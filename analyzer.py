@@ -1,6 +1,15 @@
 import pandas as pd
 import os
 
+import aggregation
+import cube
+import od_matrix
+import report
+import sketches
+import utilization
+import utils
+from instrumentation import traced
+
 '''
 1. Total number of trips, total distance traveled, and average trip duration
 2. What are the top 10 most popular start stations and end stations?
@@ -20,101 +29,75 @@ import os
 
 data_analysis_results = {}
 
-def tripsdata_analysis(df) -> dict:
-    # Total number of trips, total distance traveled, and average trip duration
-    # total_seconds() 把时间转成秒数，float
-    total_trips = len(df)
-    total_distance = df["distance_km"].sum()
-    average_duration = ((df["end_time"] - df["start_time"]).mean().total_seconds())/60
-    average_duration = round(average_duration,2)
-
-    #  top 10 most popular start stations and end stations
-    # value_counts(ascending=True) 总结出现的次数，默认从高到低排列，ascending=True升序排列,这里的index 是 user_id， values = counts，取值要index
-    top_start_stations = df["start_station_id"].value_counts().head(10).index.tolist()
-    top_end_stations = df["end_station_id"].value_counts().head(10).index.tolist()
-
-    # What are the peak usage hours during the day? -> dataframe series
-    # .size() 可以在这里理解成groupby的count方法,第二列是出现的次数，按字母排序，sort_values 的默认从小到大排序，ascending=False 从大到小
-    peak_df = df.groupby(df["start_time"].dt.hour).size().sort_values(ascending=False).head(10)
-    peak_usage_hours = peak_df.reset_index(name = "counts")
-
-    # What is the average trip distance by user type (casual vs. member)?
-    # casual    7.52
-    # member    7.79
-    average_distance_by_user_type = df.groupby("user_type")["distance_km"].mean().round(2)
-    average_distance_casual = average_distance_by_user_type.loc["casual"]
-    average_distance_member = average_distance_by_user_type.loc["member"]   
-
-    # the bike utilization rate (percentage of time bikes are in use vs. available)
-    # 一辆自行车，一天24小时的时间，如果用了7小时，那么剩下的17小时就是可用时间，时间利用率就是7/24 = 0.29
-    total_usage_minutes = df["duration_minutes"].sum()
-    avg_usage_hours_per_bike = (total_usage_minutes / 60) / df["bike_id"].nunique()
-    bike_utilization_rate = ((avg_usage_hours_per_bike / 24)*100).round(2)
-
-    # top 15 most active users by trip count?
-    active_users_top_15 = df["user_id"].value_counts().head(15).index.tolist()
-
-    # the most common station-to-station routes (top 10 origin–destination pairs)
-    station_to_station_top10 = df.groupby(["start_station_id","end_station_id"]).size().sort_values(ascending=False).head(10)
-
-    # trip completion rate (completed vs. cancelled trips)
-    # completed / all , cancelled / all -> pass auf, trips_data_all include nan and duplication
-    trips_data_all = pd.read_csv("data/trips.csv")
-    # return true, ture is 1, so it cann be sum
-    trips_cancelled_count = (trips_data_all["status"] == "cancelled").sum()
-    trips_completed_count = (trips_data_all["status"] == "completed").sum()
-    trips_cancelled_rate = (trips_cancelled_count / len(trips_data_all) * 100).round(2)
-    trips_completed_rate = (trips_completed_count / len(trips_data_all) * 100).round(2)
-    
-    # the average number of trips per user, segmented by user type?
-    total_trip = (trips_data_all.groupby("user_type")["user_id"].count())  # 每种 user_type 的总行程数
-    avg_trips = (trips_data_all.groupby("user_type")["user_id"].nunique())  # 每种 user_type 的独立用户数
-    avg_trips_casual = (total_trip["casual"]/avg_trips["casual"]).round(2) # 总casual骑行数 / casual 类里的独立用户数
-    avg_trips_member = (total_trip["member"]/avg_trips["member"]).round(2) # 总member骑行数 / member 类里的独立用户数
-
-    # outlier trips (unusually duration)
-    # 把duration 这列的数据按顺序排序，排在25%的某个数值，Q1就是这个数值，如果只用df["duration"].quantile(0.5)，只能检测中间数，不能显示宽度
-    Q1 = df["duration_minutes"].quantile(0.25)
-    Q3 = df["duration_minutes"].quantile(0.75)
-    IQR = Q3 - Q1
-    IQR = round(IQR,2)
-
-    #这个是固定的计算方法 Q1: 6.2,Q3: 33.7 ,lower_bound: -35.05,upper_bound: 74.95
-    lower_bound = Q1 - 1.5 * IQR
-    upper_bound = Q3 + 1.5 * IQR
-
-    # 找出异常行程 ，df[true] -> dataframe
-    outliers_duration = df[(df["duration_minutes"] < lower_bound) | (df["duration_minutes"] > upper_bound)]
-
-    data_analysis_results.update({
-        "total_trips": total_trips,
-        "total_distance": total_distance,
-        "average_duration": average_duration,
-        "top_start_stations": top_start_stations,
-        "top_end_stations": top_end_stations,
-        "peak_usage_hours": peak_usage_hours,
-        "average_distance_by_user_type":average_distance_by_user_type,
-        "average_distance_casual": average_distance_casual,
-        "average_distance_member": average_distance_member,
-        "bike_utilization_rate": bike_utilization_rate,
-        "active_users_top_15": active_users_top_15,
-        "station_to_station_top10":station_to_station_top10,
-        "trips_cancelled_rate":trips_cancelled_rate,
-        "trips_completed_rate" : trips_completed_rate,
-        "total_trips":total_trips,
-        "avg_trips":avg_trips,
-        "avg_trips_casual":avg_trips_casual,
-        "avg_trips_member":avg_trips_member,
-        "outliers_duration":outliers_duration # dataframe，first row，original dataframe index
+@traced("analyzer.tripsdata_analysis", rows="df")
+def tripsdata_analysis(df, raw_summary: dict | None = None, approx_top_k: int | None = None,
+                       chunk_rows: int = 1_000_000, duration_sketch=None, with_cube: bool = False,
+                       with_utilization: bool = False) -> dict:
+    """Compute the trip metrics (questions 1-8, 10-12, 14).
+
+    All metrics come from one pass over the encoded columns, see
+    aggregation.trip_metrics.
+
+    Args:
+        df: cleaned trips DataFrame.
+        raw_summary: utils.summarize_raw_trips of the raw trips, for the
+            completion rate and trips per user. Defaults to the summary
+            recorded when the data was loaded; only without one are the
+            three needed columns of trips.csv read.
+        approx_top_k: if set, top stations, users and routes come from
+            Space-Saving summaries of this capacity, fed chunk_rows rows at
+            a time, and their error bounds are stored under
+            "top_k_error_bounds".
+        duration_sketch: optional sketches.KLLSketch of duration_minutes
+            (e.g. built chunk by chunk); its quartiles set the IQR outlier
+            bounds instead of an exact quantile over df.
+        with_cube: also build a cube.TripCube of df for slice / roll-up
+            queries, stored under "trip_cube".
+        with_utilization: also sweep the busy intervals of every bike
+            (utilization.bike_utilization) for "fleet_utilization_rate",
+            "bike_utilization" and "hourly_utilization".
+    """
+    if raw_summary is None:
+        raw_summary = utils.raw_trips_summary
+    if not raw_summary:
+        raw_trips = utils.read_typed_csv(
+            utils.DATA_PATHS["trips"], utils.TRIPS_SCHEMA, usecols=["user_id", "user_type", "status"]
+        )
+        raw_summary = utils.summarize_raw_trips(raw_trips)
+
+    quartiles = None if duration_sketch is None else duration_sketch.quantile([0.25, 0.75])
+    # stations encoded once; routes by hour / weekday / user_type all read from it
+    od = od_matrix.ODMatrix.from_trips(df)
+    data_analysis_results.update(aggregation.trip_metrics(df, raw_summary, quartiles, od=od))
+    data_analysis_results["od_matrix"] = od
+    if utils.validation_summary:
+        data_analysis_results["validation_summary"] = dict(utils.validation_summary)
+
+    # the dense cube grows with months x stations, so only on request
+    if with_cube:
+        data_analysis_results["trip_cube"] = cube.TripCube.from_trips(df)
+    if approx_top_k:
+        chunks = (df.iloc[i:i + chunk_rows] for i in range(0, len(df), chunk_rows))
+        data_analysis_results.update(sketches.trip_heavy_hitters(chunks, approx_top_k).results())
+
+    # busy-time utilization over the observed period, overlapping trips merged;
+    # the interval sweep costs several times the metrics pass, so only on request
+    if with_utilization:
+        usage = utilization.bike_utilization(df)
+        data_analysis_results.update({
+            "fleet_utilization_rate": round(usage["fleet_utilization"] * 100, 2),
+            "bike_utilization": usage["per_bike"],
+            "hourly_utilization": usage["curve"],
         })
-    
     return data_analysis_results
 
 
 
+@traced("analyzer.maintenance_data_analysis", rows="df")
 def maintenance_data_analysis(df):
     # total maintenance cost per bike type (classic vs. electric)
-    maintenance_cost = round(df.groupby("bike_type")["cost"].sum(),2)
+    # sum in float64, cost is stored as float32 by the compact schema
+    maintenance_cost = round(df["cost"].astype("float64").groupby(df["bike_type"], observed=True).sum(),2)
     maintenance_cost_classic = maintenance_cost.loc["classic"]
     maintenance_cost_electric = maintenance_cost.loc["electric"]
 
@@ -133,80 +116,117 @@ def maintenance_data_analysis(df):
 
     return data_analysis_results
 
-def data_analysis_report(analysis_result: dict, filename="output/summary_report.txt"):
+@traced("analyzer.incremental_analysis", rows="trips")
+def incremental_analysis(state_path: str = "output/analytics_state.npz", trips=None, raw_trips=None, maintenance=None) -> dict:
+    """Absorb a new batch into the persisted AnalyticsState and refresh the results.
+
+    Only the new batch is scanned; the history lives in the state file.
+
+    Args:
+        state_path: .npz file of the AnalyticsState, created on first use.
+        trips: new cleaned trips (optional).
+        raw_trips: the raw rows those trips came from, for completion rate
+            and trips per user (optional).
+        maintenance: new maintenance records (optional).
+    """
+    state = aggregation.AnalyticsState.load(state_path)
+    if trips is not None or raw_trips is not None:
+        state.add_trips(trips if trips is not None else raw_trips.iloc[:0], raw_trips)
+    if maintenance is not None:
+        state.add_maintenance(maintenance)
+    state.save(state_path)
+
+    data_analysis_results.update(state.results())
+    return data_analysis_results
+
+@traced("analyzer.data_analysis_report")
+def data_analysis_report(analysis_result: dict, filename="output/summary_report.txt", formats=report.FORMATS):
     """
-    Generate a summary report using Pandas and save it to a text file.
+    Write the summary report section by section with report.ReportWriter:
+    the .txt file plus .md and .json files of the same name. Large tables
+    (duration outliers, all station-to-station routes) go to their own CSV
+    files and the report only lists their size, a preview and the file.
     Also export top stations and top users to separate CSV files.
     """
 
     # Ensure output folder exists
-    os.makedirs("output", exist_ok=True)
+    out_dir = os.path.dirname(filename) or "."
+    name = os.path.splitext(os.path.basename(filename))[0]
+    os.makedirs(out_dir, exist_ok=True)
 
     # === Export Top Stations ===
     top_stations_df = pd.DataFrame({
         "top_start_stations": analysis_result["top_start_stations"],
         "top_end_stations": analysis_result["top_end_stations"]
     })
-    top_stations_df.to_csv("output/top_stations.csv", index=False)
+    top_stations_df.to_csv(os.path.join(out_dir, "top_stations.csv"), index=False)
 
     # === Export Top Users ===
     top_users_df = pd.DataFrame({
         "top_active_users": analysis_result["active_users_top_15"]
     })
-    top_users_df.to_csv("output/top_users.csv", index=False)
-
-    # === Build Summary Report ===
-    report_lines = []
-
-    report_lines.append("=== Bike Sharing Data Analysis Summary Report ===\n")
-
-    report_lines.append(f"Total Trips: {analysis_result['total_trips']}")
-    report_lines.append(f"Total Distance (km): {analysis_result['total_distance']:.2f}")
-    report_lines.append(f"Average Trip Duration: {analysis_result['average_duration']}\n")
-
-    report_lines.append("Top 10 Start Stations:")
-    report_lines.extend([f"  - {s}" for s in analysis_result["top_start_stations"]])
-    report_lines.append("----")
-
-    report_lines.append("Top 10 End Stations:")
-    report_lines.extend([f"  - {s}" for s in analysis_result["top_end_stations"]])
-    report_lines.append("----")
-
-    report_lines.append("Peak Usage Hours (Top 10):")
-    report_lines.append(analysis_result["peak_usage_hours"].to_string(index = False))
-    report_lines.append("----")
-
-    report_lines.append("Average Trip Distance by User Type:")
-    report_lines.append(f"  Casual: {analysis_result['average_distance_casual']} km")
-    report_lines.append(f"  Member: {analysis_result['average_distance_member']} km\n")
-
-    report_lines.append(f"Bike Utilization Rate: {analysis_result['bike_utilization_rate']}%\n")
-
-    report_lines.append("Top 15 Most Active Users:")
-    report_lines.extend([f"  - {u}" for u in analysis_result["active_users_top_15"]])
-    report_lines.append("----")
-
-    report_lines.append("Top 10 Station-to-Station Routes:")
-    report_lines.append(analysis_result["station_to_station_top10"].to_string())
-    report_lines.append("----")
-
-    report_lines.append(f"Trip Completion Rate: {analysis_result['trips_completed_rate']}%")
-    report_lines.append(f"Trip Cancellation Rate: {analysis_result['trips_cancelled_rate']}%\n")
-
-    report_lines.append("Average Trips per User:")
-    report_lines.append(f"  Casual: {analysis_result['avg_trips_casual']}")
-    report_lines.append(f"  Member: {analysis_result['avg_trips_member']}\n")
-
-    report_lines.append("Outlier Trips (Duration-based):")
-    report_lines.append(f"Total Outliers: {len(analysis_result['outliers_duration'])}")
-    report_lines.append(analysis_result["outliers_duration"].to_string())
-    report_lines.append("----")
+    top_users_df.to_csv(os.path.join(out_dir, "top_users.csv"), index=False)
 
     # === Write Summary Report ===
-    pd.Series(report_lines).to_csv(filename, index=False, header=False)
-
-    print(f"Summary report saved to {filename}")
-    print("Top stations saved to output/top_stations.csv")
-    print("Top users saved to output/top_users.csv")
-
-
+    # 每一节直接写进文件，不再先拼成一个大 list
+    with report.ReportWriter(out_dir, name, formats) as writer:
+        writer.value("total_trips", "Total Trips", analysis_result["total_trips"])
+        writer.value("total_distance", "Total Distance (km)", analysis_result["total_distance"], fmt=".2f")
+        writer.value("average_duration", "Average Trip Duration", analysis_result["average_duration"])
+        writer.text()
+
+        writer.items("top_start_stations", "Top 10 Start Stations", analysis_result["top_start_stations"])
+        writer.items("top_end_stations", "Top 10 End Stations", analysis_result["top_end_stations"])
+        writer.table("peak_usage_hours", "Peak Usage Hours (Top 10)", analysis_result["peak_usage_hours"], index=False)
+
+        if "busiest_weekday" in analysis_result:
+            writer.value("busiest_weekday", "Busiest Day of the Week", analysis_result["busiest_weekday"])
+            writer.table("trips_by_weekday", "Trips by Day of the Week",
+                         analysis_result["trips_by_weekday"].rename(index=dict(enumerate(cube.WEEKDAYS))))
+
+        writer.heading("Average Trip Distance by User Type")
+        writer.value("average_distance_casual", "Casual", analysis_result["average_distance_casual"], " km")
+        writer.value("average_distance_member", "Member", analysis_result["average_distance_member"], " km")
+        writer.text()
+
+        writer.value("bike_utilization_rate", "Bike Utilization Rate", analysis_result["bike_utilization_rate"], "%")
+        if "fleet_utilization_rate" in analysis_result:
+            writer.value("fleet_utilization_rate", "Fleet Utilization Rate (observed period, overlapping trips merged)",
+                         analysis_result["fleet_utilization_rate"], "%")
+        writer.text()
+
+        writer.items("active_users_top_15", "Top 15 Most Active Users", analysis_result["active_users_top_15"])
+        writer.table("station_to_station_top10", "Top 10 Station-to-Station Routes",
+                     analysis_result["station_to_station_top10"].rename("trips"))
+        if "od_matrix" in analysis_result:
+            routes = analysis_result["od_matrix"].routes().sort_values(ascending=False, kind="stable")
+            writer.export("routes", "All Station-to-Station Routes", routes.rename("trips").reset_index())
+
+        writer.value("trips_completed_rate", "Trip Completion Rate", analysis_result["trips_completed_rate"], "%")
+        writer.value("trips_cancelled_rate", "Trip Cancellation Rate", analysis_result["trips_cancelled_rate"], "%")
+        writer.text()
+
+        if "validation_summary" in analysis_result:
+            writer.heading("Rows Quarantined by Validation (data/quarantine/)")
+            for dataset, summary in analysis_result["validation_summary"].items():
+                rules = ", ".join(f"{rule}: {n}" for rule, n in summary["rules"].items() if n)
+                writer.text(f"  {dataset.title()}: {summary['rejected']} of {summary['rows']}"
+                            + (f" ({rules})" if rules else ""))
+            writer.data("validation_summary", analysis_result["validation_summary"])
+            writer.separator()
+
+        writer.heading("Average Trips per User")
+        writer.value("avg_trips_casual", "Casual", analysis_result["avg_trips_casual"])
+        writer.value("avg_trips_member", "Member", analysis_result["avg_trips_member"])
+        writer.text()
+
+        writer.export("outliers_duration", "Outlier Trips (Duration-based)",
+                      analysis_result["outliers_duration"], preview=10)
+
+    for path in writer.paths.values():
+        print(f"Summary report saved to {path}")
+    for path in writer.exports.values():
+        print(f"Table saved to {path}")
+    print(f"Top stations saved to {os.path.join(out_dir, 'top_stations.csv')}")
+    print(f"Top users saved to {os.path.join(out_dir, 'top_users.csv')}")
+    return writer.paths
@@ -0,0 +1,312 @@
+"""
+Benchmark suite for the pipeline stages.
+
+    python benchmark.py                                  # 10k, 1M and 10M trips
+    python benchmark.py --scales 10k,1M --stages load_data,clean
+    python benchmark.py --scales 10k,1M --save-baseline  # store the current numbers
+
+For every scale a synthetic dataset is written once by generate_datasets
+into <work-dir>/<scale>/data/ and reused by later runs. Every stage then
+runs in its own fresh Python process with that directory as working
+directory. Its inputs are prepared first and are not timed. Only the stage
+call is timed. Peak RSS comes from resource.getrusage and is the process
+high-water mark, so it includes the inputs; setup_rss_mb is the level
+before the stage started.
+
+Results go to a JSON file. When a baseline file exists, each stage's wall
+time is compared against it and slowdowns beyond --tolerance are reported
+as regressions (exit code 1 with --fail-on-regression).
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+RESULTS_PATH = os.path.join(ROOT, "output", "benchmarks", "results.json")
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+WORK_DIR = os.path.join(ROOT, "data", "bench")
+
+SCALES = {"10k": 10_000, "1M": 1_000_000, "10M": 10_000_000}
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def _parse_scale(label: str) -> int:
+    if label in SCALES:
+        return SCALES[label]
+    units = {"k": 1_000, "M": 1_000_000, "B": 1_000_000_000}
+    if label[-1] in units:
+        return int(float(label[:-1]) * units[label[-1]])
+    return int(label)
+
+
+def dataset_params(n_trips: int) -> dict:
+    """Generator parameters for a scale; the network grows with the trips."""
+    return {
+        "n_trips": n_trips,
+        "n_stations": int(np.clip(n_trips // 2_000, 15, 2_000)),
+        "n_bikes": int(np.clip(n_trips // 100, 60, 100_000)),
+        "n_users": int(np.clip(n_trips // 20, 80, 1_000_000)),
+        "n_maintenance": int(np.clip(n_trips // 10, 200, 1_000_000)),
+        "seed": 42,
+    }
+
+
+def ensure_dataset(scale: str, work_dir: str = WORK_DIR, workers: int = 1) -> str:
+    """Directory holding data/*.csv for a scale, generated if missing or stale."""
+    import generate_datasets
+
+    scale_dir = os.path.join(work_dir, scale)
+    params = dataset_params(_parse_scale(scale))
+    meta_path = os.path.join(scale_dir, "dataset.json")
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            if json.load(f) == params:
+                return scale_dir
+    print(f"Generating {scale} trips into {scale_dir}/data ...")
+    generate_datasets.generate(os.path.join(scale_dir, "data"), workers=workers, **params)
+    with open(meta_path, "w") as f:
+        json.dump(params, f)
+    return scale_dir
+
+
+# ---------------------------------------------------------------------------
+# Stages: setup() -> state (not timed), run(state) -> rows processed (timed)
+# ---------------------------------------------------------------------------
+
+def _raw():
+    import utils
+    return utils.load_data(utils.DATA_PATHS)
+
+
+def _parsed():
+    import pandas as pd
+    maintenance, stations, trips = _raw()
+    maintenance["date"] = pd.to_datetime(maintenance["date"], errors="coerce")
+    trips["start_time"] = pd.to_datetime(trips["start_time"], errors="coerce")
+    trips["end_time"] = pd.to_datetime(trips["end_time"], errors="coerce")
+    return maintenance, stations, trips
+
+
+def _cleaned():
+    import utils
+    maintenance, stations, trips = _parsed()
+    utils.raw_trips_summary.update(utils.summarize_raw_trips(trips))
+    stations = utils.DataCleaner(stations).drop_nan().drop_duplicates().get_cleaned_data()
+    trips = utils.DataCleaner(trips).drop_nan().drop_duplicates().filter_status("completed").get_cleaned_data()
+    return maintenance, stations, trips
+
+
+def _run_load(_):
+    import utils
+    return len(utils.load_data(utils.DATA_PATHS)[2])
+
+
+def _run_clean(frames):
+    import utils
+    trips = frames[2]
+    utils.DataCleaner(trips).drop_nan().drop_duplicates().filter_status("completed").get_cleaned_data()
+    return len(trips)
+
+
+def _run_clean_lazy(frames):
+    import utils
+    trips = frames[2]
+    utils.DataCleaner(trips, lazy=True).drop_nan().drop_duplicates().filter_status("completed").get_cleaned_data()
+    return len(trips)
+
+
+def _run_trips_analysis(frames):
+    import analyzer
+    analyzer.tripsdata_analysis(frames[2])
+    return len(frames[2])
+
+
+def _run_maintenance_analysis(frames):
+    import analyzer
+    analyzer.maintenance_data_analysis(frames[0])
+    return len(frames[0])
+
+
+def _run_distance_matrix(frames):
+    import numerical
+    stations = frames[1]
+    numerical.station_distance_matrix(stations["latitude"].to_numpy(), stations["longitude"].to_numpy())
+    return len(stations)
+
+
+def _run_duration_stats(frames):
+    import numerical
+    durations = frames[2]["duration_minutes"].to_numpy()
+    numerical.trip_duration_stats(durations)
+    return len(durations)
+
+
+def _plot(name):
+    def run(frames):
+        import visualization
+        _, stations, trips = frames
+        func = getattr(visualization, name)
+        func(trips, stations) if name == "plot_trips_per_station" else func(trips)
+        return len(trips)
+    return run
+
+
+STAGES = {
+    "load_data": (lambda: None, _run_load),
+    "clean": (_parsed, _run_clean),
+    "clean_lazy": (_parsed, _run_clean_lazy),
+    "tripsdata_analysis": (_cleaned, _run_trips_analysis),
+    "maintenance_data_analysis": (_cleaned, _run_maintenance_analysis),
+    "station_distance_matrix": (_cleaned, _run_distance_matrix),
+    "trip_duration_stats": (_cleaned, _run_duration_stats),
+    "plot_trips_per_station": (_cleaned, _plot("plot_trips_per_station")),
+    "plot_monthly_trend": (_cleaned, _plot("plot_monthly_trend")),
+    "plot_duration_histogram": (_cleaned, _plot("plot_duration_histogram")),
+    "plot_duration_by_user_type": (_cleaned, _plot("plot_duration_by_user_type")),
+}
+
+
+def run_stage(stage: str) -> dict:
+    """Run one stage in this process (cwd = the scale directory) and measure it."""
+    import contextlib
+    import io
+    from pathlib import Path
+
+    import matplotlib
+    matplotlib.use("Agg")
+    import visualization
+    visualization.FIGURES_DIR = Path.cwd() / "output" / "figures"
+
+    setup, run = STAGES[stage]
+    with contextlib.redirect_stdout(io.StringIO()):
+        state = setup()
+        setup_rss = _peak_rss_mb()
+        t0 = time.perf_counter()
+        rows = run(state)
+        wall = time.perf_counter() - t0
+    return {
+        "stage": stage,
+        "rows": int(rows),
+        "wall_s": round(wall, 4),
+        "rows_per_s": round(rows / wall, 1) if wall > 0 else None,
+        "setup_rss_mb": round(setup_rss, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def run_stage_subprocess(stage: str, scale_dir: str) -> dict:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    proc = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "benchmark.py"), "--run-stage", stage],
+        cwd=scale_dir, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        return {"stage": stage, "error": proc.stderr.strip().splitlines()[-1] if proc.stderr else "failed"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+# ---------------------------------------------------------------------------
+# Results and baseline comparison
+# ---------------------------------------------------------------------------
+
+def environment() -> dict:
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results: list, baseline: list, tolerance: float) -> pd.DataFrame:
+    """Wall time and peak RSS against the baseline, per scale and stage."""
+    current = pd.DataFrame([r for r in results if "error" not in r])
+    base = pd.DataFrame([r for r in baseline if "error" not in r])
+    if current.empty or base.empty:
+        return pd.DataFrame()
+    table = current.merge(base, on=["scale", "stage"], suffixes=("", "_baseline"))
+    table["time_ratio"] = (table["wall_s"] / table["wall_s_baseline"]).round(2)
+    table["rss_ratio"] = (table["peak_rss_mb"] / table["peak_rss_mb_baseline"]).round(2)
+    table["regression"] = table["time_ratio"] > 1 + tolerance
+    return table[["scale", "stage", "wall_s_baseline", "wall_s", "time_ratio",
+                  "peak_rss_mb_baseline", "peak_rss_mb", "rss_ratio", "regression"]]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark the bike sharing pipeline stages")
+    parser.add_argument("--scales", default="10k,1M,10M", help="comma-separated trip counts (10k, 1M, 10M ...)")
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma-separated stage names")
+    parser.add_argument("--work-dir", default=WORK_DIR, help="where the generated datasets are kept")
+    parser.add_argument("--gen-workers", type=int, default=1, help="processes generating the datasets")
+    parser.add_argument("--output", default=RESULTS_PATH, help="results JSON file")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON file to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="also write the results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before flagging (0.25 = 25%%)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with code 1 on a regression")
+    parser.add_argument("--run-stage", help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.run_stage:
+        print(json.dumps(run_stage(args.run_stage)))
+        return 0
+
+    stages = args.stages.split(",")
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise SystemExit(f"Unknown stages: {sorted(unknown)}")
+
+    results = []
+    for scale in args.scales.split(","):
+        scale_dir = ensure_dataset(scale, args.work_dir, args.gen_workers)
+        for stage in stages:
+            result = {"scale": scale, **run_stage_subprocess(stage, scale_dir)}
+            results.append(result)
+            if "error" in result:
+                print(f"{scale:>5} {stage:<28} ERROR {result['error']}")
+            else:
+                print(f"{scale:>5} {stage:<28} {result['wall_s']:>9.3f} s {result['rows_per_s'] or 0:>14,.0f} rows/s "
+                      f"{result['peak_rss_mb']:>8.1f} MB")
+
+    report = {"environment": environment(), "results": results}
+    for path in [args.output] + ([args.baseline] if args.save_baseline else []):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.save_baseline or not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline) as f:
+        table = compare(results, json.load(f)["results"], args.tolerance)
+    if table.empty:
+        print("No overlapping scale / stage in the baseline")
+        return 0
+    print(table.to_string(index=False))
+    regressions = table[table["regression"]]
+    if len(regressions):
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+        return 1 if args.fail_on_regression else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
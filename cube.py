@@ -0,0 +1,211 @@
+"""
+Materialized rollup cube over the cleaned trips.
+
+Trips are counted once into dense NumPy arrays over
+
+    month x weekday x hour x start station x user_type x bike_type
+
+with three measures: trip count, total duration_minutes and total
+distance_km. Any dashboard question that only groups / filters on those
+dimensions (peak hours, busiest weekday, monthly trend per station ...) is
+then a sum over a few axes of a small array and never touches trip rows.
+New batches are added with update(); unseen months or stations grow the
+cube along that axis.
+"""
+
+import calendar
+import os
+
+import numpy as np
+import pandas as pd
+
+from aggregation import encode_column
+
+DIMENSIONS = ("month", "weekday", "hour", "station", "user_type", "bike_type")
+MEASURES = ("count", "duration", "distance")
+WEEKDAYS = tuple(calendar.day_name)  # Monday first, like dt.weekday
+HOURS = tuple(range(24))
+
+
+class TripCube:
+    """Dense trip cube with slice / roll-up queries.
+
+    Args:
+        labels: dict dimension -> labels. weekday and hour are fixed
+            (0-6 Monday first, 0-23); the others grow as batches arrive.
+    """
+
+    def __init__(self, labels: dict | None = None):
+        labels = labels or {}
+        self.labels = {
+            dim: pd.Index(labels.get(dim, []), dtype="str") for dim in ("month", "station", "user_type", "bike_type")
+        }
+        self.labels["weekday"] = pd.Index(range(7), name="weekday")
+        self.labels["hour"] = pd.Index(HOURS, name="hour")
+        shape = self.shape
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.duration = np.zeros(shape, dtype=np.float64)
+        self.distance = np.zeros(shape, dtype=np.float64)
+
+    @classmethod
+    def from_trips(cls, df: pd.DataFrame) -> "TripCube":
+        """Build the cube from cleaned trips."""
+        return cls().update(df)
+
+    @property
+    def shape(self) -> tuple:
+        return tuple(len(self.labels[dim]) for dim in DIMENSIONS)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, m).nbytes for m in MEASURES)
+
+    # -------- building --------
+    def _grow(self, dim: str, new_labels) -> None:
+        """Add labels to a dimension (kept sorted), moving the existing cells."""
+        old = self.labels[dim]
+        union = old.union(pd.Index(new_labels, dtype="str")).sort_values()
+        if len(union) == len(old):
+            return
+        axis = DIMENSIONS.index(dim)
+        positions = union.get_indexer(old)
+        self.labels[dim] = union
+        for measure in MEASURES:
+            values = getattr(self, measure)
+            grown = np.zeros(self.shape, dtype=values.dtype)
+            index = [slice(None)] * len(DIMENSIONS)
+            index[axis] = positions
+            grown[tuple(index)] = values
+            setattr(self, measure, grown)
+
+    def _codes(self, dim: str, codes: np.ndarray, labels: pd.Index) -> np.ndarray:
+        """Map a column's own codes / labels onto this cube's labels (-1 stays -1)."""
+        self._grow(dim, labels)
+        mapping = np.append(self.labels[dim].get_indexer(labels.astype("str")), -1)
+        return mapping[codes]
+
+    def update(self, df: pd.DataFrame) -> "TripCube":
+        """Add a batch of cleaned trips to the cube."""
+        start = df["start_time"].to_numpy(dtype="datetime64[s]")
+        valid = ~np.isnat(start)
+
+        # rows without a start_time get month code -1 and are left out (no "NaT" month)
+        month_codes = np.full(len(start), -1, dtype=np.int64)
+        month_codes[valid], month_values = pd.factorize(start[valid].astype("datetime64[M]").astype(np.int64), sort=True)
+        month_labels = pd.Index(np.asarray(month_values, dtype="datetime64[M]").astype("str"))
+        codes = [self._codes("month", month_codes, month_labels)]
+        # 1970-01-01 was a Thursday, shift so Monday == 0 like dt.weekday
+        codes.append((start.astype("datetime64[D]").astype(np.int64) + 3) % 7)
+        codes.append(start.astype("datetime64[h]").astype(np.int64) % 24)
+        for dim, column in (("station", "start_station_id"), ("user_type", "user_type"), ("bike_type", "bike_type")):
+            col_codes, col_labels = encode_column(df[column])
+            codes.append(self._codes(dim, col_codes, col_labels))
+
+        for c in codes:
+            valid &= c >= 0
+        flat = np.ravel_multi_index([c[valid] for c in codes], self.shape)
+        size = self.count.size
+        self.count += np.bincount(flat, minlength=size).reshape(self.shape)
+        self.duration += np.bincount(
+            flat, weights=df["duration_minutes"].to_numpy(dtype=np.float64)[valid], minlength=size
+        ).reshape(self.shape)
+        self.distance += np.bincount(
+            flat, weights=df["distance_km"].to_numpy(dtype=np.float64)[valid], minlength=size
+        ).reshape(self.shape)
+        return self
+
+    # -------- queries --------
+    def _positions(self, filters: dict) -> list:
+        """Selected positions along every dimension."""
+        positions = []
+        for dim, labels in zip(DIMENSIONS, (self.labels[d] for d in DIMENSIONS)):
+            if dim not in filters:
+                positions.append(np.arange(len(labels)))
+                continue
+            values = np.atleast_1d(filters[dim]).tolist()
+            if dim == "weekday":
+                values = [WEEKDAYS.index(v) if isinstance(v, str) else v for v in values]
+            elif dim != "hour":
+                values = [str(v) for v in values]
+            found = labels.get_indexer(values)
+            positions.append(found[found >= 0])
+        return positions
+
+    def query(self, measure: str = "count", by=(), **filters):
+        """Roll the cube up to the `by` dimensions, after filtering.
+
+        Args:
+            measure: "count", "duration", "distance", or "avg_duration" /
+                "avg_distance" (total / count).
+            by: dimensions to keep, in order; all others are summed out.
+            **filters: dimension=value or list of values, e.g.
+                user_type="member", hour=[7, 8, 9], weekday="Monday".
+
+        Returns:
+            A scalar without `by`, otherwise a Series indexed by the `by`
+            dimensions (all combinations, zeros included).
+        """
+        by = tuple(by)
+        unknown = (set(by) | set(filters)) - set(DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Unknown dimensions: {sorted(unknown)}")
+        average = measure.startswith("avg_")
+        base = measure[4:] if average else measure
+        if base not in MEASURES or (average and base == "count"):
+            raise ValueError(f"Unknown measure: {measure!r}")
+
+        positions = self._positions(filters)
+        index = np.ix_(*positions)
+        kept = sorted(DIMENSIONS.index(dim) for dim in by)
+        drop = tuple(axis for axis in range(len(DIMENSIONS)) if axis not in kept)
+        # sum() leaves the kept axes in cube order; transpose them to `by` order
+        order = [kept.index(DIMENSIONS.index(dim)) for dim in by]
+
+        def rollup(values):
+            return values[index].sum(axis=drop).transpose(order)
+
+        result = rollup(getattr(self, base))
+        if average:
+            counts = rollup(self.count)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                result = np.where(counts > 0, result / np.maximum(counts, 1), np.nan)
+        if not by:
+            return np.asarray(result).item()
+
+        labels = [self.labels[dim][positions[DIMENSIONS.index(dim)]] for dim in by]
+        return pd.Series(
+            np.asarray(result).ravel(),
+            index=pd.MultiIndex.from_product(labels, names=list(by)) if len(by) > 1
+            else labels[0].rename(by[0]),
+            name=measure,
+        )
+
+    def trips_by_weekday(self, **filters) -> pd.Series:
+        """Trip count per weekday (0 = Monday)."""
+        return self.query("count", by=("weekday",), **filters).rename("counts")
+
+    def busiest_weekday(self, **filters) -> str:
+        """Name of the weekday with the most trips (first one on ties)."""
+        return WEEKDAYS[int(np.argmax(self.trips_by_weekday(**filters).to_numpy()))]
+
+    # -------- persistence --------
+    def save(self, path: str) -> None:
+        """Write the cube to a .npz file (no pickling)."""
+        arrays = {measure: getattr(self, measure) for measure in MEASURES}
+        for dim in ("month", "station", "user_type", "bike_type"):
+            arrays[f"labels__{dim}"] = np.array(self.labels[dim], dtype=str)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> "TripCube":
+        """Read a cube written by save(); a missing file gives an empty cube."""
+        if not os.path.exists(path):
+            return cls()
+        with np.load(path, allow_pickle=False) as arrays:
+            cube = cls({dim: arrays[f"labels__{dim}"] for dim in ("month", "station", "user_type", "bike_type")})
+            for measure in MEASURES:
+                setattr(cube, measure, arrays[measure])
+        return cube
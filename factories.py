@@ -4,26 +4,33 @@ Factory Pattern — create domain objects from raw CSV-row dictionaries.
 The factory functions hide which concrete subclass is instantiated,
 so the rest of the code never needs to import ClassicBike / ElectricBike etc.
 
-Students should:
-    - Complete create_user()
-    - Optionally add create_trip() and create_maintenance_record()
+Whole DataFrames go through the bulk factories (bikes_from_frame,
+stations_from_frame, users_from_frame): every check runs once over whole
+columns, rejected rows are listed in a row-indexed error table, and the
+valid entities are stored in a registry.py container. Model objects are
+only built when an entity is accessed.
 """
 
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
 from model import (
     Bike,
     ClassicBike,
     ElectricBike,
     User,
-    CasualUser,
-    MemberUser,
 )
+from registry import BikeFleet, StationRegistry, UserRegistry
 
 
 def create_bike(data: dict) -> Bike:
     """Create a Bike (ClassicBike or ElectricBike) from a data dictionary.
 
     Args:
-        data: A dict with at least 'bike_id' and 'bike_type'.
+        data: A dict with at least 'bike_id' and 'bike_type'; optional
+            'status' (default "available") and 'created_at' (default now).
 
     Returns:
         A ClassicBike or ElectricBike instance.
@@ -37,15 +44,21 @@ def create_bike(data: dict) -> Bike:
         True
     """
     bike_type = data.get("bike_type", "").lower()
+    common = dict(
+        id=data["bike_id"],
+        created_at=data.get("created_at") or datetime.now(),
+        bike_type=bike_type,
+        _status=data.get("status", "available"),
+    )
 
     if bike_type == "classic":
         return ClassicBike(
-            bike_id=data["bike_id"],
+            **common,
             gear_count=int(data.get("gear_count", 7)),
         )
     elif bike_type == "electric":
         return ElectricBike(
-            bike_id=data["bike_id"],
+            **common,
             battery_level=float(data.get("battery_level", 100.0)),
             max_range_km=float(data.get("max_range_km", 50.0)),
         )
@@ -54,18 +67,219 @@ def create_bike(data: dict) -> Bike:
 
 
 def create_user(data: dict) -> User:
-    """Create a User (CasualUser or MemberUser) from a data dictionary.
-
-    TODO:
-        - Inspect data["user_type"] to decide which subclass to create
-        - Pass the relevant fields to each constructor
-        - Return the created object
+    """Create a User from a data dictionary.
 
     Args:
-        data: A dict with at least 'user_id', 'name', 'email', 'user_type'.
+        data: A dict with at least 'user_id' and 'user_type'; optional
+            'name' (default the user_id), 'email' and 'created_at'.
 
     Returns:
-        A CasualUser or MemberUser instance.
+        A User instance.
+
+    Raises:
+        ValueError: If user_type is unknown.
+    """
+    user_type = str(data.get("user_type", "")).lower()
+    if user_type not in User.VALID_TYPES:
+        raise ValueError(f"Unknown user_type: {user_type!r}")
+    return User(
+        id=data["user_id"],
+        created_at=data.get("created_at") or datetime.now(),
+        name=data.get("name", data["user_id"]),
+        email=data.get("email", ""),
+        user_type=user_type,
+    )
+
+
+# =========================
+# Bulk factories
+# =========================
+ERROR_COLUMNS = ["row", "field", "value", "error", "severity"]
+
+
+class _Errors:
+    """Collects failed checks as (row, field, value, error, severity) rows.
+
+    severity "error" rejects the row, "warning" only reports it.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.bad = np.zeros(len(df), dtype=bool)
+        self.parts = []
+        self._codes = {}
+
+    def codes(self, column: str) -> tuple[np.ndarray, pd.Index]:
+        """Codes (-1 = missing) and stripped, lower-cased labels of a column.
+
+        String work runs once per distinct value, not once per row.
+        """
+        if column not in self._codes:
+            codes, uniques = pd.factorize(self.df[column])
+            labels = pd.Index(np.asarray(uniques, dtype=object).astype(str)).str.strip().str.lower()
+            self._codes[column] = codes, labels
+        return self._codes[column]
+
+    def check(self, failed, field: str, error: str, reject: bool = True) -> None:
+        failed = np.asarray(failed, dtype=bool)
+        if not failed.any():
+            return
+        if reject:
+            self.bad |= failed
+        values = self.df[field][failed] if field in self.df else pd.Series(np.nan, index=self.df.index[failed])
+        self.parts.append(pd.DataFrame({
+            "row": self.df.index[failed], "field": field, "value": values.astype(object).to_numpy(), "error": error,
+            "severity": "error" if reject else "warning",
+        }))
+
+    def table(self) -> pd.DataFrame:
+        if not self.parts:
+            return pd.DataFrame(columns=ERROR_COLUMNS)
+        return pd.concat(self.parts, ignore_index=True).sort_values("row", kind="stable", ignore_index=True)
+
+
+def _first_valid(errors: _Errors, key: str) -> np.ndarray:
+    """Positions of the first non-rejected row of every key."""
+    rows = np.flatnonzero(~errors.bad)
+    return rows[~errors.df[key].iloc[rows].duplicated().to_numpy()]
+
+
+def _normalized(errors: _Errors, column: str, rows: np.ndarray) -> np.ndarray:
+    """The stripped, lower-cased values of column at rows (positions), exactly as they were checked."""
+    codes, labels = errors.codes(column)
+    return labels.to_numpy()[codes[rows]]
+
+
+def _missing(errors: _Errors, column: str) -> np.ndarray:
+    codes, labels = errors.codes(column)
+    empty = np.append(np.asarray(labels == ""), True)  # code -1 -> last slot
+    return empty[codes]
+
+
+def _not_in(errors: _Errors, column: str, valid: tuple) -> np.ndarray:
+    codes, labels = errors.codes(column)
+    invalid = np.append(~np.asarray(labels.isin(valid)), False)
+    return invalid[codes]
+
+
+def _check_conflicts(errors: _Errors, key: str, column: str, on_conflict: str) -> None:
+    """Rows whose key also appears with another value of column.
+
+    on_conflict="first": the entity keeps the value of its first valid row
+    and later rows that disagree are reported as warnings.
+    on_conflict="reject": every row of a key with several values is rejected.
     """
-    # TODO: implement factory logic (similar to create_bike above)
-    raise NotImplementedError("create_user")
\ No newline at end of file
+    if on_conflict not in ("first", "reject"):
+        raise ValueError(f"on_conflict must be 'first' or 'reject', not {on_conflict!r}")
+    key_codes, key_labels = errors.codes(key)
+    value_codes, value_labels = errors.codes(column)
+    # labels that only differed in case / spaces share one code
+    value_codes = pd.factorize(value_labels)[0][value_codes]
+    usable = ~errors.bad
+    keys, values = key_codes[usable], value_codes[usable]
+    if on_conflict == "reject":
+        pairs = np.unique(keys.astype(np.int64) * (len(value_labels) + 1) + values)
+        values_per_key = np.bincount(pairs // (len(value_labels) + 1), minlength=len(key_labels))
+        errors.check(usable & (values_per_key[key_codes] > 1), column, f"conflicting {column} for {key}")
+    else:
+        first_value = np.full(len(key_labels), -1, dtype=np.int64)
+        unique_keys, first_row = np.unique(keys, return_index=True)
+        first_value[unique_keys] = values[first_row]
+        conflict = usable & (first_value[key_codes] != value_codes)
+        errors.check(conflict, column, f"{column} differs from the first row of this {key}", reject=False)
+
+
+class BulkResult:
+    """Valid entities of a bulk load plus the table of rejected rows.
+
+    Attributes:
+        registry: BikeFleet / StationRegistry / UserRegistry of the valid
+            rows (one entity per id, first occurrence kept).
+        errors: DataFrame with row (index label in the input frame),
+            field, value and error; a row can fail several checks.
+    """
+
+    def __init__(self, registry, errors: pd.DataFrame):
+        self.registry = registry
+        self.errors = errors
+        self._objects = {}
+
+    def __len__(self):
+        return len(self.registry)
+
+    def __contains__(self, entity_id):
+        return entity_id in self.registry
+
+    def __getitem__(self, entity_id):
+        """The model object of an id, created on first access."""
+        if entity_id not in self._objects:
+            self._objects[entity_id] = self.registry.materialize(entity_id)
+        return self._objects[entity_id]
+
+    def __iter__(self):
+        """Model objects one by one, each created only when reached."""
+        for position in range(len(self.registry)):
+            yield self[self.registry.id_at(position)]
+
+    @property
+    def rejected_rows(self) -> int:
+        return self.errors.loc[self.errors["severity"] == "error", "row"].nunique()
+
+
+def bikes_from_frame(df: pd.DataFrame, status: str = "available", created_at=None,
+                     on_conflict: str = "first") -> BulkResult:
+    """Bikes from any frame with bike_id and bike_type (trips, maintenance ...).
+
+    The trips' own status column is about the trip, not the bike, so every
+    bike starts in `status`. on_conflict decides what happens when one
+    bike_id comes with several bike_types, see _check_conflicts.
+    """
+    errors = _Errors(df)
+    errors.check(_missing(errors, "bike_id"), "bike_id", "missing bike_id")
+    errors.check(_missing(errors, "bike_type"), "bike_type", "missing bike_type")
+    errors.check(_not_in(errors, "bike_type", Bike.VALID_TYPES), "bike_type", "invalid bike_type")
+    _check_conflicts(errors, "bike_id", "bike_type", on_conflict)
+
+    rows = _first_valid(errors, "bike_id")
+    valid = df.iloc[rows]
+    fleet = BikeFleet(valid["bike_id"].astype(str), _normalized(errors, "bike_type", rows),
+                      statuses=status, created_at=created_at)
+    return BulkResult(fleet, errors.table())
+
+
+def stations_from_frame(df: pd.DataFrame, created_at=None) -> BulkResult:
+    """Stations from a stations frame."""
+    errors = _Errors(df)
+    for column in ("station_id", "station_name", "capacity", "latitude", "longitude"):
+        errors.check(_missing(errors, column), column, f"missing {column}")
+    capacity = pd.to_numeric(df["capacity"], errors="coerce")
+    latitude = pd.to_numeric(df["latitude"], errors="coerce")
+    longitude = pd.to_numeric(df["longitude"], errors="coerce")
+    errors.check((capacity <= 0) | (capacity % 1 != 0), "capacity", "capacity must be a positive integer")
+    errors.check(latitude.abs() > 90, "latitude", "latitude out of range")
+    errors.check(longitude.abs() > 180, "longitude", "longitude out of range")
+    errors.check(df["station_id"].duplicated(keep="first") & ~df.duplicated(keep="first"),
+                 "station_id", "duplicate station_id with different attributes")
+
+    valid = df[~errors.bad].drop_duplicates("station_id")
+    stations = StationRegistry(valid["station_id"].astype(str), valid["station_name"].astype(str),
+                               capacity[valid.index], latitude[valid.index], longitude[valid.index],
+                               created_at=created_at)
+    return BulkResult(stations, errors.table())
+
+
+def users_from_frame(df: pd.DataFrame, created_at=None, on_conflict: str = "first") -> BulkResult:
+    """Users from any frame with user_id and user_type (e.g. trips)."""
+    errors = _Errors(df)
+    errors.check(_missing(errors, "user_id"), "user_id", "missing user_id")
+    errors.check(_missing(errors, "user_type"), "user_type", "missing user_type")
+    errors.check(_not_in(errors, "user_type", User.VALID_TYPES), "user_type", "invalid user_type")
+    _check_conflicts(errors, "user_id", "user_type", on_conflict)
+
+    rows = _first_valid(errors, "user_id")
+    valid = df.iloc[rows]
+    names = valid["name"].astype(str) if "name" in valid else None
+    emails = valid["email"].astype(str) if "email" in valid else None
+    users = UserRegistry(valid["user_id"].astype(str), _normalized(errors, "user_type", rows),
+                         names=names, emails=emails, created_at=created_at)
+    return BulkResult(users, errors.table())
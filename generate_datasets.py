@@ -1,129 +1,226 @@
-import pandas as pd
+"""
+Synthetic data generator for stations.csv, trips.csv and maintenance.csv.
+
+    python generate_datasets.py                          # the default small dataset
+    python generate_datasets.py --trips 10000000 --stations 500 --bikes 20000 \
+        --users 200000 --workers 8 --out-dir data/large
+
+Every column is drawn in vectorized blocks from np.random.Generator. Trips
+are generated chunk by chunk and appended to trips.csv, so memory stays at
+two chunks per worker whatever the total. Chunk i always uses the seed
+SeedSequence(seed, spawn_key=(TRIPS, i)), so the output is the same for any
+number of workers.
+
+The same messiness as the original data is injected: NaN duration /
+distance / status / cost, end_time == start_time, and duplicated rows.
+"""
+
+import argparse
+import os
+from collections import deque
+from multiprocessing import Pool
+
 import numpy as np
-from datetime import datetime, timedelta
+import pandas as pd
 
-np.random.seed(42)
+from validation import MAINTENANCE_TYPES
 
-# --- Station data ---
-station_names = [
+STATION_NAMES = [
     "Central Station", "University Campus", "City Hall",
     "Riverside Park", "Market Square", "Tech Hub",
     "Old Town", "Harbor View", "Sports Arena",
     "West End", "North Gate", "Museum Quarter",
     "Business District", "Lakeside", "Airport Terminal"
 ]
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# spawn keys of the independent random streams
+STATIONS, POOLS, TRIPS, MAINTENANCE = range(4)
 
-stations = []
-for i, name in enumerate(station_names):
-    stations.append({
-        "station_id": f"ST{100 + i}",
-        "station_name": name,
-        "capacity": np.random.choice([10, 15, 20, 25, 30]),
-        "latitude": round(48.75 + np.random.uniform(0, 0.15), 6),
-        "longitude": round(9.15 + np.random.uniform(0, 0.15), 6),
+# messiness, as fractions of the trips (10, 10, 5 and 15 of the original 1,500)
+NAN_DURATION_RATE = 10 / 1500
+NAN_DISTANCE_RATE = 10 / 1500
+END_EQUALS_START_RATE = 5 / 1500
+DUPLICATE_RATE = 15 / 1500
+NAN_COST_RATE = 8 / 200
+
+
+def _rng(seed: int, *key) -> np.random.Generator:
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=key))
+
+
+def _labels(prefix: str, numbers) -> np.ndarray:
+    return np.char.add(prefix, np.asarray(numbers).astype("str"))
+
+
+# --- Station data ---
+def generate_stations(n_stations: int, seed: int) -> pd.DataFrame:
+    rng = _rng(seed, STATIONS)
+    names = STATION_NAMES + [f"Station {i}" for i in range(len(STATION_NAMES), n_stations)]
+    return pd.DataFrame({
+        "station_id": _labels("ST", 100 + np.arange(n_stations)),
+        "station_name": names[:n_stations],
+        "capacity": rng.choice([10, 15, 20, 25, 30], n_stations),
+        "latitude": np.round(48.75 + rng.uniform(0, 0.15, n_stations), 6),
+        "longitude": np.round(9.15 + rng.uniform(0, 0.15, n_stations), 6),
     })
 
-stations_df = pd.DataFrame(stations)
-stations_df.to_csv("data/stations.csv", index=False)
+
+def id_pools(n_users: int, n_bikes: int, seed: int) -> tuple[np.ndarray, np.ndarray]:
+    """Distinct user and bike ids the trips are drawn from."""
+    rng = _rng(seed, POOLS)
+    users = _labels("USR", 1000 + np.sort(rng.choice(max(200, 2 * n_users), n_users, replace=False)))
+    bikes = _labels("BK", 200 + np.sort(rng.choice(max(150, 2 * n_bikes), n_bikes, replace=False)))
+    return users, bikes
+
 
 # --- Trip data ---
-n_trips = 1500
-user_ids = [f"USR{np.random.randint(1000, 1200)}"
-            for _ in range(80)]
-bike_ids = [f"BK{np.random.randint(200, 350)}"
-            for _ in range(60)]
-start_date = datetime(2024, 1, 1)
-
-trips = []
-for i in range(n_trips):
-    user_type = np.random.choice(
-        ["casual", "member"], p=[0.35, 0.65]
-    )
-    bike_type = np.random.choice(
-        ["classic", "electric"], p=[0.6, 0.4]
-    )
-    start_st = np.random.choice(stations_df["station_id"])
-    end_st = np.random.choice(stations_df["station_id"])
-    start_time = start_date + timedelta(
-        days=np.random.randint(0, 365),
-        hours=np.random.randint(6, 23),
-        minutes=np.random.randint(0, 60),
-    )
-    duration = max(2, np.random.exponential(25))
-    end_time = start_time + timedelta(minutes=duration)
-    distance = round(np.random.uniform(0.5, 15.0), 2)
-    status = np.random.choice(
-        ["completed", "cancelled", np.nan],
-        p=[0.82, 0.12, 0.06]
+def generate_trip_chunk(chunk: int, first_trip: int, n_trips: int, station_ids, user_ids, bike_ids,
+                        seed: int, start_date: str = "2024-01-01", days: int = 365) -> pd.DataFrame:
+    """Trips first_trip .. first_trip + n_trips - 1, plus their injected duplicates."""
+    rng = _rng(seed, TRIPS, chunk)
+    n = n_trips
+
+    start_seconds = (
+        rng.integers(0, days, n) * 86400
+        + rng.integers(6, 23, n) * 3600
+        + rng.integers(0, 60, n) * 60
     )
+    start_time = np.datetime64(start_date, "s") + start_seconds
+    duration = np.maximum(2, rng.exponential(25, n))
+    end_time = start_time + (duration * 60).astype("timedelta64[s]")
 
-    trips.append({
-        "trip_id": f"TR{10000 + i}",
-        "user_id": np.random.choice(user_ids),
-        "user_type": user_type,
-        "bike_id": np.random.choice(bike_ids),
-        "bike_type": bike_type,
-        "start_station_id": start_st,
-        "end_station_id": end_st,
-        "start_time": start_time.strftime(
-            "%Y-%m-%d %H:%M:%S"
-        ),
-        "end_time": end_time.strftime(
-            "%Y-%m-%d %H:%M:%S"
-        ),
-        "duration_minutes": round(duration, 1),
-        "distance_km": distance,
+    status = pd.Categorical.from_codes(
+        rng.choice([0, 1, -1], n, p=[0.82, 0.12, 0.06]), categories=["completed", "cancelled"]
+    )
+    trips = pd.DataFrame({
+        "trip_id": _labels("TR", 10000 + first_trip + np.arange(n)),
+        "user_id": pd.Categorical.from_codes(rng.integers(0, len(user_ids), n), categories=user_ids),
+        "user_type": pd.Categorical.from_codes(rng.choice(2, n, p=[0.35, 0.65]), categories=["casual", "member"]),
+        "bike_id": pd.Categorical.from_codes(rng.integers(0, len(bike_ids), n), categories=bike_ids),
+        "bike_type": pd.Categorical.from_codes(rng.choice(2, n, p=[0.6, 0.4]), categories=["classic", "electric"]),
+        "start_station_id": pd.Categorical.from_codes(rng.integers(0, len(station_ids), n), categories=station_ids),
+        "end_station_id": pd.Categorical.from_codes(rng.integers(0, len(station_ids), n), categories=station_ids),
+        "start_time": start_time,
+        "end_time": end_time,
+        "duration_minutes": np.round(duration, 1),
+        "distance_km": np.round(rng.uniform(0.5, 15.0, n), 2),
         "status": status,
     })
 
-trips_df = pd.DataFrame(trips)
+    # Inject some messiness
+    counts = [round(rate * n) for rate in (NAN_DURATION_RATE, NAN_DISTANCE_RATE, END_EQUALS_START_RATE)]
+    idx = rng.choice(n, min(sum(counts), n), replace=False)
+    a, b = counts[0], counts[0] + counts[1]
+    trips.loc[idx[:a], "duration_minutes"] = np.nan
+    trips.loc[idx[a:b], "distance_km"] = np.nan
+    trips.loc[idx[b:], "end_time"] = trips.loc[idx[b:], "start_time"]
+
+    dup_rows = trips.iloc[rng.choice(n, round(DUPLICATE_RATE * n), replace=False)]
+    return pd.concat([trips, dup_rows], ignore_index=True)
+
+
+def _trip_chunk_csv(args) -> str:
+    header, chunk_args, kwargs = args
+    return generate_trip_chunk(*chunk_args, **kwargs).to_csv(index=False, header=header, date_format=TIME_FORMAT)
+
 
-# Inject some messiness
-idx = np.random.choice(n_trips, 30, replace=False)
-trips_df.loc[idx[:10], "duration_minutes"] = np.nan
-trips_df.loc[idx[10:20], "distance_km"] = np.nan
-trips_df.loc[idx[20:25], "end_time"] = (trips_df.loc[idx[20:25], "start_time"])
+def write_trips(path: str, n_trips: int, station_ids, user_ids, bike_ids, seed: int,
+                chunk_size: int = 1_000_000, workers: int = 1, **kwargs) -> int:
+    """Stream n_trips trips (plus duplicates) to path in chunks; returns rows written."""
+    jobs = [
+        (chunk == 0, (chunk, first, min(chunk_size, n_trips - first), station_ids, user_ids, bike_ids, seed),
+         kwargs)
+        for chunk, first in enumerate(range(0, n_trips, chunk_size))
+    ]
+    lines = 0
+    with open(path, "w", newline="") as f:
+        if workers > 1:
+            with Pool(workers) as pool:
+                # sliding window of 2 chunks per worker, written in chunk order;
+                # imap would read ahead without bound and pile up CSV text
+                pending = deque()
+                for job in jobs:
+                    pending.append(pool.apply_async(_trip_chunk_csv, (job,)))
+                    if len(pending) >= 2 * workers:
+                        text = pending.popleft().get()
+                        f.write(text)
+                        lines += text.count("\n")
+                while pending:
+                    text = pending.popleft().get()
+                    f.write(text)
+                    lines += text.count("\n")
+        else:
+            for job in jobs:
+                text = _trip_chunk_csv(job)
+                f.write(text)
+                lines += text.count("\n")
+    return max(lines - 1, 0)
 
-dup_rows = trips_df.sample(15)
-trips_df = pd.concat(
-    [trips_df, dup_rows], ignore_index=True
-)
-trips_df.to_csv("data/trips.csv", index=False)
 
 # --- Maintenance data ---
-maint_types = [
-    "tire_repair", "brake_adjustment",
-    "battery_replacement", "chain_lubrication",
-    "general_inspection"
-]
+def generate_maintenance(n_records: int, bike_ids, seed: int, start_date: str = "2024-01-01",
+                         days: int = 365) -> pd.DataFrame:
+    rng = _rng(seed, MAINTENANCE)
+    bike = np.asarray(bike_ids)[rng.integers(0, len(bike_ids), n_records)]
+    btype = np.array(["classic", "electric"])[rng.integers(0, 2, n_records)]
+    mtype = np.array(MAINTENANCE_TYPES)[rng.integers(0, len(MAINTENANCE_TYPES), n_records)]
+    cost = np.round(rng.uniform(10, 150, n_records), 2)
+    battery = mtype == "battery_replacement"
+    cost[battery] = np.round(rng.uniform(80, 250, battery.sum()), 2)
+    btype[battery] = "electric"
+    cost[rng.choice(n_records, round(NAN_COST_RATE * n_records), replace=False)] = np.nan
 
-records = []
-for i in range(200):
-    bike = np.random.choice(bike_ids)
-    btype = np.random.choice(["classic", "electric"])
-    mtype = np.random.choice(maint_types)
-    cost = round(np.random.uniform(10, 150), 2)
-    if mtype == "battery_replacement":
-        cost = round(np.random.uniform(80, 250), 2)
-        btype = "electric"
-
-    records.append({
-        "record_id": f"MR{5000 + i}",
+    titles = {m: m.replace("_", " ").title() for m in MAINTENANCE_TYPES}
+    return pd.DataFrame({
+        "record_id": _labels("MR", 5000 + np.arange(n_records)),
         "bike_id": bike,
         "bike_type": btype,
-        "date": (
-            start_date
-            + timedelta(days=np.random.randint(0, 365))
-        ).strftime("%Y-%m-%d"),
+        "date": (np.datetime64(start_date, "D") + rng.integers(0, days, n_records)).astype("str"),
         "maintenance_type": mtype,
         "cost": cost,
-        "description": f"{mtype.replace('_', ' ').title()}"
-                       f" for bike {bike}",
+        "description": np.char.add(np.char.add(pd.Series(mtype).map(titles).to_numpy().astype("str"), " for bike "), bike),
     })
 
-maint_df = pd.DataFrame(records)
-maint_df.loc[np.random.choice(200, 8, replace=False), "cost"] = np.nan
-maint_df.to_csv("data/maintenance.csv", index=False)
 
-print("Generated: stations.csv, trips.csv, "
-      "maintenance.csv")
+def generate(out_dir: str = "data", n_stations: int = 15, n_bikes: int = 60, n_users: int = 80,
+             n_trips: int = 1500, n_maintenance: int = 200, seed: int = 42, chunk_size: int = 1_000_000,
+             workers: int = 1, start_date: str = "2024-01-01", days: int = 365) -> dict:
+    """Write stations.csv, trips.csv and maintenance.csv to out_dir; returns their paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {name: os.path.join(out_dir, f"{name}.csv") for name in ("stations", "trips", "maintenance")}
+
+    stations_df = generate_stations(n_stations, seed)
+    stations_df.to_csv(paths["stations"], index=False)
+    user_ids, bike_ids = id_pools(n_users, n_bikes, seed)
+    write_trips(paths["trips"], n_trips, stations_df["station_id"].to_numpy(), user_ids, bike_ids, seed,
+                chunk_size=chunk_size, workers=workers, start_date=start_date, days=days)
+    generate_maintenance(n_maintenance, bike_ids, seed, start_date, days).to_csv(paths["maintenance"], index=False)
+    return paths
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Generate synthetic bike sharing datasets")
+    parser.add_argument("--out-dir", default="data", help="directory of the three CSV files")
+    parser.add_argument("--stations", type=int, default=15)
+    parser.add_argument("--bikes", type=int, default=60)
+    parser.add_argument("--users", type=int, default=80)
+    parser.add_argument("--trips", type=int, default=1500)
+    parser.add_argument("--maintenance", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=1_000_000, help="trips generated per chunk")
+    parser.add_argument("--workers", type=int, default=1, help="processes generating trip chunks")
+    parser.add_argument("--start-date", default="2024-01-01")
+    parser.add_argument("--days", type=int, default=365)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    paths = generate(args.out_dir, args.stations, args.bikes, args.users, args.trips, args.maintenance,
+                     args.seed, args.chunk_size, args.workers, args.start_date, args.days)
+    print(f"Generated: {', '.join(paths.values())}")
+
+
+if __name__ == "__main__":
+    main()
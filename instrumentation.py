@@ -0,0 +1,224 @@
+"""
+Opt-in tracing and profiling of the pipeline stages.
+
+Spans record wall time, rows processed, bytes read and (optionally) the
+tracemalloc peak of a stage, and are written as one JSON object per line:
+
+    {"span": "analyzer.tripsdata_analysis", "parent": "main.analyze", "depth": 1,
+     "start": "2024-05-01T02:00:03.120", "duration_s": 0.0591, "rows": 1233,
+     "rows_per_s": 20862.9, "bytes_read": null, "memory_peak_mb": 3.2, "status": "ok"}
+
+Tracing is off unless enabled, and a disabled span costs one attribute
+check. Enable it with
+
+    BIKESHARE_TRACE=output/trace.jsonl python main.py analyze   (or =- for stderr)
+    BIKESHARE_TRACE_MEMORY=1                                    also track tracemalloc peaks
+    python main.py --trace output/trace.jsonl [--trace-memory] analyze
+
+or instrumentation.enable() from code. The environment variables are read
+by main.main() through enable_from_env(); importing this module never turns
+tracing on by itself. profile() / --profile wraps a run in
+cProfile and dumps the stats for pstats / snakeviz.
+"""
+
+import cProfile
+import functools
+import inspect
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+ENV_TRACE = "BIKESHARE_TRACE"
+ENV_MEMORY = "BIKESHARE_TRACE_MEMORY"
+
+
+class _Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self.owns_tracemalloc = False   # started by enable(), so ours to stop
+        self.path = None
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def stack(self) -> list:
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    def emit(self, record: dict) -> None:
+        line = json.dumps(record, default=str) + "\n"
+        with self.lock:
+            if self.path in (None, "-"):
+                sys.stderr.write(line)
+            else:
+                with open(self.path, "a") as f:
+                    f.write(line)
+
+
+_tracer = _Tracer()
+
+
+def enable(path: str | None = "-", memory: bool = False) -> None:
+    """Start emitting spans to path ("-" = stderr); memory=True tracks tracemalloc peaks."""
+    if path not in (None, "-"):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    _tracer.path = path
+    _tracer.memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _tracer.owns_tracemalloc = True
+    elif not memory:
+        _stop_tracemalloc()
+    _tracer.enabled = True
+
+
+def _stop_tracemalloc() -> None:
+    """Stop tracemalloc if enable() started it; someone else's is left running."""
+    if _tracer.owns_tracemalloc and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _tracer.owns_tracemalloc = False
+
+
+def disable() -> None:
+    """Stop emitting spans (and tracing allocations)."""
+    _tracer.enabled = False
+    _stop_tracemalloc()
+    _tracer.memory = False
+
+
+def is_enabled() -> bool:
+    return _tracer.enabled
+
+
+class span:
+    """Context manager timing one stage.
+
+    Args:
+        name: stage name, e.g. "utils.load_data".
+        rows: rows processed, if known up front (or set later with annotate).
+        bytes_read: bytes read from disk, likewise.
+        **attrs: extra fields for the trace record.
+    """
+
+    def __init__(self, name: str, rows: int | None = None, bytes_read: int | None = None, **attrs):
+        self.name = name
+        self.fields = {"rows": rows, "bytes_read": bytes_read, **attrs}
+        self.active = False
+
+    def set(self, **fields) -> None:
+        self.fields.update(fields)
+
+    def __enter__(self):
+        if not _tracer.enabled:
+            return self
+        self.active = True
+        stack = _tracer.stack()
+        self.parent = stack[-1].name if stack else None
+        self.depth = len(stack)
+        stack.append(self)
+        self.child_peak = 0
+        if _tracer.memory and tracemalloc.is_tracing():
+            # peaks are per span: remember the parent's peak so far, then reset
+            current, peak = tracemalloc.get_traced_memory()
+            if stack[:-1]:
+                stack[-2].child_peak = max(stack[-2].child_peak, peak)
+            self.memory_start = current
+            tracemalloc.reset_peak()
+        self.start = datetime.now()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.active:
+            return False
+        duration = time.perf_counter() - self.t0
+        stack = _tracer.stack()
+        stack.pop()
+        record = {
+            "span": self.name,
+            "parent": self.parent,
+            "depth": self.depth,
+            "start": self.start.isoformat(timespec="milliseconds"),
+            "duration_s": round(duration, 6),
+        }
+        record.update(self.fields)
+        rows = self.fields.get("rows")
+        record["rows_per_s"] = round(rows / duration, 1) if rows and duration > 0 else None
+        if _tracer.memory and tracemalloc.is_tracing() and hasattr(self, "memory_start"):
+            peak = max(self.child_peak, tracemalloc.get_traced_memory()[1])
+            record["memory_peak_mb"] = round((peak - self.memory_start) / 1024**2, 3)
+            if stack:
+                stack[-1].child_peak = max(stack[-1].child_peak, peak)
+        record["status"] = "ok" if exc_type is None else "error"
+        if exc_type is not None:
+            record["error"] = f"{exc_type.__name__}: {exc}"
+        _tracer.emit(record)
+        self.active = False
+        return False
+
+
+def annotate(**fields) -> None:
+    """Set fields (rows, bytes_read ...) on the innermost open span; no-op when disabled."""
+    if _tracer.enabled:
+        stack = _tracer.stack()
+        if stack:
+            stack[-1].set(**fields)
+
+
+def traced(name: str | None = None, rows: str | None = None):
+    """Decorator running the function inside a span.
+
+    Args:
+        name: span name; defaults to module.function.
+        rows: name of the argument whose len() is the rows processed.
+    """
+    def decorator(func):
+        span_name = name or f"{func.__module__}.{func.__qualname__}"
+        signature = inspect.signature(func) if rows else None
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _tracer.enabled:
+                return func(*args, **kwargs)
+            n_rows = None
+            if rows:
+                value = signature.bind_partial(*args, **kwargs).arguments.get(rows)
+                n_rows = len(value) if hasattr(value, "__len__") else None
+            with span(span_name, rows=n_rows):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def file_bytes(*paths) -> int:
+    """Total size of the given files (missing ones count 0)."""
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+
+@contextmanager
+def profile(path: str = "output/profile.prof", top: int = 20):
+    """Run the block under cProfile, dump the stats to path and print the top functions."""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        profiler.dump_stats(path)
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(top)
+        print(f"Profile saved to {path}", file=sys.stderr)
+
+
+def enable_from_env() -> None:
+    """Enable tracing if BIKESHARE_TRACE is set."""
+    path = os.environ.get(ENV_TRACE)
+    if path:
+        enable(path, memory=os.environ.get(ENV_MEMORY, "") not in ("", "0"))
@@ -1,25 +1,146 @@
-import utils
-import analyzer
-import visualization
+"""
+Command line entry point.
 
+    python main.py clean [--force] [--streaming]
+    python main.py analyze
+    python main.py report [--formats txt,md,json]
+    python main.py plot [--sets] [--workers N] [--force]
+    python main.py stats
+    python main.py serve [--host H] [--port P]
+    python main.py --trace output/trace.jsonl [--trace-memory] [--profile output/run.prof] <command>
 
-def main():
-    # load data cleaner
-    maintenance_data_copy,valid_stationsdata,valid_tripsdata = utils.check_and_load_clean_data()
-    
-    # #Analysis result
-    # analyzer.maintenance_data_analysis(maintenance_data_copy)
-    # analyzer.tripsdata_analysis(valid_tripsdata)
-    # analyzer.data_analysis_report(analyzer.data_analysis_results)
+Each command imports only the modules it needs, so a short `clean` run does
+not pay for matplotlib and a `stats` run does not pay for the analyzer.
+Without a command, `clean` is run (load the cleaned data, cleaning if needed).
+--trace writes one JSON span per pipeline stage (see instrumentation.py),
+--profile runs the command under cProfile.
+"""
 
-    # #Data Visualization
-    # visualization.plot_trips_per_station(valid_tripsdata,valid_stationsdata)
-    # visualization.plot_monthly_trend(valid_tripsdata)
-    # visualization.plot_duration_histogram(valid_tripsdata)
-    # visualization.plot_duration_by_user_type(valid_tripsdata)
-    
+import argparse
+from contextlib import ExitStack
+
+
+def cmd_clean(args):
+    import utils
+
+    if args.streaming:
+        utils.stream_clean_data(chunksize=args.chunksize)
+    elif args.force:
+        utils.load_clean_data()
+    else:
+        utils.check_and_load_clean_data()
+
+
+def _run_analysis(with_utilization: bool = False):
+    import utils
+    import analyzer
+
+    maintenance_data_copy, valid_stationsdata, valid_tripsdata = utils.check_and_load_clean_data()
+    analyzer.maintenance_data_analysis(maintenance_data_copy)
+    analyzer.tripsdata_analysis(valid_tripsdata, with_utilization=with_utilization)
+    return analyzer
+
+
+def cmd_analyze(args):
+    results = _run_analysis().data_analysis_results
+    print(f"Total Trips: {results['total_trips']}")
+    print(f"Total Distance (km): {results['total_distance']:.2f}")
+    print(f"Average Trip Duration: {results['average_duration']}")
+    print(f"Trip Completion Rate: {results['trips_completed_rate']}%")
+    print(f"Bike Utilization Rate: {results['bike_utilization_rate']}%")
+
+
+def cmd_report(args):
+    # the report has a fleet utilization line, the printed headline metrics do not
+    analyzer = _run_analysis(with_utilization=True)
+    analyzer.data_analysis_report(analyzer.data_analysis_results, formats=args.formats.split(","))
+
+
+def cmd_plot(args):
+    import utils
+    import visualization
+
+    _, valid_stationsdata, valid_tripsdata = utils.check_and_load_clean_data()
+    # the four main charts are jobs too: drawn in parallel, skipped when unchanged
+    jobs = visualization.main_figure_jobs(valid_tripsdata, valid_stationsdata)
+    if args.sets:
+        jobs += visualization.station_figure_jobs(valid_tripsdata, valid_stationsdata)
+        jobs += visualization.monthly_figure_jobs(valid_tripsdata)
+    visualization.render_figures(jobs, workers=args.workers, force=args.force)
+
+
+def cmd_stats(args):
+    import utils
+    import numerical
+
+    _, _, valid_tripsdata = utils.check_and_load_clean_data()
+    stats = numerical.trip_duration_stats(valid_tripsdata["duration_minutes"].to_numpy())
+    print("Trip duration (minutes):")
+    for name, value in stats.items():
+        print(f"  {name}: {value:.2f}")
+    numerical.min_max_distance()
+
+
+def cmd_serve(args):
+    import service
+
+    service.serve(args.host, args.port)
+
+
+COMMANDS = {
+    "clean": (cmd_clean, "clean the raw CSVs (or load the up-to-date cleaned cache)"),
+    "analyze": (cmd_analyze, "run the trip and maintenance analysis and print the headline metrics"),
+    "report": (cmd_report, "run the analysis and write output/summary_report.txt / .md / .json"),
+    "plot": (cmd_plot, "render the figures to output/figures/"),
+    "stats": (cmd_stats, "duration statistics and closest / farthest stations"),
+    "serve": (cmd_serve, "serve the metrics as JSON over local HTTP"),
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Bike sharing operations & usage analytics")
+    parser.add_argument("--trace", metavar="PATH", help="write JSON-lines stage spans to PATH ('-' = stderr)")
+    parser.add_argument("--trace-memory", action="store_true", help="record tracemalloc peaks in the spans")
+    parser.add_argument("--profile", metavar="PATH", help="run under cProfile and dump the stats to PATH")
+    subparsers = parser.add_subparsers(dest="command")
+    for name, (func, help_text) in COMMANDS.items():
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.set_defaults(func=func)
+        if name == "clean":
+            sub.add_argument("--force", action="store_true", help="clean again even if the cache is current")
+            sub.add_argument("--streaming", action="store_true", help="clean trips.csv chunk by chunk (out of core)")
+            sub.add_argument("--chunksize", type=int, default=200_000, help="rows per chunk with --streaming")
+        if name == "report":
+            sub.add_argument("--formats", default="txt,md,json", help="comma-separated report formats (txt, md, json)")
+        if name == "plot":
+            sub.add_argument("--sets", action="store_true", help="also render the per-station and per-month figure sets")
+            sub.add_argument("--force", action="store_true", help="redraw figures even if their data did not change")
+            sub.add_argument("--workers", type=int, default=None, help="render processes (default: one per CPU)")
+        if name == "serve":
+            sub.add_argument("--host", default="127.0.0.1", help="address to listen on")
+            sub.add_argument("--port", type=int, default=8050, help="port to listen on")
+    parser.set_defaults(func=cmd_clean, force=False, streaming=False, chunksize=200_000)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    import instrumentation
+
+    # --trace wins over BIKESHARE_TRACE
+    instrumentation.enable_from_env()
+    if args.trace:
+        instrumentation.enable(args.trace, memory=args.trace_memory)
+    if not (instrumentation.is_enabled() or args.profile):
+        args.func(args)
+        return
+
+    with ExitStack() as stack:
+        if args.profile:
+            stack.enter_context(instrumentation.profile(args.profile))
+        stack.enter_context(instrumentation.span(f"main.{args.command or 'clean'}"))
+        args.func(args)
 
-  
 
 if __name__ == "__main__":
-    main()  
\ No newline at end of file
+    main()
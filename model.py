@@ -157,6 +157,112 @@ class User(Entity):
     def __str__(self):
         return f"User({self.name}, type={self.user_type} has been created)"
 
+# =========================
+# Slotted variants
+# =========================
+# 同样的字段和校验，但 slots=True：没有每个对象的 __dict__，几百万个对象时省很多内存。
+# 不能继承上面的类（父类有 __dict__ 子类也会有），所以单独一套继承关系。
+@dataclass(slots=True)
+class SlottedEntity(ABC):
+    id: str
+    created_at: datetime
+
+    def __post_init__(self):
+        if not self.id:
+            raise ValueError("id must be a non-empty string")
+
+    @abstractmethod
+    def __str__(self):
+        pass
+
+
+@dataclass(slots=True)
+class SlottedBike(SlottedEntity):
+    bike_type: str
+    _status: str = field(repr=False)
+
+    VALID_TYPES: ClassVar[tuple[str, ...]] = Bike.VALID_TYPES
+    VALID_STATUSES: ClassVar[tuple[str, ...]] = Bike.VALID_STATUSES
+
+    def __post_init__(self):
+        # slots=True 会重新创建这个类，零参数的 super() 就找不到它了，所以显式传类名
+        super(SlottedBike, self).__post_init__()
+        if self.bike_type not in self.VALID_TYPES:
+            raise ValueError(f"Invalid bike_type: {self.bike_type}")
+        self.status = self._status
+
+    @property
+    def status(self) -> str:
+        return self._status
+
+    @status.setter
+    def status(self, value: str):
+        if value not in self.VALID_STATUSES:
+            raise ValueError(f"Invalid status: {value}")
+        self._status = value
+
+    def __str__(self):
+        return f"Bike({self.id}, {self.bike_type}, {self.status})"
+
+
+@dataclass(slots=True)
+class SlottedClassicBike(SlottedBike):
+    gear_count: int = 7
+
+    def __post_init__(self):
+        super(SlottedClassicBike, self).__post_init__()
+        if self.gear_count <= 0:
+            raise ValueError("gear_count must be positive")
+        self.bike_type = "classic"
+
+    def __str__(self):
+        return f"ClassicBike({self.id}, gears={self.gear_count}, {self.status})"
+
+
+@dataclass(slots=True)
+class SlottedElectricBike(SlottedBike):
+    battery_level: float = 100.0
+    max_range_km: float = 50.0
+
+    def __post_init__(self):
+        super(SlottedElectricBike, self).__post_init__()
+        if not (0 <= self.battery_level <= 100):
+            raise ValueError("battery_level must be between 0 and 100")
+        if self.max_range_km <= 0:
+            raise ValueError("max_range_km must be positive")
+        self.bike_type = "electric"
+
+    def __str__(self):
+        return f"ElectricBike({self.id}, battery={self.battery_level}%)"
+
+
+@dataclass(slots=True)
+class SlottedStation(SlottedEntity):
+    name: str
+    capacity: int
+    latitude: float
+    longitude: float
+
+    def __str__(self):
+        return f"Station({self.name}, capacity={self.capacity})"
+
+
+@dataclass(slots=True)
+class SlottedUser(SlottedEntity):
+    name: str
+    email: str
+    user_type: str
+
+    VALID_TYPES: ClassVar[tuple[str, ...]] = User.VALID_TYPES
+
+    def __post_init__(self):
+        super(SlottedUser, self).__post_init__()
+        if self.user_type not in self.VALID_TYPES:
+            raise ValueError("Invalid user_type")
+
+    def __str__(self):
+        return f"User({self.name}, type={self.user_type})"
+
 # =========================
 # test user und bike object creating
 # =========================
@@ -3,6 +3,7 @@ NumPy-based numerical computations for the CityBike platform.
 
 Students should implement:
     - Station distance matrix using Euclidean distance
+    - Haversine distance engine (km, tiled, condensed or memory-mapped)
     - Vectorized trip statistics (mean, median, std, percentiles)
     - Outlier detection using z-scores
     - Vectorized fare calculation across all trips
@@ -10,11 +11,15 @@ Students should implement:
 
 import numpy as np
 import pandas as pd
+
+from sketches import KLLSketch
+from instrumentation import traced
  
 # ---------------------------------------------------------------------------
 # Distance calculations
 # ---------------------------------------------------------------------------
 
+@traced("numerical.station_distance_matrix", rows="latitudes")
 def station_distance_matrix(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
 
     """ 计算两站之间的距离
@@ -47,6 +52,102 @@ def station_distance_matrix(latitudes: np.ndarray, longitudes: np.ndarray) -> np
 
     return dist_matrix
 
+# ---------------------------------------------------------------------------
+# Haversine distance engine
+# ---------------------------------------------------------------------------
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Element-wise great-circle distance in km (inputs in degrees, broadcastable)."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=np.float64)) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def condensed_index(i, j, n: int):
+    """Position of pair (i, j), i != j, in condensed upper-triangle storage.
+
+    Same layout as scipy.spatial.distance.pdist: row 0 holds (0,1)..(0,n-1),
+    then row 1 holds (1,2)..(1,n-1), and so on.
+    """
+    i, j = np.minimum(i, j), np.maximum(i, j)
+    return n * i - i * (i + 1) // 2 + (j - i - 1)
+
+
+def _tile_rows(n: int, max_tile_mb: float) -> int:
+    # a tile keeps about four float64 (rows x n) temporaries alive at once
+    return max(1, min(n, int(max_tile_mb * 1024**2 // (4 * 8 * max(n, 1)))))
+
+
+@traced("numerical.haversine_distance_matrix", rows="latitudes")
+def haversine_distance_matrix(
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+    dtype=np.float32,
+    condensed: bool = False,
+    out_path: str | None = None,
+    max_tile_mb: float = 64.0,
+) -> np.ndarray:
+    """Pairwise great-circle distances in km, computed in tiles of rows.
+
+    Only one block of rows x n is computed at a time (sized by
+    max_tile_mb), so peak memory is the result plus one tile, instead of
+    several full n x n temporaries.
+
+    Args:
+        latitudes, longitudes: station coordinates in degrees.
+        dtype: result dtype; float32 halves the result size.
+        condensed: return only the upper triangle (n*(n-1)/2 values, see
+            condensed_index) instead of the full symmetric n x n matrix.
+        out_path: write the result into a .npy memory map at this path
+            (for networks whose matrix does not fit in RAM) and return it.
+        max_tile_mb: memory budget of one tile's temporaries.
+
+    Returns:
+        (n, n) or (n*(n-1)/2,) array, or np.memmap when out_path is given.
+    """
+    if len(latitudes) != len(longitudes):
+        raise ValueError("Latitude and longitude counts do not match and will lead to incorrect data calculations.")
+
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    n = len(lat)
+    shape = (n * (n - 1) // 2,) if condensed else (n, n)
+
+    if out_path is not None:
+        result = np.lib.format.open_memmap(out_path, mode="w+", dtype=dtype, shape=shape)
+    else:
+        result = np.empty(shape, dtype=dtype)
+
+    step = _tile_rows(n, max_tile_mb)
+    for start in range(0, n, step):
+        stop = min(start + step, n)
+        # condensed rows only need the columns right of the diagonal
+        first_col = start + 1 if condensed else 0
+        rows = slice(start, stop)
+        a = (
+            np.sin((lat[first_col:] - lat[rows, np.newaxis]) / 2) ** 2
+            + cos_lat[rows, np.newaxis] * cos_lat[first_col:] * np.sin((lon[first_col:] - lon[rows, np.newaxis]) / 2) ** 2
+        )
+        np.clip(a, 0.0, 1.0, out=a)
+        block = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a, out=a), out=a)
+
+        if not condensed:
+            result[rows] = block
+            continue
+        for i in range(start, stop):
+            offset = condensed_index(i, i + 1, n) if i < n - 1 else None
+            if offset is not None:
+                result[offset: offset + n - i - 1] = block[i - start, i + 1 - first_col:]
+
+    if out_path is not None:
+        result.flush()
+    return result
+
+
 # ---------------------------------------------------------------------------
 #  Distance calculations Test
 # ---------------------------------------------------------------------------
@@ -63,67 +164,72 @@ dist_matrix_ST100_ST103:
 -------------end test result----------
 '''
 # latitudes: np.ndarray, longitudes: np.ndarray
-def min_max_distance() -> np.ndarray:
-    # return dataframe
-    station_df = pd.read_csv("data/stations_clean.csv")
-    latitude = station_df["latitude"]
-    longitude = station_df["longitude"]
-
-    stations_matrix = station_distance_matrix(latitude,longitude)
-
-    # 把 n 维变成 1 维， return np.array, 所以可以做向量比较
-    flat = stations_matrix.flatten()
-    flat_nonzero = flat[flat > 0]
-    
-    # 找最小和最大值
-    min_dist = flat_nonzero.min()
-    max_dist = flat_nonzero.max()
-
-    # 原矩阵中的位置: 计算公式，比如min的index在flat是 5，而 matrix：3x3，那么它在matrix是5//3=1，5%3=2，matrix的index（1，2）
-    # np.array 没有index，需要list找
-    min_index = flat.tolist().index(min_dist)
-    max_index = flat.tolist().index(max_dist)
+@traced("numerical.min_max_distance")
+def min_max_distance() -> tuple:
+    """Closest and farthest station pairs (haversine km), via spatial.StationIndex.
+
+    The index finds both pairs without building the n x n matrix or
+    searching it through a Python list. Like the matrix version, zero
+    distances do not count: stations sharing coordinates are indexed once
+    (first one kept), so the closest pair is the smallest non-zero distance.
+    """
+    # imported here, spatial itself imports this module
+    from spatial import StationIndex
 
-    # 转回二维坐标 (i, j)，i行号，j列号，e.g arr(i,j) ,divmod(a, b) -> (a // b, a % b)
-    n = stations_matrix.shape[0]
-    min_i, min_j = divmod(min_index, n)
-    max_i, max_j = divmod(max_index, n)
+    station_df = pd.read_csv("data/stations_clean.csv")
+    # 同一坐标的站点只保留第一个, 否则最小距离是 0
+    index = StationIndex.from_frame(station_df.drop_duplicates(["latitude", "longitude"]))
+    min_a, min_b, min_dist = index.closest_pair()
+    max_a, max_b, max_dist = index.farthest_pair()
 
-    # min_i df中的行号，再取此行的列名就可以找到某值
     print("-----------------------------------------------------")
-    print("min_dist:", min_dist)
-    print("min_dist_stations:", station_df.iloc[min_i]["station_id"], station_df.iloc[min_j]["station_id"])
+    print("min_dist (km):", round(min_dist, 3))
+    print("min_dist_stations:", min_a, min_b)
 
-    print("max_dist:", max_dist)
-    print("max_dist_stations:", station_df.iloc[max_i]["station_id"], station_df.iloc[max_j]["station_id"])
+    print("max_dist (km):", round(max_dist, 3))
+    print("max_dist_stations:", max_a, max_b)
     print("-----------------------------------------------------")
+    return (min_a, min_b, min_dist), (max_a, max_b, max_dist)
 
-    print(stations_matrix)
-
-min_max_distance()
 
 
 # ---------------------------------------------------------------------------
 # Trip statistics
 # ---------------------------------------------------------------------------
 
-def trip_duration_stats(durations: np.ndarray) -> dict[str, float]:
+@traced("numerical.trip_duration_stats", rows="durations")
+def trip_duration_stats(durations) -> dict[str, float]:
     """Compute summary statistics for trip durations.
 
     Args:
-        durations: 1-D array of trip durations in minutes.
+        durations: 1-D array of trip durations in minutes (exact), or a
+            sketches.KLLSketch fed chunk by chunk (approximate percentiles,
+            exact mean and std) for data that does not fit in memory.
 
     Returns:
-        Dict with keys: mean, median, std, p25, p75, p90.
-
-    TODO: use NumPy functions (np.mean, np.median, np.std, np.percentile).
+        Dict with keys: mean, median, std, p25, p75, p90, p99.
     """
-    # Example (partially done):
+    if isinstance(durations, KLLSketch):
+        p25, p50, p75, p90, p99 = durations.quantile([0.25, 0.50, 0.75, 0.90, 0.99])
+        return {
+            "mean": float(durations.mean),
+            "median": float(p50),
+            "std": durations.std,
+            "p25": float(p25),
+            "p75": float(p75),
+            "p90": float(p90),
+            "p99": float(p99),
+        }
+
+    p25, p75, p90, p99 = np.percentile(durations, [25, 75, 90, 99])
     return {
         "mean": float(np.mean(durations)),
         "median": float(np.median(durations)),
         "std": float(np.std(durations)),
-        # TODO: add p25, p75, p90 using np.percentile
+        "p25": float(p25),
+        "p75": float(p75),
+        "p90": float(p90),
+        "p99": float(p99),
     }
 
 
@@ -0,0 +1,198 @@
+"""
+Origin-destination (OD) matrix over integer-coded stations.
+
+Station ids are encoded to dense integers once (start and end share one
+set of labels). Trips are then counted per (origin, destination, hour,
+weekday, user_type) cell with a bincount over one combined integer key,
+and only the cells that occur are kept: a sparse COO table whose size is
+bounded by the number of trips, not by stations². Route analytics, flow
+charts and the top-routes report all read from this one structure.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from aggregation import encode_column, encode_pair, top_codes
+
+MEASURES = ("count", "duration", "distance")
+
+
+def _weekday(start: np.ndarray) -> np.ndarray:
+    # 1970-01-01 was a Thursday, shift so Monday == 0 like dt.weekday
+    return (start.astype("datetime64[D]").astype(np.int64) + 3) % 7
+
+
+class ODMatrix:
+    """Sparse OD table: one row per occurring (origin, dest, hour, weekday, user_type).
+
+    Attributes:
+        stations: station labels; origin / dest are positions in it.
+        user_types: user_type labels; user_type is a position in it.
+        origin, dest, hour, weekday, user_type: int32 cell coordinates.
+        count: trips per cell (int64).
+        duration, distance: total duration_minutes / distance_km per cell.
+    """
+
+    def __init__(self, stations, user_types, origin, dest, hour, weekday, user_type, count, duration, distance):
+        self.stations = pd.Index(stations)
+        self.user_types = pd.Index(user_types)
+        self.origin = np.asarray(origin, dtype=np.int32)
+        self.dest = np.asarray(dest, dtype=np.int32)
+        self.hour = np.asarray(hour, dtype=np.int32)
+        self.weekday = np.asarray(weekday, dtype=np.int32)
+        self.user_type = np.asarray(user_type, dtype=np.int32)
+        self.count = np.asarray(count, dtype=np.int64)
+        self.duration = np.asarray(duration, dtype=np.float64)
+        self.distance = np.asarray(distance, dtype=np.float64)
+
+    @classmethod
+    def from_trips(cls, df: pd.DataFrame) -> "ODMatrix":
+        """Build the OD table from cleaned trips."""
+        origin, dest, stations = encode_pair(df["start_station_id"], df["end_station_id"])
+        type_codes, user_types = encode_column(df["user_type"])
+        start = df["start_time"].to_numpy(dtype="datetime64[s]")
+        hour = start.astype("datetime64[h]").astype(np.int64) % 24
+        weekday = _weekday(start)
+
+        valid = (origin >= 0) & (dest >= 0) & (type_codes >= 0) & ~np.isnat(start)
+        n_st, n_ut = len(stations), max(len(user_types), 1)
+        key = ((((origin.astype(np.int64) * n_st + dest) * 24 + hour) * 7 + weekday) * n_ut + type_codes)[valid]
+        duration = df["duration_minutes"].to_numpy(dtype=np.float64)[valid]
+        distance = df["distance_km"].to_numpy(dtype=np.float64)[valid]
+
+        # dense bincount while the key space is small, unique + bincount otherwise
+        space = n_st * n_st * 24 * 7 * n_ut
+        if space <= max(len(key), 1 << 20):
+            count = np.bincount(key, minlength=space)
+            cells = np.flatnonzero(count)
+            count = count[cells]
+            duration = np.bincount(key, weights=duration, minlength=space)[cells]
+            distance = np.bincount(key, weights=distance, minlength=space)[cells]
+        else:
+            cells, inverse = np.unique(key, return_inverse=True)
+            count = np.bincount(inverse, minlength=len(cells))
+            duration = np.bincount(inverse, weights=duration, minlength=len(cells))
+            distance = np.bincount(inverse, weights=distance, minlength=len(cells))
+
+        rest, u = np.divmod(cells, n_ut)
+        rest, w = np.divmod(rest, 7)
+        rest, h = np.divmod(rest, 24)
+        o, d = np.divmod(rest, n_st)
+        return cls(stations, user_types, o, d, h, w, u, count, duration, distance)
+
+    def __len__(self):
+        return len(self.count)
+
+    @property
+    def total_trips(self) -> int:
+        return int(self.count.sum())
+
+    # -------- slicing --------
+    def _select(self, mask: np.ndarray) -> "ODMatrix":
+        return ODMatrix(
+            self.stations, self.user_types,
+            *(getattr(self, name)[mask] for name in ("origin", "dest", "hour", "weekday", "user_type")),
+            *(getattr(self, name)[mask] for name in MEASURES),
+        )
+
+    def slice(self, hour=None, weekday=None, user_type=None, origin=None, dest=None, station=None) -> "ODMatrix":
+        """Cells matching every given filter; each filter is a value or a list of values.
+
+        hour is 0-23, weekday 0 (Monday) - 6, user_type / origin / dest are labels.
+        station keeps the routes that start or end at the given station(s).
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if station is not None:
+            codes = self.stations.get_indexer(list(np.atleast_1d(station)))
+            mask &= np.isin(self.origin, codes) | np.isin(self.dest, codes)
+        for values, column, labels in (
+            (hour, self.hour, None),
+            (weekday, self.weekday, None),
+            (user_type, self.user_type, self.user_types),
+            (origin, self.origin, self.stations),
+            (dest, self.dest, self.stations),
+        ):
+            if values is None:
+                continue
+            values = np.atleast_1d(values)
+            if labels is not None:
+                values = labels.get_indexer(list(values))
+            mask &= np.isin(column, values)
+        return self._select(mask)
+
+    def weekday_totals(self, measure: str = "count") -> np.ndarray:
+        """Totals per weekday (0 = Monday) over all other dimensions."""
+        if measure not in MEASURES:
+            raise ValueError(f"measure must be one of {MEASURES}")
+        return np.bincount(self.weekday, weights=getattr(self, measure), minlength=7).astype(
+            np.int64 if measure == "count" else np.float64
+        )
+
+    # -------- views --------
+    def _route_totals(self, measure: str) -> tuple[np.ndarray, np.ndarray]:
+        """(route keys, totals) summed over hour / weekday / user_type."""
+        if measure not in MEASURES:
+            raise ValueError(f"measure must be one of {MEASURES}")
+        keys = self.origin.astype(np.int64) * len(self.stations) + self.dest
+        routes, inverse = np.unique(keys, return_inverse=True)
+        return routes, np.bincount(inverse, weights=getattr(self, measure), minlength=len(routes))
+
+    def dense(self, measure: str = "count") -> np.ndarray:
+        """stations x stations matrix of a measure (rows = origin). Only for small networks."""
+        n = len(self.stations)
+        routes, totals = self._route_totals(measure)
+        matrix = np.zeros(n * n, dtype=np.int64 if measure == "count" else np.float64)
+        matrix[routes] = totals
+        return matrix.reshape(n, n)
+
+    def routes(self, measure: str = "count") -> pd.Series:
+        """Totals per occurring (start_station_id, end_station_id) route."""
+        routes, totals = self._route_totals(measure)
+        origin, dest = np.divmod(routes, len(self.stations))
+        return pd.Series(
+            totals.astype(np.int64) if measure == "count" else totals,
+            index=pd.MultiIndex.from_arrays(
+                [self.stations[origin], self.stations[dest]], names=["start_station_id", "end_station_id"]
+            ),
+            name=measure,
+        )
+
+    def top_routes(self, n: int = 10, measure: str = "count") -> pd.Series:
+        """n busiest routes, ties in station order (as station_to_station_top10)."""
+        routes = self.routes(measure)
+        return routes.iloc[top_codes(routes.to_numpy(), n)].rename(None)
+
+    def to_frame(self) -> pd.DataFrame:
+        """The COO table with station / user_type labels."""
+        return pd.DataFrame({
+            "start_station_id": self.stations[self.origin],
+            "end_station_id": self.stations[self.dest],
+            "hour": self.hour,
+            "weekday": self.weekday,
+            "user_type": self.user_types[self.user_type],
+            "count": self.count,
+            "total_duration": self.duration,
+            "total_distance": self.distance,
+        })
+
+    # -------- persistence --------
+    def save(self, path: str) -> None:
+        """Write the table to a .npz file (no pickling)."""
+        arrays = {name: getattr(self, name) for name in ("origin", "dest", "hour", "weekday", "user_type") + MEASURES}
+        arrays["stations"] = np.array(self.stations, dtype=str)
+        arrays["user_types"] = np.array(self.user_types, dtype=str)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> "ODMatrix":
+        """Read a table written by save()."""
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(
+                arrays["stations"], arrays["user_types"],
+                *(arrays[name] for name in ("origin", "dest", "hour", "weekday", "user_type") + MEASURES),
+            )
@@ -0,0 +1,405 @@
+"""
+Columnar registries for bikes, stations and users.
+
+Each registry keeps one NumPy array per attribute (enums as small integer
+codes, ids as fixed-width UTF-8 bytes looked up through their sort order),
+so a million bikes cost a few tens of MB instead of one Python object
+each. Entities are handed out on demand:
+
+    fleet["BK200"]              a lightweight view reading / writing the arrays
+    fleet.materialize("BK200")  a model.SlottedClassicBike / SlottedElectricBike
+
+Validation and status transitions run over whole columns:
+
+    fleet.transition("in_use", "available")              every in-use bike
+    fleet.transition("available", "maintenance", ["BK201", "BK305"])
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from model import (
+    Bike,
+    SlottedClassicBike,
+    SlottedElectricBike,
+    SlottedStation,
+    SlottedUser,
+    User,
+)
+
+
+def _encode(values, valid: tuple, name: str) -> np.ndarray:
+    """int8 codes of values in valid; ValueError naming the invalid ones."""
+    values = pd.Index(np.asarray(values, dtype=object))
+    codes = pd.Index(valid).get_indexer(values)
+    bad = codes < 0
+    if bad.any():
+        examples = sorted(set(map(str, values[bad])))[:5]
+        raise ValueError(f"Invalid {name} in {int(bad.sum())} rows, e.g. {examples}")
+    return codes.astype(np.int8)
+
+
+def _keys(ids) -> np.ndarray:
+    """Fixed-width UTF-8 bytes of ids (np.bytes_ array)."""
+    return np.char.encode(np.atleast_1d(np.asarray(ids)).astype(str), "utf-8")
+
+
+def _decode(keys: np.ndarray) -> np.ndarray:
+    return np.char.decode(keys, "utf-8").astype(object)
+
+
+def _timestamps(created_at, n: int) -> np.ndarray:
+    if created_at is None:
+        return np.full(n, np.datetime64(datetime.now(), "s"))
+    values = np.asarray(pd.to_datetime(created_at), dtype="datetime64[s]")
+    return np.broadcast_to(values, (n,)).copy()
+
+
+class _Registry:
+    """Shared machinery: id lookup, views, column access, frame export."""
+
+    view_class = None
+    columns = ()
+
+    def __init__(self, ids, created_at=None):
+        # 按排序顺序二分查找, 不需要每个 id 一个 Python 字符串
+        self._keys = _keys(ids)
+        self._order = np.argsort(self._keys, kind="stable")
+        ordered = self._keys[self._order]
+        duplicated = ordered[1:] == ordered[:-1]
+        if duplicated.any():
+            raise ValueError(f"Duplicate ids, e.g. {_decode(np.unique(ordered[1:][duplicated])[:5]).tolist()}")
+        if (self._keys == b"").any():
+            raise ValueError("id must be a non-empty string")
+        self.created_at = _timestamps(created_at, len(self._keys))
+
+    @property
+    def ids(self) -> np.ndarray:
+        """All ids as an object array of str, decoded on each call."""
+        return _decode(self._keys)
+
+    def id_at(self, position: int) -> str:
+        return self._keys[position].decode("utf-8")
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, entity_id):
+        return isinstance(entity_id, str) and self._find(entity_id)[0] >= 0
+
+    def _find(self, ids) -> np.ndarray:
+        """Row positions of ids, -1 for unknown ones."""
+        keys = _keys(ids)
+        if not len(self):
+            return np.full(len(keys), -1, dtype=np.intp)
+        slot = np.searchsorted(self._keys, keys, sorter=self._order)
+        pos = self._order[np.minimum(slot, len(self) - 1)]
+        return np.where(self._keys[pos] == keys, pos, -1)
+
+    def positions(self, ids) -> np.ndarray:
+        """Row positions of ids; KeyError for unknown ones."""
+        pos = self._find(ids)
+        if (pos < 0).any():
+            raise KeyError(f"Unknown ids: {np.atleast_1d(ids)[pos < 0][:5].tolist()}")
+        return pos
+
+    def __getitem__(self, entity_id):
+        return self.view_class(self, int(self.positions(entity_id)[0]))
+
+    def view(self, position: int):
+        return self.view_class(self, position)
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self.view_class(self, position)
+
+    def column(self, name: str) -> np.ndarray:
+        """Decoded values of one attribute column."""
+        return getattr(self, name)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {"id": self.ids, "created_at": self.created_at, **{c: self.column(c) for c in self.columns}}
+        )
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [getattr(self, a) for a in vars(self) if isinstance(getattr(self, a), np.ndarray)]
+        return sum(a.nbytes for a in arrays)
+
+
+class _View:
+    """Lightweight handle on one registry row; attributes read the arrays."""
+
+    __slots__ = ("_registry", "_pos")
+
+    def __init__(self, registry, position: int):
+        self._registry = registry
+        self._pos = position
+
+    @property
+    def id(self) -> str:
+        return self._registry.id_at(self._pos)
+
+    @property
+    def created_at(self) -> datetime:
+        return pd.Timestamp(self._registry.created_at[self._pos]).to_pydatetime()
+
+    def materialize(self):
+        """Full slotted model object for this row."""
+        return self._registry.materialize(self.id)
+
+    def __repr__(self):
+        fields = ", ".join(f"{c}={getattr(self, c)!r}" for c in self._registry.columns)
+        return f"{type(self).__name__}(id={self.id!r}, {fields})"
+
+
+# =========================
+# Bikes
+# =========================
+class BikeView(_View):
+    __slots__ = ()
+
+    @property
+    def bike_type(self) -> str:
+        return Bike.VALID_TYPES[self._registry.type_codes[self._pos]]
+
+    @property
+    def status(self) -> str:
+        return Bike.VALID_STATUSES[self._registry.status_codes[self._pos]]
+
+    @status.setter
+    def status(self, value: str):
+        self._registry.status_codes[self._pos] = _encode([value], Bike.VALID_STATUSES, "status")[0]
+
+    @property
+    def gear_count(self) -> int:
+        return int(self._registry.gear_count[self._pos])
+
+    @property
+    def battery_level(self) -> float:
+        return float(self._registry.battery_level[self._pos])
+
+    @property
+    def max_range_km(self) -> float:
+        return float(self._registry.max_range_km[self._pos])
+
+
+class BikeFleet(_Registry):
+    """All bikes as columns: type / status codes, gears, battery and range.
+
+    Args:
+        ids: bike ids.
+        bike_types: "classic" / "electric" per bike.
+        statuses: per bike (or one value); default "available".
+        created_at: per bike (or one value); default now.
+        gear_count, battery_level, max_range_km: per bike or one value;
+            gear_count only matters for classic bikes, the other two for
+            electric ones.
+    """
+
+    view_class = BikeView
+    columns = ("bike_type", "status", "gear_count", "battery_level", "max_range_km")
+
+    def __init__(self, ids, bike_types, statuses="available", created_at=None,
+                 gear_count=7, battery_level=100.0, max_range_km=50.0):
+        super().__init__(ids, created_at)
+        n = len(self)
+        self.type_codes = _encode(np.broadcast_to(bike_types, (n,)), Bike.VALID_TYPES, "bike_type")
+        self.status_codes = _encode(np.broadcast_to(statuses, (n,)), Bike.VALID_STATUSES, "status")
+        self.gear_count = np.broadcast_to(np.asarray(gear_count, dtype=np.int16), (n,)).copy()
+        self.battery_level = np.broadcast_to(np.asarray(battery_level, dtype=np.float32), (n,)).copy()
+        self.max_range_km = np.broadcast_to(np.asarray(max_range_km, dtype=np.float32), (n,)).copy()
+
+        classic = self.type_codes == Bike.VALID_TYPES.index("classic")
+        if (self.gear_count[classic] <= 0).any():
+            raise ValueError("gear_count must be positive")
+        electric = ~classic
+        if ((self.battery_level[electric] < 0) | (self.battery_level[electric] > 100)).any():
+            raise ValueError("battery_level must be between 0 and 100")
+        if (self.max_range_km[electric] <= 0).any():
+            raise ValueError("max_range_km must be positive")
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, **kwargs) -> "BikeFleet":
+        """One bike per distinct bike_id of a trips / maintenance frame (first bike_type seen)."""
+        bikes = df[["bike_id", "bike_type"]].dropna().drop_duplicates("bike_id")
+        return cls(bikes["bike_id"].astype(str), bikes["bike_type"].astype(str), **kwargs)
+
+    def column(self, name: str) -> np.ndarray:
+        if name == "bike_type":
+            return np.asarray(Bike.VALID_TYPES, dtype=object)[self.type_codes]
+        if name == "status":
+            return np.asarray(Bike.VALID_STATUSES, dtype=object)[self.status_codes]
+        return super().column(name)
+
+    # -------- status --------
+    def status_counts(self) -> pd.Series:
+        counts = np.bincount(self.status_codes, minlength=len(Bike.VALID_STATUSES))
+        return pd.Series(counts, index=pd.Index(Bike.VALID_STATUSES, name="status"), name="bikes")
+
+    def ids_with_status(self, status: str) -> np.ndarray:
+        code = Bike.VALID_STATUSES.index(status)
+        return _decode(self._keys[self.status_codes == code])
+
+    def set_status(self, ids, status: str) -> None:
+        """Set the status of the given bikes, whatever it was."""
+        self.status_codes[self.positions(ids)] = _encode([status], Bike.VALID_STATUSES, "status")[0]
+
+    def transition(self, from_status: str, to_status: str, ids=None) -> int:
+        """Move bikes in from_status to to_status (all of them, or only the given ids).
+
+        Bikes among ids that are not in from_status are left alone.
+
+        Returns:
+            Number of bikes moved.
+        """
+        from_code, to_code = _encode([from_status, to_status], Bike.VALID_STATUSES, "status")
+        if ids is None:
+            moved = np.flatnonzero(self.status_codes == from_code)
+        else:
+            pos = self.positions(ids)
+            moved = pos[self.status_codes[pos] == from_code]
+        self.status_codes[moved] = to_code
+        return len(moved)
+
+    def materialize(self, bike_id):
+        pos = int(self.positions(bike_id)[0])
+        common = dict(
+            id=self.id_at(pos),
+            created_at=pd.Timestamp(self.created_at[pos]).to_pydatetime(),
+            bike_type=Bike.VALID_TYPES[self.type_codes[pos]],
+            _status=Bike.VALID_STATUSES[self.status_codes[pos]],
+        )
+        if common["bike_type"] == "classic":
+            return SlottedClassicBike(**common, gear_count=int(self.gear_count[pos]))
+        return SlottedElectricBike(
+            **common, battery_level=float(self.battery_level[pos]), max_range_km=float(self.max_range_km[pos])
+        )
+
+
+# =========================
+# Stations
+# =========================
+class StationView(_View):
+    __slots__ = ()
+
+    @property
+    def name(self) -> str:
+        return self._registry.names[self._pos]
+
+    @property
+    def capacity(self) -> int:
+        return int(self._registry.capacity[self._pos])
+
+    @property
+    def latitude(self) -> float:
+        return float(self._registry.latitude[self._pos])
+
+    @property
+    def longitude(self) -> float:
+        return float(self._registry.longitude[self._pos])
+
+
+class StationRegistry(_Registry):
+    """All stations as columns: name, capacity and coordinates."""
+
+    view_class = StationView
+    columns = ("name", "capacity", "latitude", "longitude")
+
+    def __init__(self, ids, names, capacity, latitude, longitude, created_at=None):
+        super().__init__(ids, created_at)
+        self.names = np.asarray(names, dtype=object)
+        self.capacity = np.asarray(capacity, dtype=np.int32)
+        self.latitude = np.asarray(latitude, dtype=np.float64)
+        self.longitude = np.asarray(longitude, dtype=np.float64)
+
+    @classmethod
+    def from_frame(cls, stations: pd.DataFrame, **kwargs) -> "StationRegistry":
+        return cls(stations["station_id"], stations["station_name"], stations["capacity"],
+                   stations["latitude"], stations["longitude"], **kwargs)
+
+    def column(self, name: str) -> np.ndarray:
+        return self.names if name == "name" else super().column(name)
+
+    def materialize(self, station_id) -> SlottedStation:
+        pos = int(self.positions(station_id)[0])
+        return SlottedStation(
+            self.id_at(pos), pd.Timestamp(self.created_at[pos]).to_pydatetime(), self.names[pos],
+            int(self.capacity[pos]), float(self.latitude[pos]), float(self.longitude[pos]),
+        )
+
+
+# =========================
+# Users
+# =========================
+class UserView(_View):
+    __slots__ = ()
+
+    @property
+    def name(self) -> str:
+        return self._registry.name_at(self._pos)
+
+    @property
+    def email(self) -> str:
+        return self._registry.email_at(self._pos)
+
+    @property
+    def user_type(self) -> str:
+        return User.VALID_TYPES[self._registry.type_codes[self._pos]]
+
+    @user_type.setter
+    def user_type(self, value: str):
+        self._registry.type_codes[self._pos] = _encode([value], User.VALID_TYPES, "user_type")[0]
+
+
+class UserRegistry(_Registry):
+    """All users as columns: name, email and user_type code.
+
+    names and emails stay None when not given; a user's name then falls
+    back to the id and the email to "".
+    """
+
+    view_class = UserView
+    columns = ("name", "email", "user_type")
+
+    def __init__(self, ids, user_types, names=None, emails=None, created_at=None):
+        super().__init__(ids, created_at)
+        n = len(self)
+        self.type_codes = _encode(np.broadcast_to(user_types, (n,)), User.VALID_TYPES, "user_type")
+        self.names = None if names is None else np.asarray(names, dtype=object)
+        self.emails = None if emails is None else np.asarray(emails, dtype=object)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, **kwargs) -> "UserRegistry":
+        """One user per distinct user_id of a trips frame (first user_type seen)."""
+        users = df[["user_id", "user_type"]].dropna().drop_duplicates("user_id")
+        return cls(users["user_id"].astype(str), users["user_type"].astype(str), **kwargs)
+
+    def column(self, name: str) -> np.ndarray:
+        if name == "user_type":
+            return np.asarray(User.VALID_TYPES, dtype=object)[self.type_codes]
+        if name == "name":
+            return self.ids if self.names is None else self.names
+        if name == "email":
+            return np.full(len(self), "", dtype=object) if self.emails is None else self.emails
+        return super().column(name)
+
+    def name_at(self, position: int) -> str:
+        return self.id_at(position) if self.names is None else self.names[position]
+
+    def email_at(self, position: int) -> str:
+        return "" if self.emails is None else self.emails[position]
+
+    def type_counts(self) -> pd.Series:
+        counts = np.bincount(self.type_codes, minlength=len(User.VALID_TYPES))
+        return pd.Series(counts, index=pd.Index(User.VALID_TYPES, name="user_type"), name="users")
+
+    def materialize(self, user_id) -> SlottedUser:
+        pos = int(self.positions(user_id)[0])
+        return SlottedUser(
+            self.id_at(pos), pd.Timestamp(self.created_at[pos]).to_pydatetime(), self.name_at(pos),
+            self.email_at(pos), User.VALID_TYPES[self.type_codes[pos]],
+        )
@@ -0,0 +1,181 @@
+"""
+Streaming report writer.
+
+One ReportWriter writes the same report as plain text, Markdown and JSON
+at the same time, section by section, straight to the open files, so no
+format is ever held in memory as a whole. Large tables (outliers, all
+routes) are not embedded: export() writes them to their own CSV file in
+chunks, and the reports only carry their row count, a short preview and
+the file name.
+
+    with ReportWriter("output", "summary_report") as report:
+        report.heading("Trips")
+        report.value("total_trips", "Total Trips", 1229)
+        report.export("outliers_duration", "Outlier Trips", outliers, preview=5)
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+FORMATS = ("txt", "md", "json")
+
+
+def to_jsonable(value):
+    """Convert analyzer results (numpy scalars, Series, DataFrames ...) to JSON types."""
+    if isinstance(value, pd.DataFrame):
+        return [{k: to_jsonable(v) for k, v in row.items()} for row in value.to_dict(orient="records")]
+    if isinstance(value, pd.Series):
+        if isinstance(value.index, pd.MultiIndex):
+            return to_jsonable(value.rename(value.name or "value").reset_index())
+        return {str(k): to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, dict):
+        return {str(k): to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray, pd.Index)):
+        return [to_jsonable(v) for v in value]
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return None if pd.isna(value) else pd.Timestamp(value).isoformat()
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def _format_float(value: float) -> str:
+    # float32 columns would print as 82.199997 / 82.19999694824219
+    return f"{value:.6g}"
+
+
+def _markdown_cell(value) -> str:
+    if isinstance(value, float):
+        return _format_float(value)
+    return str(value).replace("|", "\\|").replace("\n", " ")
+
+
+class ReportWriter:
+    """Write one report to <out_dir>/<name>.txt / .md / .json as it is built.
+
+    Args:
+        out_dir: folder of the report and the exported tables.
+        name: base file name of the report.
+        formats: any of "txt", "md" and "json".
+        title: first line / heading of the report.
+    """
+
+    def __init__(self, out_dir: str = "output", name: str = "summary_report", formats=FORMATS,
+                 title: str = "Bike Sharing Data Analysis Summary Report"):
+        unknown = set(formats) - set(FORMATS)
+        if unknown:
+            raise ValueError(f"Unknown report formats: {sorted(unknown)}")
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        self.paths = {fmt: os.path.join(out_dir, f"{name}.{fmt}") for fmt in formats}
+        self.exports = {}
+        self._files = {fmt: open(path, "w", encoding="utf-8") for fmt, path in self.paths.items()}
+        self._json_started = False
+        self._write("txt", f"=== {title} ===\n\n")
+        self._write("md", f"# {title}\n\n")
+        self._write("json", "{")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write(self, fmt: str, text: str) -> None:
+        if fmt in self._files:
+            self._files[fmt].write(text)
+
+    def _json(self, key: str, value) -> None:
+        if "json" not in self._files:
+            return
+        prefix = ",\n  " if self._json_started else "\n  "
+        self._json_started = True
+        self._write("json", f"{prefix}{json.dumps(key)}: {json.dumps(to_jsonable(value), default=str)}")
+
+    def _markdown_table(self, frame: pd.DataFrame) -> None:
+        if "md" not in self._files:
+            return
+        columns = [str(c) for c in frame.columns]
+        self._write("md", "| " + " | ".join(columns) + " |\n")
+        self._write("md", "|" + "---|" * len(columns) + "\n")
+        for row in frame.itertuples(index=False):
+            self._write("md", "| " + " | ".join(_markdown_cell(v) for v in row) + " |\n")
+        self._write("md", "\n")
+
+    # --- sections ---
+    def heading(self, title: str) -> None:
+        self._write("txt", f"{title}:\n")
+        self._write("md", f"\n## {title}\n\n")
+
+    def separator(self) -> None:
+        self._write("txt", "----\n")
+
+    def text(self, line: str = "") -> None:
+        """A free line of text (not part of the JSON output)."""
+        self._write("txt", f"{line}\n")
+        self._write("md", f"{line}\n\n" if line else "")
+
+    def value(self, key: str, label: str, value, unit: str = "", fmt: str = "") -> None:
+        shown = f"{format(value, fmt)}{unit}"
+        self._write("txt", f"{label}: {shown}\n")
+        self._write("md", f"- **{label}:** {shown}\n")
+        self._json(key, value)
+
+    def data(self, key: str, value) -> None:
+        """A value that only goes to the JSON output."""
+        self._json(key, value)
+
+    def items(self, key: str, title: str, values) -> None:
+        values = list(values)
+        self.heading(title)
+        for v in values:
+            self._write("txt", f"  - {v}\n")
+            self._write("md", f"- {v}\n")
+        self._write("md", "\n")
+        self._json(key, values)
+        self.separator()
+
+    def table(self, key: str, title: str, table, index: bool = True) -> None:
+        """A small table written inline in every format."""
+        frame = table.to_frame() if isinstance(table, pd.Series) else table
+        self.heading(title)
+        self._write("txt", frame.to_string(index=index, float_format=_format_float) + "\n")
+        self._markdown_table(frame.reset_index() if index else frame)
+        self._json(key, table)
+        self.separator()
+
+    def export(self, key: str, title: str, frame: pd.DataFrame, filename: str | None = None,
+               preview: int = 0, chunksize: int = 100_000, index: bool = False) -> str:
+        """Write a large table to its own CSV file; the reports get the row count and a link.
+
+        Returns:
+            Path of the CSV file.
+        """
+        filename = filename or f"{key}.csv"
+        path = os.path.join(self.out_dir, filename)
+        frame.to_csv(path, index=index, chunksize=chunksize)
+        self.exports[key] = path
+
+        self.heading(title)
+        self._write("txt", f"Rows: {len(frame)} (full table: {filename})\n")
+        self._write("md", f"{len(frame)} rows, full table: [{filename}]({filename})\n\n")
+        if preview and len(frame):
+            head = frame.head(preview)
+            self._write("txt", f"First {len(head)}:\n{head.to_string(index=index, float_format=_format_float)}\n")
+            self._markdown_table(head.reset_index() if index else head)
+        self._json(key, {"rows": len(frame), "path": filename, "columns": [str(c) for c in frame.columns]})
+        self.separator()
+        return path
+
+    def close(self) -> None:
+        if not self._files:
+            return
+        self._write("json", "\n}\n")
+        for f in self._files.values():
+            f.close()
+        self._files = {}
@@ -0,0 +1,267 @@
+"""
+Local metrics service.
+
+Keeps the cleaned (encoded) datasets in memory and answers the analyzer
+metrics as JSON, so dashboards can poll without re-running the scripts.
+
+    python main.py serve --port 8050
+
+    GET  /health
+    GET  /metrics?start=2024-01-01&end=2024-03-31&station=ST100&user_type=member
+    GET  /routes?n=10&start=...&user_type=...
+    GET  /weekdays?station=ST100
+    GET  /maintenance
+    POST /reload        reload the cleaned data and drop every cached answer
+
+start / end filter on start_time; a date-only end includes that whole day.
+station matches trips that start or end at the station. Answers are kept
+in an LRU cache keyed by path and parameters; /reload empties it.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+import aggregation
+import cube
+import od_matrix
+import utilization
+import utils
+from report import to_jsonable
+
+FILTERS = ("start", "end", "station", "user_type")
+PATHS = ("/metrics", "/routes", "/weekdays", "/maintenance")
+# computed from the raw trips, so only meaningful for the unfiltered data
+RAW_KEYS = ("trips_cancelled_rate", "trips_completed_rate", "avg_trips", "avg_trips_casual", "avg_trips_member")
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache."""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class MetricsStore:
+    """In-memory datasets plus cached, filterable metric queries.
+
+    Args:
+        loader: returns (maintenance, stations, trips); defaults to
+            utils.check_and_load_clean_data.
+        cache_size: number of answers kept in the LRU cache.
+    """
+
+    def __init__(self, loader=None, cache_size: int = 256):
+        self.loader = loader or utils.check_and_load_clean_data
+        self.cache = LRUCache(cache_size)
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.reload()
+
+    def reload(self) -> None:
+        """Load the cleaned data again and invalidate every cached answer.
+
+        The OD matrix and the fleet utilization are built here, once per
+        load; queries only slice the OD matrix or bincount the rows they select.
+        """
+        maintenance, stations, trips = self.loader()
+        od = od_matrix.ODMatrix.from_trips(trips)
+        fleet_utilization_rate = (
+            round(utilization.bike_utilization(trips)["fleet_utilization"] * 100, 2) if len(trips) else None
+        )
+        with self._lock:
+            self.maintenance, self.stations, self.trips = maintenance, stations, trips
+            self.od, self.fleet_utilization_rate = od, fleet_utilization_rate
+            self.raw_summary = dict(utils.raw_trips_summary)
+            self.generation += 1
+            self.cache.clear()
+
+    # -------- filtering --------
+    def select(self, start=None, end=None, station=None, user_type=None) -> pd.DataFrame:
+        """Trips matching the query filters."""
+        trips = self.trips
+        mask = np.ones(len(trips), dtype=bool)
+        if start:
+            mask &= (trips["start_time"] >= pd.Timestamp(start)).to_numpy()
+        if end:
+            end_ts = pd.Timestamp(end)
+            if len(end) <= 10:  # date only: include the whole day
+                end_ts += pd.Timedelta(days=1)
+            mask &= (trips["start_time"] < end_ts).to_numpy()
+        if station:
+            mask &= ((trips["start_station_id"] == station) | (trips["end_station_id"] == station)).to_numpy()
+        if user_type:
+            mask &= (trips["user_type"] == user_type).to_numpy()
+        return trips if mask.all() else trips[mask]
+
+    # -------- queries --------
+    def _od(self, station=None, user_type=None, **_) -> od_matrix.ODMatrix:
+        """The preloaded OD matrix sliced to the station / user_type filters."""
+        if not (station or user_type):
+            return self.od
+        return self.od.slice(station=station or None, user_type=user_type or None)
+
+    @staticmethod
+    def _timed(filters: dict) -> bool:
+        # the OD matrix has no date axis, start / end need the rows
+        return bool(filters.get("start") or filters.get("end"))
+
+    def metrics(self, **filters) -> dict:
+        """Trip metrics of analyzer.tripsdata_analysis for the filtered trips.
+
+        fleet_utilization_rate is only given for the unfiltered data, it is
+        a sweep over all trips and is computed once at load.
+        """
+        trips = self.select(**filters)
+        if trips.empty:
+            return {"total_trips": 0}
+        od = None if self._timed(filters) else self._od(**filters)
+        results = aggregation.trip_metrics(trips, self.raw_summary, od=od)
+        outliers = results.pop("outliers_duration")
+        results["outlier_count"] = len(outliers)
+        if any(filters.values()):
+            for key in RAW_KEYS:
+                results.pop(key, None)
+        else:
+            results["fleet_utilization_rate"] = self.fleet_utilization_rate
+        return results
+
+    def routes(self, n: int = 10, **filters) -> pd.Series:
+        """n busiest routes of the filtered trips."""
+        if not self._timed(filters):
+            return self._od(**filters).top_routes(n).rename("count")
+        trips = self.select(**filters)
+        start_codes, end_codes, stations = aggregation.encode_pair(trips["start_station_id"], trips["end_station_id"])
+        return aggregation.top_routes(start_codes, end_codes, stations, n).rename("count")
+
+    def weekdays(self, **filters) -> pd.Series:
+        """Trip count per weekday name of the filtered trips."""
+        if self._timed(filters):
+            start = self.select(**filters)["start_time"].to_numpy(dtype="datetime64[s]")
+            start = start[~np.isnat(start)]
+            counts = np.bincount((start.astype("datetime64[D]").astype(np.int64) + 3) % 7, minlength=7)
+        else:
+            counts = self._od(**filters).weekday_totals()
+        return pd.Series(counts, index=pd.Index(cube.WEEKDAYS, name="weekday"), name="counts")
+
+    def maintenance_metrics(self) -> dict:
+        """Maintenance cost per bike type and frequency per maintenance type."""
+        df = self.maintenance
+        cost = df["cost"].astype("float64").groupby(df["bike_type"], observed=True).sum().round(2)
+        frequency = df["maintenance_type"].value_counts()
+        return {
+            "maintenance_cost": cost,
+            "maintenance_frequency": frequency,
+            "highest_maintenance_frequency": frequency.index[0] if len(frequency) else None,
+        }
+
+    def answer(self, path: str, params: dict) -> bytes:
+        """JSON body for a GET request, from the cache when possible."""
+        key = (self.generation, path, tuple(sorted(params.items())))
+        body = self.cache.get(key)
+        if body is not None:
+            return body
+
+        filters = {name: params.get(name) for name in FILTERS}
+        if path == "/metrics":
+            result = self.metrics(**filters)
+        elif path == "/routes":
+            result = self.routes(int(params.get("n", 10)), **filters)
+        elif path == "/weekdays":
+            result = self.weekdays(**filters)
+        else:
+            result = self.maintenance_metrics()
+        body = json.dumps(to_jsonable(result)).encode()
+        self.cache.put(key, body)
+        return body
+
+
+def make_handler(store: MetricsStore):
+    """Request handler class bound to a MetricsStore."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body: bytes) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _error(self, status: int, message: str) -> None:
+            self._send(status, json.dumps({"error": message}).encode())
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            if url.path == "/health":
+                self._send(200, json.dumps({
+                    "status": "ok",
+                    "generation": store.generation,
+                    "trips": len(store.trips),
+                    "cache": {"size": len(store.cache), "hits": store.cache.hits, "misses": store.cache.misses},
+                }).encode())
+                return
+            if url.path not in PATHS:
+                self._error(404, f"Unknown path: {url.path}")
+                return
+            try:
+                self._send(200, store.answer(url.path, params))
+            except (ValueError, TypeError) as e:
+                self._error(400, str(e))
+
+        def do_POST(self):
+            if urlparse(self.path).path != "/reload":
+                self._error(404, f"Unknown path: {self.path}")
+                return
+            store.reload()
+            self._send(200, json.dumps({"status": "reloaded", "generation": store.generation}).encode())
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(host: str = "127.0.0.1", port: int = 8050, store: MetricsStore | None = None) -> None:
+    """Load the data and serve the metrics until interrupted."""
+    store = store or MetricsStore()
+    server = ThreadingHTTPServer((host, port), make_handler(store))
+    print(f"Serving bike sharing metrics on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
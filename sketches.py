@@ -0,0 +1,347 @@
+"""
+Bounded-memory streaming summaries for the trip analytics.
+
+    - SpaceSaving: approximate top-K counter with per-key error bounds
+    - TripHeavyHitters: top stations, users and routes from trip chunks
+    - KLLSketch: mergeable quantile sketch (plus exact count/mean/std)
+    - DurationQuantiles: duration percentiles overall, per user_type and
+      per bike_type
+
+All summaries can be fed chunk by chunk (e.g. from
+utils.read_typed_csv(..., chunksize=...)) and merged, so two summaries
+built on separate partitions combine into one.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def _counts(keys) -> pd.Series:
+    """Exact counts of one chunk of keys (Series, or DataFrame for pair keys)."""
+    if isinstance(keys, pd.DataFrame):
+        counts = keys.value_counts(sort=False)
+        counts.index = pd.MultiIndex.from_arrays(
+            [counts.index.get_level_values(i).astype("str") for i in range(counts.index.nlevels)],
+            names=list(keys.columns),
+        )
+    else:
+        counts = keys.value_counts(sort=False)
+        counts.index = counts.index.astype("str")
+    return counts[counts > 0].astype(np.int64)
+
+
+class SpaceSaving:
+    """Space-Saving top-K summary over at most `capacity` monitored keys.
+
+    For every monitored key the estimate is an upper bound of the true
+    count and estimate - error is a lower bound. Any key that is not
+    monitored occurred at most `floor` times. Memory is O(capacity) no
+    matter how many distinct keys (users, station pairs) the stream has.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.counts = pd.Series(dtype=np.int64)
+        self.errors = pd.Series(dtype=np.int64)
+        self.total = 0
+
+    @property
+    def floor(self) -> int:
+        """Largest possible count of a key that is not monitored."""
+        return int(self.counts.min()) if len(self.counts) >= self.capacity else 0
+
+    def _combine(self, counts: pd.Series, errors: pd.Series, other_floor: int) -> None:
+        # keys missing on one side may still have occurred up to that side's floor
+        own_floor = self.floor
+        union = self.counts.index.union(counts.index)
+        combined = (
+            self.counts.reindex(union, fill_value=own_floor)
+            + counts.reindex(union, fill_value=other_floor)
+        )
+        combined_errors = (
+            self.errors.reindex(union, fill_value=own_floor)
+            + errors.reindex(union, fill_value=other_floor)
+        )
+        if len(combined) > self.capacity:
+            # evicted keys are bounded by the new floor (min of the kept counts)
+            combined = combined.sort_values(ascending=False, kind="stable").head(self.capacity)
+        self.counts = combined.astype(np.int64)
+        self.errors = combined_errors.loc[combined.index].astype(np.int64)
+
+    def update(self, keys) -> "SpaceSaving":
+        """Absorb one chunk of keys (a Series, or a DataFrame of key columns)."""
+        counts = _counts(keys)
+        self.total += int(counts.sum())
+        self._combine(counts, pd.Series(0, index=counts.index, dtype=np.int64), 0)
+        return self
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        """Fold in a summary built on another partition."""
+        self.total += other.total
+        self._combine(other.counts, other.errors, other.floor)
+        return self
+
+    def top(self, n: int) -> pd.DataFrame:
+        """The n heaviest keys with their error bounds.
+
+        Returns:
+            DataFrame indexed by key with columns count (upper bound),
+            error, lower_bound and guaranteed (True when the key is
+            certainly among the true top n).
+        """
+        ranked = self.counts.sort_index().sort_values(ascending=False, kind="stable")
+        head = ranked.head(n)
+        errors = self.errors.loc[head.index]
+        # the (n+1)-th estimate bounds every key outside the reported top n
+        next_count = int(ranked.iloc[n]) if len(ranked) > n else self.floor
+        lower = head - errors
+        return pd.DataFrame({
+            "count": head,
+            "error": errors,
+            "lower_bound": lower,
+            "guaranteed": lower >= next_count,
+        })
+
+
+class TripHeavyHitters:
+    """Approximate top start/end stations, users and routes from trip chunks."""
+
+    def __init__(self, capacity: int = 1000):
+        self.start_stations = SpaceSaving(capacity)
+        self.end_stations = SpaceSaving(capacity)
+        self.users = SpaceSaving(capacity)
+        self.routes = SpaceSaving(capacity)
+
+    def update(self, trips: pd.DataFrame) -> "TripHeavyHitters":
+        self.start_stations.update(trips["start_station_id"])
+        self.end_stations.update(trips["end_station_id"])
+        self.users.update(trips["user_id"])
+        self.routes.update(trips[["start_station_id", "end_station_id"]])
+        return self
+
+    def merge(self, other: "TripHeavyHitters") -> "TripHeavyHitters":
+        self.start_stations.merge(other.start_stations)
+        self.end_stations.merge(other.end_stations)
+        self.users.merge(other.users)
+        self.routes.merge(other.routes)
+        return self
+
+    def results(self) -> dict:
+        """Top-N keys under the tripsdata_analysis names, plus their error bounds."""
+        top_start = self.start_stations.top(10)
+        top_end = self.end_stations.top(10)
+        top_users = self.users.top(15)
+        top_routes = self.routes.top(10).rename_axis(["start_station_id", "end_station_id"])
+        return {
+            "top_start_stations": top_start.index.tolist(),
+            "top_end_stations": top_end.index.tolist(),
+            "active_users_top_15": top_users.index.tolist(),
+            "station_to_station_top10": top_routes["count"].rename(None),
+            "top_k_error_bounds": {
+                "top_start_stations": top_start,
+                "top_end_stations": top_end,
+                "active_users_top_15": top_users,
+                "station_to_station_top10": top_routes,
+            },
+        }
+
+
+def trip_heavy_hitters(chunks, capacity: int = 1000) -> TripHeavyHitters:
+    """Build TripHeavyHitters from an iterable of trip DataFrames."""
+    summary = TripHeavyHitters(capacity)
+    for chunk in chunks:
+        summary.update(chunk)
+    return summary
+
+
+# ---------------------------------------------------------------------------
+# Quantile sketches
+# ---------------------------------------------------------------------------
+
+QUANTILES = {"p25": 0.25, "p50": 0.50, "p75": 0.75, "p90": 0.90, "p99": 0.99}
+
+
+class KLLSketch:
+    """KLL quantile sketch.
+
+    Values are kept in levels of compactors; an item on level h stands for
+    2**h inputs. When a level exceeds its capacity it is sorted and every
+    other item (random offset) moves up one level. Memory stays around
+    3*k items, the rank error is roughly 1.7/k (about 0.1-0.2% at the
+    default k), and two sketches merge by concatenating their levels.
+    Count, mean and std are tracked exactly.
+    """
+
+    def __init__(self, k: int = 1000, seed: int | None = None):
+        self.k = k
+        self.levels = [np.empty(0, dtype=np.float64)]
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0, dtype=np.float64))
+                items = np.sort(items)
+                # an odd item out stays on this level
+                keep = items[len(items) - len(items) % 2:]
+                pairs = items[: len(items) - len(items) % 2]
+                promoted = pairs[self._rng.integers(2)::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def _add_moments(self, n: int, mean: float, m2: float) -> None:
+        # Chan et al. parallel update of count / mean / sum of squared deviations
+        total = self.n + n
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.n * n / total
+        self.mean += delta * n / total
+        self.n = total
+
+    def update(self, values) -> "KLLSketch":
+        """Absorb a chunk of values (NaNs are ignored)."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self._add_moments(len(values), values.mean(), ((values - values.mean()) ** 2).sum())
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """Fold in a sketch built on another partition."""
+        if other.n == 0:
+            return self
+        self._add_moments(other.n, other.mean, other.m2)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0, dtype=np.float64))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self._compress()
+        return self
+
+    @property
+    def std(self) -> float:
+        """Population standard deviation (as np.std)."""
+        return float(np.sqrt(self.m2 / self.n)) if self.n else np.nan
+
+    def quantile(self, q):
+        """Approximate quantile(s) for q in [0, 1]."""
+        q = np.asarray(q, dtype=np.float64)
+        if self.n == 0:
+            return np.full(q.shape, np.nan) if q.ndim else np.nan
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        items, weights = items[order], weights[order]
+        cum = np.cumsum(weights)
+        pos = np.searchsorted(cum, q * cum[-1], side="left")
+        result = items[np.minimum(pos, len(items) - 1)]
+        result = np.where(q <= 0, self.min, np.where(q >= 1, self.max, result))
+        return result if q.ndim else float(result)
+
+    def to_arrays(self, prefix: str) -> dict:
+        """Plain arrays for np.savez, see from_arrays."""
+        arrays = {f"{prefix}__meta": np.array([self.k, self.n, self.mean, self.m2, self.min, self.max])}
+        for h, items in enumerate(self.levels):
+            arrays[f"{prefix}__level{h}"] = items
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix: str) -> "KLLSketch":
+        k, n, mean, m2, vmin, vmax = arrays[f"{prefix}__meta"]
+        sketch = cls(int(k))
+        sketch.n, sketch.mean, sketch.m2, sketch.min, sketch.max = int(n), mean, m2, vmin, vmax
+        levels = []
+        while f"{prefix}__level{len(levels)}" in arrays:
+            levels.append(np.asarray(arrays[f"{prefix}__level{len(levels)}"]))
+        sketch.levels = levels or [np.empty(0, dtype=np.float64)]
+        return sketch
+
+
+class DurationQuantiles:
+    """p25/p50/p75/p90/p99 of a trip column, overall and per group value.
+
+    Args:
+        column: numeric column to sketch.
+        by: grouping columns; one sketch is kept per (column, value).
+        k: KLL accuracy parameter.
+        exact: keep every value instead of sketching, to check accuracy.
+    """
+
+    def __init__(self, column: str = "duration_minutes", by=("user_type", "bike_type"), k: int = 1000,
+                 exact: bool = False):
+        self.column = column
+        self.by = tuple(by)
+        self.k = k
+        self.exact = exact
+        self.sketches = {}
+
+    def _sketch(self, key):
+        if key not in self.sketches:
+            self.sketches[key] = [] if self.exact else KLLSketch(self.k)
+        return self.sketches[key]
+
+    def _add(self, key, values) -> None:
+        sketch = self._sketch(key)
+        if self.exact:
+            sketch.append(np.asarray(values, dtype=np.float64))
+        else:
+            sketch.update(values)
+
+    def update(self, trips: pd.DataFrame) -> "DurationQuantiles":
+        values = trips[self.column].to_numpy(dtype=np.float64)
+        self._add(("all", "all"), values)
+        for group in self.by:
+            codes, labels = pd.factorize(trips[group], use_na_sentinel=True)
+            for code, label in enumerate(labels):
+                self._add((group, str(label)), values[codes == code])
+        return self
+
+    def merge(self, other: "DurationQuantiles") -> "DurationQuantiles":
+        for key, sketch in other.sketches.items():
+            if self.exact:
+                self._sketch(key).extend(sketch)
+            else:
+                self._sketch(key).merge(sketch)
+        return self
+
+    def quantiles(self, key=("all", "all"), q=(0.25, 0.75)):
+        """Quantiles of one group, e.g. key=("user_type", "casual")."""
+        sketch = self.sketches[key]
+        if self.exact:
+            values = np.concatenate(sketch)
+            return np.quantile(values[~np.isnan(values)], q)
+        return sketch.quantile(q)
+
+    def summary(self) -> pd.DataFrame:
+        """One row per group with count and the QUANTILES columns."""
+        rows = []
+        for key in sorted(self.sketches):
+            if self.exact:
+                values = np.concatenate(self.sketches[key])
+                count = int((~np.isnan(values)).sum())
+            else:
+                count = self.sketches[key].n
+            row = dict(zip(QUANTILES, np.round(self.quantiles(key, list(QUANTILES.values())), 2)))
+            rows.append({"group": key[0], "value": key[1], "count": count, **row})
+        return pd.DataFrame(rows).set_index(["group", "value"])
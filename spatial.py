@@ -0,0 +1,230 @@
+"""
+Grid-bucket spatial index over station coordinates.
+
+Stations are projected to a local km plane (equirectangular around the
+network's mean latitude, accurate to well under 1% at city scale) and
+bucketed into square cells. Queries only look at the cells that can hold
+an answer, so nearest-k, radius, closest-pair and farthest-pair queries
+never build the n x n distance matrix. Reported distances are haversine
+km from numerical.haversine_km.
+"""
+
+import numpy as np
+import pandas as pd
+
+import numerical
+
+
+class StationIndex:
+    """Spatial index answering nearest / radius / extreme-pair station queries.
+
+    Args:
+        station_ids: labels of the stations.
+        latitudes, longitudes: coordinates in degrees.
+        cell_km: grid cell size; by default about two stations per cell.
+    """
+
+    def __init__(self, station_ids, latitudes, longitudes, cell_km: float | None = None):
+        self.station_ids = np.asarray(station_ids)
+        self.lat = np.asarray(latitudes, dtype=np.float64)
+        self.lon = np.asarray(longitudes, dtype=np.float64)
+        if not (len(self.station_ids) == len(self.lat) == len(self.lon)):
+            raise ValueError("station_ids, latitudes and longitudes must have the same length")
+        if len(self.lat) == 0:
+            raise ValueError("StationIndex needs at least one station")
+
+        self._cos0 = np.cos(np.radians(self.lat.mean()))
+        self.x, self.y = self._project(self.lat, self.lon)
+
+        if cell_km is None:
+            area = max(np.ptp(self.x) * np.ptp(self.y), 1e-6)
+            cell_km = max(np.sqrt(2 * area / len(self.x)), 1e-3)
+        self.cell_km = cell_km
+        self._x0, self._y0 = self.x.min(), self.y.min()
+        cx, cy = self._cells(self.x, self.y)
+        self._ncx, self._ncy = cx.max() + 1, cy.max() + 1
+
+        # stations sorted by cell key; a cell's members are one contiguous slice
+        keys = cx * self._ncy + cy
+        self._order = np.argsort(keys, kind="stable")
+        self._keys, self._starts, self._counts = np.unique(keys[self._order], return_index=True, return_counts=True)
+
+    @classmethod
+    def from_frame(cls, stations: pd.DataFrame, **kwargs) -> "StationIndex":
+        """Build from a stations frame (station_id, latitude, longitude)."""
+        return cls(stations["station_id"].astype("str"), stations["latitude"], stations["longitude"], **kwargs)
+
+    def __len__(self):
+        return len(self.x)
+
+    # -------- helpers --------
+    def _project(self, lat, lon):
+        lat = np.radians(np.asarray(lat, dtype=np.float64))
+        lon = np.radians(np.asarray(lon, dtype=np.float64))
+        return numerical.EARTH_RADIUS_KM * lon * self._cos0, numerical.EARTH_RADIUS_KM * lat
+
+    def _cells(self, x, y):
+        cx = np.floor((x - self._x0) / self.cell_km).astype(np.int64)
+        cy = np.floor((y - self._y0) / self.cell_km).astype(np.int64)
+        return cx, cy
+
+    def _members(self, cx_lo, cx_hi, cy_lo, cy_hi) -> np.ndarray:
+        """Station positions in the cell rectangle [cx_lo, cx_hi] x [cy_lo, cy_hi]."""
+        cx_lo, cy_lo = max(cx_lo, 0), max(cy_lo, 0)
+        cx_hi, cy_hi = min(cx_hi, self._ncx - 1), min(cy_hi, self._ncy - 1)
+        if cx_lo > cx_hi or cy_lo > cy_hi:
+            return np.empty(0, dtype=np.int64)
+        wanted = (np.arange(cx_lo, cx_hi + 1)[:, np.newaxis] * self._ncy + np.arange(cy_lo, cy_hi + 1)).ravel()
+        pos = np.searchsorted(self._keys, wanted)
+        inside = pos < len(self._keys)
+        pos, wanted = pos[inside], wanted[inside]
+        pos = pos[self._keys[pos] == wanted]
+        if len(pos) == 0:
+            return np.empty(0, dtype=np.int64)
+        slices = [self._order[s: s + c] for s, c in zip(self._starts[pos], self._counts[pos])]
+        return np.concatenate(slices)
+
+    def _covers_all(self, cx_lo, cx_hi, cy_lo, cy_hi) -> bool:
+        return cx_lo <= 0 and cy_lo <= 0 and cx_hi >= self._ncx - 1 and cy_hi >= self._ncy - 1
+
+    def _knn_block(self, qx, qy, k: int, exclude=None):
+        """k nearest stations for a block of queries that share one grid cell.
+
+        The searched square grows ring by ring until, for every query, the
+        k-th candidate is closer than the nearest edge of the square; no
+        station outside the square can then beat it.
+        """
+        cx, cy = self._cells(qx[:1], qy[:1])
+        cx, cy = int(np.clip(cx[0], 0, self._ncx - 1)), int(np.clip(cy[0], 0, self._ncy - 1))
+        k = min(k, len(self) - (exclude is not None))
+        ring = 1
+        while True:
+            box = (cx - ring, cx + ring, cy - ring, cy + ring)
+            candidates = self._members(*box)
+            dist = np.hypot(qx[:, np.newaxis] - self.x[candidates], qy[:, np.newaxis] - self.y[candidates])
+            if exclude is not None:
+                dist[exclude[:, np.newaxis] == candidates] = np.inf
+            if len(candidates) >= k + (exclude is not None):
+                part = np.argpartition(dist, k - 1, axis=1)[:, :k]
+                kth = np.take_along_axis(dist, part, axis=1).max(axis=1)
+                x_lo = self._x0 + box[0] * self.cell_km
+                y_lo = self._y0 + box[2] * self.cell_km
+                x_hi = self._x0 + (box[1] + 1) * self.cell_km
+                y_hi = self._y0 + (box[3] + 1) * self.cell_km
+                edge = np.minimum.reduce([qx - x_lo, x_hi - qx, qy - y_lo, y_hi - qy])
+                if self._covers_all(*box) or np.all(kth <= edge):
+                    order = np.take_along_axis(dist, part, axis=1).argsort(axis=1)
+                    return candidates[np.take_along_axis(part, order, axis=1)]
+            elif self._covers_all(*box):
+                part = np.argsort(dist, axis=1)[:, :k]
+                return candidates[part]
+            ring += 1
+
+    def _knn(self, lats, lons, k: int, exclude=None) -> np.ndarray:
+        """(len(queries), k) station positions, nearest first."""
+        qx, qy = self._project(lats, lons)
+        qx, qy = np.atleast_1d(qx), np.atleast_1d(qy)
+        cx, cy = self._cells(qx, qy)
+        cx, cy = np.clip(cx, 0, self._ncx - 1), np.clip(cy, 0, self._ncy - 1)
+        k_eff = min(k, len(self) - (exclude is not None))
+        result = np.empty((len(qx), k_eff), dtype=np.int64)
+        # one block per occupied query cell: the loop is over cells, not queries
+        qkeys = cx * self._ncy + cy
+        order = np.argsort(qkeys, kind="stable")
+        _, starts = np.unique(qkeys[order], return_index=True)
+        for block in np.split(order, starts[1:]):
+            ex = None if exclude is None else exclude[block]
+            result[block] = self._knn_block(qx[block], qy[block], k_eff, ex)
+        return result
+
+    # -------- queries --------
+    def nearest(self, lat: float, lon: float, k: int = 1) -> pd.DataFrame:
+        """The k stations nearest to a point, nearest first."""
+        idx = self._knn([lat], [lon], k)[0]
+        return pd.DataFrame({
+            "station_id": self.station_ids[idx],
+            "distance_km": numerical.haversine_km(lat, lon, self.lat[idx], self.lon[idx]),
+        })
+
+    def snap(self, lats, lons) -> pd.DataFrame:
+        """Nearest station for many points at once (e.g. trip endpoints)."""
+        idx = self._knn(lats, lons, 1)[:, 0]
+        return pd.DataFrame({
+            "station_id": self.station_ids[idx],
+            "distance_km": numerical.haversine_km(lats, lons, self.lat[idx], self.lon[idx]),
+        })
+
+    def within_radius(self, lat: float, lon: float, radius_km: float) -> pd.DataFrame:
+        """All stations within radius_km of a point, nearest first.
+
+        The candidate box is the circle's exact latitude / longitude extent
+        in the projected plane: north-south that is radius_km, east-west it
+        widens away from the projection's reference latitude, so no station
+        within radius_km (haversine) falls outside the box.
+        """
+        qx, qy = self._project(lat, lon)
+        angle = radius_km / numerical.EARTH_RADIUS_KM
+        # 圆在经度方向的最大跨度: asin(sin(d) / cos(lat)), 接近极点时取全部经度
+        ratio = np.sin(min(angle, np.pi / 2)) / max(np.cos(np.radians(lat)), 1e-12)
+        dlon = np.arcsin(ratio) if ratio < 1 else np.pi
+        half_x = numerical.EARTH_RADIUS_KM * self._cos0 * dlon * (1 + 1e-9)
+        half_y = radius_km * (1 + 1e-9)
+        (cx_lo, cx_hi), (cy_lo, cy_hi) = (
+            self._cells(np.array([qx - half_x, qx + half_x]), np.array([qy - half_y, qy + half_y]))
+        )
+        candidates = self._members(cx_lo, cx_hi, cy_lo, cy_hi)
+        dist = numerical.haversine_km(lat, lon, self.lat[candidates], self.lon[candidates])
+        keep = dist <= radius_km
+        order = np.argsort(dist[keep], kind="stable")
+        return pd.DataFrame({
+            "station_id": self.station_ids[candidates[keep][order]],
+            "distance_km": dist[keep][order],
+        })
+
+    def closest_pair(self) -> tuple[str, str, float]:
+        """The two stations closest to each other, with their distance in km."""
+        if len(self) < 2:
+            raise ValueError("closest_pair needs at least two stations")
+        own = np.arange(len(self))
+        neighbour = self._knn(self.lat, self.lon, 1, exclude=own)[:, 0]
+        dist = numerical.haversine_km(self.lat, self.lon, self.lat[neighbour], self.lon[neighbour])
+        i = int(np.argmin(dist))
+        a, b = sorted((i, int(neighbour[i])))
+        return self.station_ids[a], self.station_ids[b], float(dist[i])
+
+    def convex_hull(self) -> np.ndarray:
+        """Positions of the stations on the convex hull (monotone chain)."""
+        order = np.lexsort((self.y, self.x))
+        pts = np.column_stack([self.x[order], self.y[order]])
+
+        def half(points, positions):
+            chain = []
+            for p, pos in zip(points, positions):
+                while len(chain) >= 2:
+                    (o, _), (a, _) = chain[-2], chain[-1]
+                    if (a[0] - o[0]) * (p[1] - o[1]) - (a[1] - o[1]) * (p[0] - o[0]) > 0:
+                        break
+                    chain.pop()
+                chain.append((p, pos))
+            return [pos for _, pos in chain[:-1]]
+
+        lower = half(pts, order)
+        upper = half(pts[::-1], order[::-1])
+        hull = np.array(lower + upper, dtype=np.int64)
+        return hull if len(hull) else order[:1]
+
+    def farthest_pair(self) -> tuple[str, str, float]:
+        """The two stations farthest apart, with their distance in km.
+
+        The farthest pair lies on the convex hull, so only the hull
+        vertices (a handful even for large networks) are compared.
+        """
+        if len(self) < 2:
+            raise ValueError("farthest_pair needs at least two stations")
+        hull = np.unique(self.convex_hull())
+        dist = numerical.haversine_km(
+            self.lat[hull, np.newaxis], self.lon[hull, np.newaxis], self.lat[hull], self.lon[hull]
+        )
+        i, j = np.unravel_index(np.argmax(dist), dist.shape)
+        a, b = sorted((int(hull[i]), int(hull[j])))
+        return self.station_ids[a], self.station_ids[b], float(dist[i, j])
@@ -0,0 +1,160 @@
+"""
+Interval-based bike utilization.
+
+Trips are [start_time, end_time) intervals per bike_id. Overlapping or
+duplicated trips of the same bike are merged first, so a bike is never
+counted busy twice for the same minute. Everything is done with sorts,
+cumulative max / sum and bincount over the whole fleet at once; there is
+no Python loop per bike.
+"""
+
+import numpy as np
+import pandas as pd
+
+from aggregation import encode_column
+
+
+def _to_seconds(col) -> np.ndarray:
+    return np.asarray(col, dtype="datetime64[s]").astype(np.int64)
+
+
+def merge_intervals(bike_codes: np.ndarray, start: np.ndarray, end: np.ndarray):
+    """Merge overlapping intervals within each bike.
+
+    Args:
+        bike_codes: integer bike code per trip.
+        start, end: interval bounds (int64 seconds), end >= start.
+
+    Returns:
+        (bike_codes, start, end) of the merged intervals, sorted by bike
+        then start.
+    """
+    order = np.lexsort((start, bike_codes))
+    codes, start, end = bike_codes[order], start[order], end[order]
+    if len(codes) == 0:
+        return codes, start, end
+
+    # shift each bike onto its own stretch of the time axis, so one global
+    # running max gives the running max end within every bike
+    base = start.min()
+    span = end.max() - base + 1
+    shifted_start = start - base + codes * span
+    shifted_end = end - base + codes * span
+    running_end = np.maximum.accumulate(shifted_end)
+
+    new_interval = np.ones(len(codes), dtype=bool)
+    new_interval[1:] = shifted_start[1:] > running_end[:-1]
+    first = np.flatnonzero(new_interval)
+    merged_end = np.maximum.reduceat(shifted_end, first) - codes[first] * span + base
+    return codes[first], start[first], merged_end
+
+
+def _busy_integral(events_t: np.ndarray, events_d: np.ndarray, at: np.ndarray) -> np.ndarray:
+    """Integral of the busy-bike count from the first event up to each time in `at`."""
+    order = np.argsort(events_t, kind="stable")
+    t, d = events_t[order], events_d[order]
+    count = np.cumsum(d)  # busy bikes right after each event
+    area = np.concatenate([[0], np.cumsum(count[:-1] * np.diff(t))])
+    idx = np.searchsorted(t, at, side="right") - 1
+    before = idx < 0
+    idx = np.clip(idx, 0, len(t) - 1)
+    result = area[idx] + count[idx] * (at - t[idx])
+    result[before] = 0
+    return result
+
+
+def _empty_utilization() -> dict:
+    """Result of bike_utilization when there is no trip or no observation time."""
+    per_bike = pd.DataFrame({
+        "trips": np.empty(0, dtype=np.int64),
+        "busy_minutes": np.empty(0),
+        "overlap_minutes": np.empty(0),
+        "utilization": np.empty(0),
+    }, index=pd.Index([], dtype=object, name="bike_id"))
+    intervals = pd.DataFrame({
+        "bike_id": np.empty(0, dtype=object),
+        "start_time": np.empty(0, dtype="datetime64[s]"),
+        "end_time": np.empty(0, dtype="datetime64[s]"),
+    })
+    curve = pd.Series(np.empty(0), index=pd.DatetimeIndex([], name="bucket_start"), name="utilization")
+    return {"per_bike": per_bike, "fleet_utilization": 0.0, "intervals": intervals, "curve": curve}
+
+
+def bike_utilization(trips: pd.DataFrame, window: tuple | None = None, freq: str = "h") -> dict:
+    """Per-bike and fleet busy-time fractions plus a utilization curve.
+
+    Args:
+        trips: trips with bike_id, start_time and end_time.
+        window: (start, end) of the observation period; defaults to the
+            first start_time .. last end_time in trips.
+        freq: bucket size of the utilization curve ("h", "D", "15min" ...).
+
+    Returns:
+        Dict with
+            per_bike: DataFrame indexed by bike_id with trips, busy_minutes,
+                overlap_minutes (double-counted trip time) and utilization;
+            fleet_utilization: busy bike-time / (bikes * window), 0..1;
+            intervals: merged busy intervals (bike_id, start_time, end_time);
+            curve: Series of the busy fraction of the fleet per bucket.
+        Without valid trips, or with an empty window, utilization is 0 and
+        per_bike, intervals and curve are empty.
+    """
+    start = _to_seconds(trips["start_time"])
+    end = _to_seconds(trips["end_time"])
+    valid = (start != np.iinfo(np.int64).min) & (end != np.iinfo(np.int64).min) & (end >= start)
+    codes, bikes = encode_column(trips["bike_id"])
+    codes, start, end = codes[valid].astype(np.int64), start[valid], end[valid]
+
+    if window is None:
+        if len(start) == 0:
+            return _empty_utilization()
+        w_start, w_end = start.min(), end.max()
+    else:
+        w_start, w_end = _to_seconds(pd.to_datetime(list(window)))
+        if w_end <= w_start:
+            return _empty_utilization()
+    w_len = max(w_end - w_start, 1)
+    start, end = np.clip(start, w_start, w_end), np.clip(end, w_start, w_end)
+
+    m_codes, m_start, m_end = merge_intervals(codes, start, end)
+
+    n = len(bikes)
+    trip_counts = np.bincount(codes, minlength=n)
+    raw_seconds = np.bincount(codes, weights=end - start, minlength=n)
+    busy_seconds = np.bincount(m_codes, weights=m_end - m_start, minlength=n)
+    seen = trip_counts > 0
+
+    per_bike = pd.DataFrame({
+        "trips": trip_counts[seen],
+        "busy_minutes": busy_seconds[seen] / 60,
+        "overlap_minutes": (raw_seconds - busy_seconds)[seen] / 60,
+        "utilization": busy_seconds[seen] / w_len,
+    }, index=pd.Index(bikes[seen], name="bike_id"))
+
+    n_bikes = int(seen.sum())
+    fleet_utilization = busy_seconds.sum() / (n_bikes * w_len) if n_bikes else 0.0
+
+    buckets = pd.date_range(
+        pd.Timestamp(w_start, unit="s").floor(freq), pd.Timestamp(w_end, unit="s").ceil(freq), freq=freq
+    )
+    bounds = _to_seconds(buckets.to_numpy())
+    events_t = np.concatenate([m_start, m_end])
+    events_d = np.concatenate([np.ones(len(m_start), np.int64), -np.ones(len(m_end), np.int64)])
+    busy_per_bucket = np.diff(_busy_integral(events_t, events_d, bounds)) if len(events_t) else np.zeros(len(bounds) - 1)
+    curve = pd.Series(
+        busy_per_bucket / (np.diff(bounds) * max(n_bikes, 1)),
+        index=pd.Index(buckets[:-1], name="bucket_start"),
+        name="utilization",
+    )
+
+    intervals = pd.DataFrame({
+        "bike_id": bikes[m_codes],
+        "start_time": m_start.astype("datetime64[s]"),
+        "end_time": m_end.astype("datetime64[s]"),
+    })
+    return {
+        "per_bike": per_bike,
+        "fleet_utilization": fleet_utilization,
+        "intervals": intervals,
+        "curve": curve,
+    }
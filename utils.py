@@ -1,44 +1,302 @@
 import pandas as pd
+import numpy as np
+import hashlib
+import json
 import os
+import tempfile
+
+import validation
+from instrumentation import annotate, file_bytes, traced
+
+DATA_PATHS = {
+    "maintenance": "data/maintenance.csv",
+    "stations": "data/stations.csv",
+    "trips": "data/trips.csv",
+    "stations_clean":"data/stations_clean.csv",
+    "trips_clean":"data/trips_clean.csv"
+}
+
+# Declared dtypes for the three source files. IDs and enums become categoricals
+# (one small integer code per row instead of a Python string), durations,
+# distances and costs fit in float32, capacity in a 16-bit integer. Date
+# columns stay text here and are parsed by pd.to_datetime in load_clean_data.
+TRIPS_SCHEMA = {
+    "trip_id": "str",
+    "user_id": "category",
+    "user_type": "category",
+    "bike_id": "category",
+    "bike_type": "category",
+    "start_station_id": "category",
+    "end_station_id": "category",
+    "start_time": "str",
+    "end_time": "str",
+    "duration_minutes": "float32",
+    "distance_km": "float32",
+    "status": "category",
+}
+
+STATIONS_SCHEMA = {
+    "station_id": "category",
+    "station_name": "str",
+    "capacity": "Int16",
+    "latitude": "float64",
+    "longitude": "float64",
+}
+
+MAINTENANCE_SCHEMA = {
+    "record_id": "str",
+    "bike_id": "category",
+    "bike_type": "category",
+    "date": "str",
+    "maintenance_type": "category",
+    "cost": "float32",
+    "description": "category",
+}
+
+# columns that share one set of categories, so their codes are comparable
+SHARED_CATEGORIES = {
+    "trips": [("start_station_id", "end_station_id")],
+}
+
+# status and per-user_type counts of the raw trips (before cleaning), filled
+# by load_clean_data / load_clean_cache so the analyzer does not have to
+# read trips.csv a second time for the completion rate and trips per user
+raw_trips_summary = {}
+
+# per-rule reject counts of the last validation run ({"trips": {...},
+# "maintenance": {...}}), see validate_frames; rejected rows are written to
+# QUARANTINE_DIR instead of being cleaned
+validation_summary = {}
+QUARANTINE_DIR = "data/quarantine"
+
+# columnar cache of the cleaned frames, see save_clean_cache / load_clean_cache
+CACHE_DIR = "data/cache"
+CACHE_VERSION = 4
+CACHE_SOURCES = ("maintenance", "stations", "trips")
 
 class DataCleaner:
-    def __init__(self, df):
-        self.df = df.copy()
-    
+    """Chainable cleaning steps.
+
+    Eager (default): every step filters self.df right away.
+    lazy=True: no copy is made up front; each step only narrows one row
+    mask (or the column projection), so explain() can tell how many rows
+    every step removes before anything is copied, and get_cleaned_data()
+    slices the frame a single time.
+    """
+
+    def __init__(self, df, lazy: bool = False):
+        self.lazy = lazy
+        self.df = df if lazy else df.copy()
+        self._mask = np.ones(len(df), dtype=bool) if lazy else None
+        self._columns = None
+        self._steps = []
+
+    def _columns_now(self) -> list:
+        return list(self.df.columns) if self._columns is None else self._columns
+
+    def _apply(self, step: str, keep) -> None:
+        """Narrow the rows to keep (a mask over the current rows) and record the step."""
+        keep = np.asarray(keep, dtype=bool)
+        if self.lazy:
+            before = int(self._mask.sum())
+            self._mask &= keep
+            after = int(self._mask.sum())
+        else:
+            before = len(self.df)
+            self.df = self.df[keep]
+            after = len(self.df)
+        self._steps.append((step, before - after, after))
+
     def drop_nan(self):
-        self.df = self.df.dropna()
+        if not self.lazy:
+            before = len(self.df)
+            self.df = self.df.dropna()
+            self._steps.append(("drop_nan", before - len(self.df), len(self.df)))
+            return self
+        keep = np.ones(len(self.df), dtype=bool)
+        for column in self._columns_now():
+            keep &= self.df[column].notna().to_numpy()
+        self._apply("drop_nan", keep)
         return self
     
-    def drop_duplicates(self):
-        self.df = self.df.drop_duplicates()
+    def drop_duplicates(self, seen=None):
+        """Drop duplicate rows.
+
+        Args:
+            seen: optional SpillingHashSet shared between chunks. Rows whose
+                hash was already added by an earlier chunk are dropped too,
+                so a chunked run keeps the same first occurrences as a
+                single drop_duplicates over the whole file.
+        """
+        if not self.lazy:
+            before = len(self.df)
+            if seen is None:
+                self.df = self.df.drop_duplicates()
+            else:
+                hashes = pd.util.hash_pandas_object(self.df, index=False).to_numpy()
+                self.df = self.df[_first_occurrences(self.df, hashes, seen)]
+            self._steps.append(("drop_duplicates", before - len(self.df), len(self.df)))
+            return self
+
+        # hash the projected columns of the whole frame (no row copy), then
+        # keep the first occurrence among the rows still in the mask
+        projected = self.df[self._columns_now()]
+        hashes = pd.util.hash_pandas_object(projected, index=False).to_numpy()
+        rows = np.flatnonzero(self._mask)
+        keep = np.zeros(len(self.df), dtype=bool)
+        keep[rows[_first_occurrences(projected.iloc[rows], hashes[rows], seen)]] = True
+        self._apply("drop_duplicates", keep)
         return self
     
     def filter_status(self, status: str):
-        self.df = self.df[self.df["status"] == status]
+        self._apply(f"filter_status({status!r})", (self.df["status"] == status).to_numpy())
+        return self
+
+    def select(self, columns):
+        """Keep only the given columns."""
+        columns = list(columns)
+        if self.lazy:
+            self._columns = columns
+        else:
+            self.df = self.df[columns]
+        self._steps.append((f"select({len(columns)} columns)", 0, self._steps[-1][2] if self._steps else len(self.df)))
         return self
+
+    def explain(self) -> pd.DataFrame:
+        """Rows removed and remaining after each step so far."""
+        return pd.DataFrame(self._steps, columns=["step", "rows_removed", "rows_remaining"])
+
     # self 是对象本身，self.df，即它里面的属性，即要获取的DataFrame
     def get_cleaned_data(self):
-        return self.df
+        if not self.lazy:
+            return self.df
+        columns = self._columns_now()
+        if self._mask.all():
+            # copy-on-write: a shallow copy is safe and costs no data copy
+            return self.df[columns].copy(deep=False)
+        return self.df.loc[self._mask, columns]
+
+def _first_occurrences(frame: pd.DataFrame, hashes: np.ndarray, seen=None) -> np.ndarray:
+    """Mask of the rows of frame that do not repeat an earlier row.
+
+    Rows are grouped by their 64-bit hash, and only rows sharing a hash are
+    compared value by value, so a hash collision inside frame never drops a
+    distinct row. With seen (a SpillingHashSet), rows whose hash an earlier
+    chunk already added are dropped as well; those earlier rows are gone, so
+    across chunks the hash alone decides.
+    """
+    _, first, inverse, counts = np.unique(hashes, return_index=True, return_inverse=True, return_counts=True)
+    keep = np.ones(len(hashes), dtype=bool)
+    shared = np.flatnonzero(counts[inverse] > 1)
+    if len(shared):
+        # 哈希相同的行再逐值比较, 避免碰撞误删
+        keep[shared] = ~frame.iloc[shared].duplicated().to_numpy()
+    if seen is not None:
+        keep &= seen.add_new(hashes)[first][inverse]
+    return keep
+
 
-def load_data(path):
-    """加载原始数据"""
-    maintenance_df = pd.read_csv(path["maintenance"])
-    stations_df = pd.read_csv(path["stations"])
-    trips_df = pd.read_csv(path["trips"])
+def unify_categories(df: pd.DataFrame, columns) -> pd.DataFrame:
+    """Give several categorical columns the same categories (in place)."""
+    categories = pd.api.types.union_categoricals([df[c] for c in columns]).categories.sort_values()
+    for c in columns:
+        df[c] = df[c].cat.set_categories(categories)
+    return df
+
+
+def read_typed_csv(path: str, schema: dict, shared=(), **kwargs):
+    """pd.read_csv with a declared schema.
+
+    Columns missing from the schema fall back to pandas' own inference.
+    With chunksize= in kwargs an iterator of typed chunks is returned.
+    """
+    reader = pd.read_csv(path, dtype=schema, **kwargs)
+    if "chunksize" in kwargs:
+        return reader
+    for columns in shared:
+        unify_categories(reader, columns)
+    return reader
+
+
+def frame_memory_mb(df: pd.DataFrame) -> float:
+    """Deep memory usage of a DataFrame in MB."""
+    return df.memory_usage(deep=True).sum() / 1024**2
+
+
+@traced("utils.load_data")
+def load_data(path, compact: bool = True):
+    """加载原始数据
+
+    Args:
+        path: dict with the maintenance, stations and trips CSV paths.
+        compact: read with the declared schemas (categoricals, float32).
+            False gives the plain pd.read_csv frames.
+    """
+    if not compact:
+        maintenance_df = pd.read_csv(path["maintenance"])
+        stations_df = pd.read_csv(path["stations"])
+        trips_df = pd.read_csv(path["trips"])
+        return maintenance_df, stations_df, trips_df
+
+    maintenance_df = read_typed_csv(path["maintenance"], MAINTENANCE_SCHEMA)
+    stations_df = read_typed_csv(path["stations"], STATIONS_SCHEMA)
+    trips_df = read_typed_csv(path["trips"], TRIPS_SCHEMA, shared=SHARED_CATEGORIES["trips"])
+    annotate(rows=len(trips_df), bytes_read=file_bytes(path["maintenance"], path["stations"], path["trips"]))
     return maintenance_df, stations_df, trips_df
 
 
+def summarize_raw_trips(trips_df: pd.DataFrame) -> dict:
+    """Counts over the raw trips that the cleaned frame can no longer give.
+
+    Returns:
+        Dict with total_rows, status_counts {status: n} and, per user_type,
+        trips {user_type: n} and unique_users {user_type: n}.
+    """
+    by_type = trips_df.groupby("user_type", observed=True)["user_id"]
+    return {
+        "total_rows": int(len(trips_df)),
+        "status_counts": {str(k): int(v) for k, v in trips_df["status"].value_counts().items()},
+        "trips": {str(k): int(v) for k, v in by_type.count().items()},
+        "unique_users": {str(k): int(v) for k, v in by_type.nunique().items()},
+    }
+
+
+@traced("utils.validate_frames")
+def validate_frames(maintenance_df, stations_df, trips_df, quarantine_dir: str = QUARANTINE_DIR):
+    """Run the validation rules over the parsed trips and maintenance records.
+
+    Rows failing any rule are written to <quarantine_dir>/trips.csv and
+    maintenance.csv with a failed_rules column; the per-rule counts go to
+    validation_summary and <quarantine_dir>/report.json.
+
+    Returns:
+        (maintenance_df, trips_df) without the quarantined rows.
+    """
+    station_ids = stations_df["station_id"].dropna().astype(str).unique()
+    results = {
+        "trips": validation.validate(trips_df, validation.TRIP_RULES, station_ids=station_ids),
+        "maintenance": validation.validate(maintenance_df, validation.MAINTENANCE_RULES),
+    }
+    validation_summary.clear()
+    for name, result in results.items():
+        validation.write_quarantine(result, os.path.join(quarantine_dir, f"{name}.csv"))
+        validation_summary[name] = result.summary()
+        validation.print_summary(name, validation_summary[name])
+    with open(os.path.join(quarantine_dir, "report.json"), "w", encoding="utf-8") as f:
+        json.dump(validation_summary, f, indent=2)
+    annotate(rows=len(trips_df) + len(maintenance_df),
+             rows_rejected=sum(summary["rejected"] for summary in validation_summary.values()))
+    return results["maintenance"].valid, results["trips"].valid
+
+
+@traced("utils.load_clean_data")
 def load_clean_data() -> pd.DataFrame:
     """数据清理函数"""
-    path = {
-        "maintenance": "data/maintenance.csv",
-        "stations": "data/stations.csv",
-        "trips": "data/trips.csv",
-        "stations_clean":"data/stations_clean.csv",
-        "trips_clean":"data/trips_clean.csv"
-    }
+    path = DATA_PATHS
 
     maintenance_df, stations_df, trips_df = load_data(path)
+    raw_trips_summary.clear()
+    raw_trips_summary.update(summarize_raw_trips(trips_df))
     print(f"-------------maintenance Before-----------------------:\n{maintenance_df.dtypes}")
     print(f"-------------trips Before-----------------------:\n{trips_df.dtypes}")
     print(f"-------------station Before-----------------------:\n{stations_df.dtypes}")
@@ -52,36 +310,333 @@ def load_clean_data() -> pd.DataFrame:
 
     print(f"-------------maintenance After-----------------------:\n{maintenance_df.dtypes}")
     print(f"-------------trips After-----------------------:\n{trips_df.dtypes}")
-    
+
+    # 规则校验：不合格的行放进 data/quarantine/，不进入清理和报告
+    maintenance_df, trips_df = validate_frames(maintenance_df, stations_df, trips_df)
 
     # 数据清理
-    valid_stationsdata = DataCleaner(stations_df).drop_nan().drop_duplicates().get_cleaned_data()
-    valid_tripsdata = DataCleaner(trips_df).drop_nan().drop_duplicates().filter_status("completed").get_cleaned_data()
+    # lazy：每一步只更新一个行掩码，最后只复制一次
+    valid_stationsdata = DataCleaner(stations_df, lazy=True).drop_nan().drop_duplicates().get_cleaned_data()
+    trips_cleaner = DataCleaner(trips_df, lazy=True).drop_nan().drop_duplicates().filter_status("completed")
+    print(f"-------------trips cleaning plan-----------------------:\n{trips_cleaner.explain().to_string(index=False)}")
+    valid_tripsdata = trips_cleaner.get_cleaned_data()
 
     valid_stationsdata.to_csv(path["stations_clean"], index=False)
     valid_tripsdata.to_csv(path["trips_clean"], index=False)
+    save_clean_cache(maintenance_df, valid_stationsdata, valid_tripsdata)
+    annotate(rows=raw_trips_summary["total_rows"], rows_written=len(valid_tripsdata))
 
     # print(valid_stationsdata.info())
     # print(valid_tripsdata.info())
     return maintenance_df.copy(),valid_stationsdata, valid_tripsdata
 # load_clean_data()
 
+# ---------------------------------------------------------------------------
+# Out-of-core streaming clean
+# ---------------------------------------------------------------------------
+
+class SpillingHashSet:
+    """Set of 64-bit row hashes with a bounded in-memory part.
+
+    New hashes go into a sorted in-memory buffer. Once the buffer holds
+    max_in_memory hashes it is written to disk as a sorted run and opened
+    again as a read-only memmap, so lookups stay a binary search per run
+    while resident memory stays bounded by the buffer size (8 bytes/hash).
+    """
+
+    def __init__(self, max_in_memory: int = 2_000_000, spill_dir: str | None = None):
+        self.max_in_memory = max_in_memory
+        self._tmpdir = tempfile.TemporaryDirectory(prefix="trip_hashes_", dir=spill_dir)
+        self._buffer = np.empty(0, dtype=np.uint64)
+        self._runs = []
+
+    def __len__(self):
+        return len(self._buffer) + sum(len(run) for run in self._runs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _contains(self, values: np.ndarray) -> np.ndarray:
+        found = np.zeros(len(values), dtype=bool)
+        for arr in (self._buffer, *self._runs):
+            if len(arr) == 0:
+                continue
+            pos = np.searchsorted(arr, values)
+            pos[pos == len(arr)] = len(arr) - 1
+            found |= arr[pos] == values
+        return found
+
+    def _spill(self) -> None:
+        path = os.path.join(self._tmpdir.name, f"run_{len(self._runs)}.npy")
+        np.save(path, self._buffer)
+        self._runs.append(np.load(path, mmap_mode="r"))
+        self._buffer = np.empty(0, dtype=np.uint64)
+
+    def add_new(self, hashes: np.ndarray) -> np.ndarray:
+        """Add hashes and return a mask of the ones not seen before.
+
+        Within the batch only the first occurrence of a hash counts as new.
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        unique, first_index = np.unique(hashes, return_index=True)
+        is_new = ~self._contains(unique)
+
+        mask = np.zeros(len(hashes), dtype=bool)
+        mask[first_index[is_new]] = True
+
+        self._buffer = np.union1d(self._buffer, unique[is_new])
+        if len(self._buffer) >= self.max_in_memory:
+            self._spill()
+        return mask
+
+    def close(self) -> None:
+        self._runs = []
+        self._tmpdir.cleanup()
+
+
+@traced("utils.stream_clean_trips")
+def stream_clean_trips(
+    src: str = DATA_PATHS["trips"],
+    dst: str = DATA_PATHS["trips_clean"],
+    chunksize: int = 200_000,
+    max_hashes_in_memory: int = 2_000_000,
+    spill_dir: str | None = None,
+    station_ids=None,
+    quarantine_path: str = os.path.join(QUARANTINE_DIR, "trips.csv"),
+) -> dict:
+    """Clean trips.csv chunk by chunk and append the result to dst.
+
+    Runs the same chain as load_clean_data (parse dates, drop_nan,
+    drop_duplicates, filter_status("completed")) on bounded chunks, with
+    duplicates tracked across chunks by a SpillingHashSet. Only one chunk
+    is held in memory at a time. Each chunk is validated first (station
+    rule only when station_ids is given) and its rejected rows are appended
+    to quarantine_path.
+
+    Returns:
+        Dict with rows_read, rows_written and the validation summary.
+    """
+    rows_read = 0
+    rows_written = 0
+    checked = {}
+    tmp = dst + ".tmp"
+    with SpillingHashSet(max_hashes_in_memory, spill_dir) as seen:
+        for i, chunk in enumerate(read_typed_csv(src, TRIPS_SCHEMA, chunksize=chunksize)):
+            rows_read += len(chunk)
+            chunk["start_time"] = pd.to_datetime(chunk["start_time"], errors="coerce")
+            chunk["end_time"] = pd.to_datetime(chunk["end_time"], errors="coerce")
+            result = validation.validate(chunk, validation.TRIP_RULES, station_ids=station_ids)
+            validation.write_quarantine(result, quarantine_path, append=i > 0)
+            validation.merge_counts(checked, result)
+
+            cleaned = (
+                DataCleaner(result.valid, lazy=True)
+                .drop_nan()
+                .drop_duplicates(seen=seen)
+                .filter_status("completed")
+                .get_cleaned_data()
+            )
+            cleaned.to_csv(tmp, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+            rows_written += len(cleaned)
+    os.replace(tmp, dst)
+    annotate(rows=rows_read, rows_written=rows_written, rows_rejected=checked.get("rejected", 0),
+             bytes_read=file_bytes(src))
+    return {"rows_read": rows_read, "rows_written": rows_written, "validation": checked}
+
+
+def stream_clean_data(chunksize: int = 200_000, **kwargs) -> dict:
+    """Out-of-core variant of load_clean_data for trip files that do not fit in RAM.
+
+    Stations are small and cleaned in memory as before; trips are streamed
+    with stream_clean_trips. Nothing is returned but the row counts, the
+    cleaned data ends up in the usual *_clean.csv files.
+    """
+    stations_df = pd.read_csv(DATA_PATHS["stations"])
+    valid_stationsdata = DataCleaner(stations_df, lazy=True).drop_nan().drop_duplicates().get_cleaned_data()
+    valid_stationsdata.to_csv(DATA_PATHS["stations_clean"], index=False)
+
+    kwargs.setdefault("station_ids", stations_df["station_id"].dropna().astype(str).unique())
+    stats = stream_clean_trips(chunksize=chunksize, **kwargs)
+    validation.print_summary("trips", stats["validation"])
+    print(f"Streamed {stats['rows_read']} trips, {stats['rows_written']} kept -> {DATA_PATHS['trips_clean']}")
+    return stats
+
+
+# ---------------------------------------------------------------------------
+# Columnar cache
+# ---------------------------------------------------------------------------
+
+def _file_fingerprint(path: str, block_size: int = 1 << 20) -> str:
+    """Content hash of a file, read in fixed-size blocks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_signature(path: str) -> dict:
+    """mtime, size and content fingerprint of one source CSV."""
+    stat = os.stat(path)
+    return {
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "fingerprint": _file_fingerprint(path),
+    }
+
+
+def _source_is_current(path: str, signature: dict) -> bool:
+    """Check a source CSV against the signature stored with the cache.
+
+    A different size means the file changed. The same mtime and size is
+    trusted without reading the file; only a changed mtime (e.g. the file
+    was touched or re-copied) costs a fingerprint pass over the content.
+    """
+    if not os.path.exists(path):
+        return False
+    stat = os.stat(path)
+    if stat.st_size != signature["size"]:
+        return False
+    if stat.st_mtime_ns == signature["mtime_ns"]:
+        return True
+    return _file_fingerprint(path) == signature["fingerprint"]
+
+
+def _encode_frame(df: pd.DataFrame) -> tuple[dict, list]:
+    """Split a DataFrame into plain NumPy arrays and a column description.
+
+    Datetimes keep their datetime64 dtype, categoricals and text columns are
+    stored as integer codes plus their categories, numbers are stored as is.
+    Nothing needs pickling, so the arrays can be loaded with allow_pickle=False.
+    """
+    arrays = {}
+    columns = []
+    for i, name in enumerate(df.columns):
+        col = df[name]
+        key = f"c{i}"
+        if isinstance(col.dtype, pd.CategoricalDtype) or col.dtype == object or pd.api.types.is_string_dtype(col.dtype):
+            kind = "category" if isinstance(col.dtype, pd.CategoricalDtype) else "string"
+            cat = col if kind == "category" else col.astype("category")
+            categories = cat.cat.categories
+            if categories.dtype == object or pd.api.types.is_string_dtype(categories.dtype):
+                categories = np.array(categories.tolist(), dtype=str)
+            else:
+                categories = categories.to_numpy()
+            arrays[key] = cat.cat.codes.to_numpy()
+            arrays[key + "_categories"] = categories
+            columns.append({"name": name, "kind": kind, "ordered": bool(cat.cat.ordered)})
+        elif isinstance(col.dtype, pd.api.extensions.ExtensionDtype) and hasattr(col.dtype, "numpy_dtype"):
+            # nullable integers (e.g. capacity: Int16): values plus NA mask
+            arrays[key] = col.to_numpy(dtype=col.dtype.numpy_dtype, na_value=0)
+            arrays[key + "_mask"] = col.isna().to_numpy()
+            columns.append({"name": name, "kind": "masked", "dtype": str(col.dtype)})
+        else:
+            arrays[key] = col.to_numpy()
+            columns.append({"name": name, "kind": "array"})
+    return arrays, columns
+
+
+def _decode_frame(arrays, columns: list) -> pd.DataFrame:
+    """Rebuild a DataFrame written by _encode_frame."""
+    data = {}
+    for i, spec in enumerate(columns):
+        key = f"c{i}"
+        if spec["kind"] == "array":
+            data[spec["name"]] = arrays[key]
+            continue
+        if spec["kind"] == "masked":
+            values = pd.array(arrays[key], dtype=spec["dtype"])
+            values[arrays[key + "_mask"]] = pd.NA
+            data[spec["name"]] = values
+            continue
+        cat = pd.Categorical.from_codes(
+            arrays[key], categories=arrays[key + "_categories"], ordered=spec["ordered"]
+        )
+        if spec["kind"] == "category":
+            data[spec["name"]] = cat
+        else:
+            data[spec["name"]] = pd.Series(cat).astype("str")
+    return pd.DataFrame(data)
+
+
+@traced("utils.save_clean_cache", rows="trips_df")
+def save_clean_cache(maintenance_df, stations_df, trips_df, cache_dir: str = CACHE_DIR) -> None:
+    """Write the cleaned frames to a binary columnar cache (.npz per frame).
+
+    The manifest records mtime, size and a content fingerprint of every
+    source CSV, so load_clean_cache can tell when the cache is out of date.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = {
+        "version": CACHE_VERSION,
+        "sources": {name: _source_signature(DATA_PATHS[name]) for name in CACHE_SOURCES},
+        "frames": {},
+        "raw_trips_summary": raw_trips_summary,
+        "validation_summary": validation_summary,
+    }
+    frames = {"maintenance": maintenance_df, "stations": stations_df, "trips": trips_df}
+    for name, df in frames.items():
+        arrays, columns = _encode_frame(df)
+        target = os.path.join(cache_dir, f"{name}.npz")
+        tmp = target + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, target)
+        manifest["frames"][name] = columns
+
+    # manifest last: a cache without a matching manifest is never used
+    manifest_path = os.path.join(cache_dir, "manifest.json")
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+@traced("utils.load_clean_cache")
+def load_clean_cache(cache_dir: str = CACHE_DIR):
+    """Load the cleaned frames from the columnar cache.
+
+    Returns:
+        (maintenance_df, stations_df, trips_df), or None when the cache is
+        missing, from another cache version, or any source CSV has changed.
+    """
+    manifest_path = os.path.join(cache_dir, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != CACHE_VERSION:
+        return None
+    for name in CACHE_SOURCES:
+        signature = manifest["sources"].get(name)
+        if signature is None or not _source_is_current(DATA_PATHS[name], signature):
+            return None
+
+    raw_trips_summary.clear()
+    raw_trips_summary.update(manifest.get("raw_trips_summary", {}))
+    validation_summary.clear()
+    validation_summary.update(manifest.get("validation_summary", {}))
+
+    frames = []
+    for name in ("maintenance", "stations", "trips"):
+        with np.load(os.path.join(cache_dir, f"{name}.npz"), allow_pickle=False) as arrays:
+            frames.append(_decode_frame(arrays, manifest["frames"][name]))
+    annotate(rows=len(frames[2]), bytes_read=file_bytes(
+        *(os.path.join(cache_dir, f"{name}.npz") for name in ("maintenance", "stations", "trips"))
+    ))
+    return tuple(frames)
+
+
 # 需要时才调用：load_clean_data()
+@traced("utils.check_and_load_clean_data")
 def check_and_load_clean_data():
-    """检查清理后的数据文件是否存在"""
-    trips_clean_path = "data/trips_clean.csv"
-    stations_clean_path = "data/stations_clean.csv"
-    maintenance_data_path = "data/maintenance.csv"
-    
-    if os.path.exists(trips_clean_path) and os.path.exists(stations_clean_path):
-        print("✓ The cleaned data file already exists; just load it directly....")
-        valid_stationsdata = pd.read_csv(stations_clean_path)
-        valid_tripsdata = pd.read_csv(trips_clean_path)
-        maintenance_copy = pd.read_csv(maintenance_data_path)
-        # 转换datetime列
-        valid_tripsdata["start_time"] = pd.to_datetime(valid_tripsdata["start_time"], errors="coerce")
-        valid_tripsdata["end_time"] = pd.to_datetime(valid_tripsdata["end_time"], errors="coerce")
-        return maintenance_copy,valid_stationsdata, valid_tripsdata
+    """Load the cleaned data from the columnar cache, cleaning again if it is stale."""
+    cached = load_clean_cache()
+    if cached is not None:
+        print("✓ The cleaned data cache is up to date; just load it directly....")
+        return cached
     else:
-        print("✗ The cleaned data file does not exist; data cleaning is now in progress ...")
-        return load_clean_data()
\ No newline at end of file
+        print("✗ The cleaned data cache is missing or out of date; data cleaning is now in progress ...")
+        return load_clean_data()
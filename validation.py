@@ -0,0 +1,190 @@
+"""
+Rule-based data-quality validation of the raw trips and maintenance records.
+
+DataCleaner only drops NaNs, exact duplicates and non-completed trips, so
+rows that are present but wrong (end_time == start_time, a duration that
+does not match the timestamps, unknown stations ...) used to reach the
+report. Every rule here is a vectorized check over column arrays that
+returns the mask of failing rows. validate() runs all rules once over the
+frame, keeps one bit per rule per row, and splits the frame a single time
+into valid and quarantined rows.
+
+A missing value never fails a rule: NaN / NaT rows are drop_nan's job.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from model import Bike, User
+
+# thresholds
+DURATION_TOLERANCE_MIN = 0.5        # |duration_minutes - (end - start)|
+MAX_TRIP_DISTANCE_KM = 100.0
+MAINTENANCE_COST_RANGE = (0.0, 1000.0)
+TRIP_STATUSES = ("completed", "cancelled")
+MAINTENANCE_TYPES = (
+    "tire_repair", "brake_adjustment",
+    "battery_replacement", "chain_lubrication",
+    "general_inspection",
+)
+
+
+@dataclass(frozen=True)
+class Rule:
+    """One data-quality rule.
+
+    check(df, context) returns a boolean array, True where a row fails.
+    context holds reference data such as the known station ids.
+    """
+    name: str
+    description: str
+    check: Callable[[pd.DataFrame, dict], np.ndarray]
+
+
+@dataclass
+class ValidationResult:
+    valid: pd.DataFrame
+    quarantined: pd.DataFrame   # failing rows plus a failed_rules column
+    counts: dict                # rule name -> failing rows (a row can fail several rules)
+    rows: int = 0
+
+    @property
+    def rejected(self) -> int:
+        return len(self.quarantined)
+
+    def summary(self) -> dict:
+        return {"rows": self.rows, "rejected": self.rejected, "rules": dict(self.counts)}
+
+
+# ---------------------------------------------------------------------------
+# Column checks
+# ---------------------------------------------------------------------------
+
+def _not_in(col: pd.Series, valid) -> np.ndarray:
+    """Non-missing values outside valid; categoricals are checked once per category."""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        invalid = ~col.cat.categories.astype(str).isin(list(valid))
+        return np.append(invalid, False)[col.cat.codes.to_numpy()]  # code -1 (NaN) -> last slot
+    return (~col.isin(list(valid)) & col.notna()).to_numpy()
+
+
+def _minutes_between(df: pd.DataFrame) -> np.ndarray:
+    delta = df["end_time"].to_numpy() - df["start_time"].to_numpy()
+    return delta / np.timedelta64(1, "m")
+
+
+def _time_order(df, context):
+    return _minutes_between(df) <= 0
+
+
+def _duration_consistency(df, context):
+    duration = df["duration_minutes"].to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.abs(duration - _minutes_between(df)) > DURATION_TOLERANCE_MIN
+
+
+def _distance_bounds(df, context):
+    distance = df["distance_km"].to_numpy(dtype=np.float64, na_value=np.nan)
+    return (distance <= 0) | (distance > MAX_TRIP_DISTANCE_KM)
+
+
+def _known_stations(df, context):
+    station_ids = context.get("station_ids")
+    if station_ids is None:
+        return np.zeros(len(df), dtype=bool)
+    return _not_in(df["start_station_id"], station_ids) | _not_in(df["end_station_id"], station_ids)
+
+
+def _trip_enums(df, context):
+    return (
+        _not_in(df["user_type"], User.VALID_TYPES)
+        | _not_in(df["bike_type"], Bike.VALID_TYPES)
+        | _not_in(df["status"], TRIP_STATUSES)
+    )
+
+
+def _cost_range(df, context):
+    low, high = MAINTENANCE_COST_RANGE
+    cost = df["cost"].to_numpy(dtype=np.float64, na_value=np.nan)
+    return (cost < low) | (cost > high)
+
+
+def _maintenance_enums(df, context):
+    return _not_in(df["bike_type"], Bike.VALID_TYPES) | _not_in(df["maintenance_type"], MAINTENANCE_TYPES)
+
+
+TRIP_RULES = [
+    Rule("time_order", "end_time must be after start_time", _time_order),
+    Rule("duration_consistency",
+         f"duration_minutes within {DURATION_TOLERANCE_MIN} min of end_time - start_time", _duration_consistency),
+    Rule("distance_bounds", f"0 < distance_km <= {MAX_TRIP_DISTANCE_KM:g}", _distance_bounds),
+    Rule("known_stations", "start and end station ids exist in stations.csv", _known_stations),
+    Rule("valid_enums", "user_type, bike_type and status take known values", _trip_enums),
+]
+
+MAINTENANCE_RULES = [
+    Rule("cost_range", f"cost within {MAINTENANCE_COST_RANGE[0]:g} .. {MAINTENANCE_COST_RANGE[1]:g}", _cost_range),
+    Rule("valid_enums", "bike_type and maintenance_type take known values", _maintenance_enums),
+]
+
+
+# ---------------------------------------------------------------------------
+# Running the rules
+# ---------------------------------------------------------------------------
+
+def validate(df: pd.DataFrame, rules: list, **context) -> ValidationResult:
+    """Run every rule over df and split it into valid and quarantined rows.
+
+    Args:
+        df: the frame to check, with dates already parsed.
+        rules: TRIP_RULES, MAINTENANCE_RULES or a custom list of Rule.
+        **context: reference data for the rules, e.g. station_ids=...
+
+    Returns:
+        ValidationResult; quarantined rows keep their index and get a
+        failed_rules column ("time_order;duration_consistency").
+    """
+    if len(rules) > 32:
+        raise ValueError("at most 32 rules per validate() call")
+    failed = np.zeros(len(df), dtype=np.uint32)   # bit i set = rule i failed
+    counts = {}
+    for i, rule in enumerate(rules):
+        mask = np.asarray(rule.check(df, context), dtype=bool)
+        counts[rule.name] = int(mask.sum())
+        failed |= mask.astype(np.uint32) << np.uint32(i)
+
+    bad = failed != 0
+    if not bad.any():
+        return ValidationResult(df, df.iloc[:0].assign(failed_rules=np.array([], dtype=str)), counts, len(df))
+
+    # one label per distinct combination of failed rules, not per row
+    combos, inverse = np.unique(failed[bad], return_inverse=True)
+    labels = np.array([";".join(r.name for i, r in enumerate(rules) if combo >> i & 1) for combo in combos])
+    quarantined = df[bad].assign(failed_rules=labels[inverse])
+    return ValidationResult(df[~bad], quarantined, counts, len(df))
+
+
+def write_quarantine(result: ValidationResult, path: str, append: bool = False) -> None:
+    """Write (or append) the quarantined rows to a CSV file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    header = not (append and os.path.exists(path))
+    result.quarantined.to_csv(path, mode="a" if append else "w", header=header, index=False)
+
+
+def merge_counts(total: dict, result: ValidationResult) -> dict:
+    """Add a result's summary to a running total (for chunked validation)."""
+    total["rows"] = total.get("rows", 0) + result.rows
+    total["rejected"] = total.get("rejected", 0) + result.rejected
+    rules = total.setdefault("rules", {})
+    for name, n in result.counts.items():
+        rules[name] = rules.get(name, 0) + n
+    return total
+
+
+def print_summary(name: str, summary: dict) -> None:
+    print(f"Validation of {name}: {summary['rejected']} of {summary['rows']} rows quarantined")
+    for rule, n in summary["rules"].items():
+        print(f"  {rule:<22} {n:>10}")
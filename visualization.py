@@ -9,36 +9,168 @@ Students should create at least 4 charts:
 
 All charts must have: title, axis labels, legend (where applicable).
 Export each chart as PNG to output/figures/.
+
+Every figure is a FigureJob carrying a small aggregate: the four main
+charts (main_figure_jobs) as well as the large sets, one chart per station
+/ per month. render_figures draws jobs in a process pool on the Agg
+backend, and skips a job whose aggregate hash matches the last rendered
+PNG.
 """
 
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import matplotlib
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
+from instrumentation import traced
+
 # __file__当前文件，- .resolve() → 转成绝对路径
 FIGURES_DIR = Path(__file__).resolve().parent / "output" / "figures"
 
-# resolve() → 转成绝对路径， parent → 当前文件所在的文件夹，close()结束编辑
-def _save_figure(fig: plt.Figure, filename: str) -> None:
-    """Save a Matplotlib figure to the figures directory."""
-    FIGURES_DIR.mkdir(parents=True, exist_ok=True)
-    filepath = FIGURES_DIR / filename
-    fig.savefig(filepath, dpi=150, bbox_inches="tight")
-    plt.close(fig)
-    print(f"Saved: {filepath}")
+# ---------------------------------------------------------------------------
+# Plot summaries
+# ---------------------------------------------------------------------------
+# The duration histogram, the box plot and the monthly trend are drawn from
+# these compact summaries instead of raw trip rows, so rendering cost does
+# not grow with the number of trips. PlotSummaryBuilder produces the same
+# summaries chunk by chunk for data that is streamed.
+
+def _clipped_counts(values: np.ndarray, edges: np.ndarray) -> tuple:
+    """Histogram counts with values outside the edges put into the first / last bin.
+
+    Returns:
+        (counts, below, above): below / above are how many values were
+        moved into the first / last bin.
+    """
+    values = values[~np.isnan(values)]
+    below = int(np.count_nonzero(values < edges[0]))
+    above = int(np.count_nonzero(values > edges[-1]))
+    counts = np.histogram(np.clip(values, edges[0], edges[-1]), bins=edges)[0]
+    return counts, below, above
+
+
+def _histogram_frame(edges: np.ndarray, counts: np.ndarray, below: int, above: int) -> pd.DataFrame:
+    frame = pd.DataFrame({"left": edges[:-1], "right": edges[1:], "count": counts})
+    frame.attrs["clipped"] = {"below": below, "above": above}
+    return frame
+
+
+def duration_histogram_summary(durations, bins: int = 30, value_range: tuple | None = None) -> pd.DataFrame:
+    """Fixed-bin histogram: one row per bin with left, right and count.
+
+    With a value_range, values outside it are counted in the first / last
+    bin, and attrs["clipped"] says how many ({"below": n, "above": n}).
+    """
+    values = np.asarray(durations, dtype=np.float64)
+    edges = np.histogram_bin_edges(values[~np.isnan(values)], bins=bins, range=value_range)
+    return _histogram_frame(edges, *_clipped_counts(values, edges))
+
+
+def _five_numbers(values: np.ndarray, max_fliers: int) -> dict | None:
+    """bxp stats of values; None for an empty group."""
+    if len(values) == 0:
+        return None
+    # same whisker rule as matplotlib's boxplot (whis=1.5)
+    q1, med, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    fliers = np.sort(values[(values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)])
+    if len(fliers) > max_fliers:
+        # keep the most extreme ones on both ends
+        fliers = np.concatenate([fliers[: max_fliers // 2], fliers[len(fliers) - max_fliers // 2:]])
+    return {
+        "whislo": inside.min(), "q1": q1, "med": med, "q3": q3, "whishi": inside.max(),
+        "count": len(values), "fliers": fliers,
+    }
+
+
+def box_summary(trips: pd.DataFrame, column: str = "duration_minutes", by: str = "user_type",
+                max_fliers: int = 200) -> pd.DataFrame:
+    """Five-number summary per group (whislo, q1, med, q3, whishi, count, fliers).
+
+    At most max_fliers outliers per group are kept, so the summary stays
+    small however many trips there are. Groups without a value are left out.
+    """
+    values = trips[column].to_numpy(dtype=np.float64)
+    codes, groups = pd.factorize(trips[by], sort=True)
+    rows = {
+        str(group): _five_numbers(values[(codes == code) & ~np.isnan(values)], max_fliers)
+        for code, group in enumerate(groups)
+    }
+    rows = {group: row for group, row in rows.items() if row is not None}
+    return pd.DataFrame.from_dict(rows, orient="index").rename_axis(by)
+
+
+def monthly_counts_summary(trips: pd.DataFrame) -> pd.Series:
+    """Trip count per year-month ("2024-01" ...), sorted by month."""
+    months = trips["start_time"].to_numpy(dtype="datetime64[M]")
+    labels, counts = np.unique(months[~np.isnat(months)], return_counts=True)
+    return pd.Series(counts, index=pd.Index(labels.astype("str"), name="year_month"), name="trip_count")
+
+
+class PlotSummaryBuilder:
+    """Build the plot summaries while streaming trip chunks.
+
+    The histogram needs a fixed value_range up front so chunk counts can be
+    added; durations outside it are counted in the first / last bin and
+    reported in histogram().attrs["clipped"]. Box-plot quartiles come from KLL sketches (no fliers, whiskers
+    clipped to the data range).
+    """
+
+    def __init__(self, bins: int = 30, value_range: tuple = (0.0, 200.0), by: str = "user_type"):
+        from sketches import DurationQuantiles
+
+        self.edges = np.linspace(value_range[0], value_range[1], bins + 1)
+        self.hist = np.zeros(bins, dtype=np.int64)
+        self.below = 0
+        self.above = 0
+        self.by = by
+        self.quantiles = DurationQuantiles(by=(by,))
+        self.months = pd.Series(dtype=np.int64)
+
+    def update(self, trips: pd.DataFrame) -> "PlotSummaryBuilder":
+        durations = trips["duration_minutes"].to_numpy(dtype=np.float64)
+        counts, below, above = _clipped_counts(durations, self.edges)
+        self.hist += counts
+        self.below += below
+        self.above += above
+        self.quantiles.update(trips)
+        self.months = self.months.add(monthly_counts_summary(trips), fill_value=0).astype(np.int64)
+        return self
+
+    def histogram(self) -> pd.DataFrame:
+        return _histogram_frame(self.edges, self.hist, self.below, self.above)
+
+    def box(self) -> pd.DataFrame:
+        rows = {}
+        for (group, value), sketch in sorted(self.quantiles.sketches.items()):
+            if group != self.by:
+                continue
+            q1, med, q3 = sketch.quantile([0.25, 0.5, 0.75])
+            iqr = q3 - q1
+            rows[value] = {
+                "whislo": max(sketch.min, q1 - 1.5 * iqr), "q1": q1, "med": med, "q3": q3,
+                "whishi": min(sketch.max, q3 + 1.5 * iqr), "count": sketch.n, "fliers": np.empty(0),
+            }
+        return pd.DataFrame.from_dict(rows, orient="index").rename_axis(self.by)
+
+    def monthly(self) -> pd.Series:
+        return self.months.sort_index().rename_axis("year_month").rename("trip_count")
 
 
 # ---------------------------------------------------------------------------
 # 1. Bar chart (provided as example)
 # ---------------------------------------------------------------------------
 
-def plot_trips_per_station(trips: pd.DataFrame, stations: pd.DataFrame) -> None:
-    """Bar chart showing the number of trips starting at each station.
-
-    Args:
-        trips: Cleaned trips DataFrame.
-        stations: Stations DataFrame (for station names).
-    """
+def trips_per_station_job(trips: pd.DataFrame, stations: pd.DataFrame) -> "FigureJob":
+    """Bar chart job of the 10 stations with the most departures."""
     counts = (
         trips["start_station_id"]
         .value_counts()
@@ -53,119 +185,298 @@ def plot_trips_per_station(trips: pd.DataFrame, stations: pd.DataFrame) -> None:
         on="station_id",
         how="left",
     )
+    data = pd.Series(merged["trip_count"].to_numpy(), index=pd.Index(merged["station_name"], name="station_name"))
+    return FigureJob("barh", data, "trips_per_station.png", title="Top 10 Start Stations by Trip Count",
+                     xlabel="Number of Trips", ylabel="Station")
 
-    #fig, 即代表整张图像，整图的大小，布局，保存，ax，真正画图的地方，x/y轴，标题，刻度，颜色..
-    fig, ax = plt.subplots(figsize=(10, 5))
-    ax.barh(merged["station_name"], merged["trip_count"], color="steelblue")
-    ax.set_xlabel("Number of Trips")
-    ax.set_ylabel("Station")
-    ax.set_title("Top 10 Start Stations by Trip Count")
-    ax.invert_yaxis()
-    _save_figure(fig, "trips_per_station.png")
+
+@traced("visualization.plot_trips_per_station", rows="trips")
+def plot_trips_per_station(trips: pd.DataFrame, stations: pd.DataFrame) -> None:
+    """Bar chart showing the number of trips starting at each station.
+
+    Args:
+        trips: Cleaned trips DataFrame.
+        stations: Stations DataFrame (for station names).
+    """
+    _save_job(trips_per_station_job(trips, stations))
 
 
 # ---------------------------------------------------------------------------
 # 2. Line chart — monthly trend
 # ---------------------------------------------------------------------------
 
-def plot_monthly_trend(trips: pd.DataFrame) -> None:
+def monthly_trend_job(trips: pd.DataFrame | None = None, summary: pd.Series | None = None) -> "FigureJob":
+    """Line chart job of the monthly trip counts."""
+    # Period 类型不能直接用于 Matplotlib 的 x 轴，所以 summary 的 index 直接是 "2024-01" 这样的字符串
+    if summary is None:
+        summary = monthly_counts_summary(trips)
+    # marker="o" 在页面加点
+    return FigureJob("line", summary, "monthly_trip_counts.png", title="Monthly Trip Count in 2024",
+                     xlabel="Year - Month", ylabel="Trip Counts", options={"marker": "o", "color": "blue"})
+
+
+@traced("visualization.plot_monthly_trend", rows="trips")
+def plot_monthly_trend(trips: pd.DataFrame | None = None, summary: pd.Series | None = None) -> None:
     """Line chart of monthly trip counts.
 
-    TODO:
-        - Extract year-month from start_time
-        - Group and count
-        - Plot a line chart
-        - Save as 'monthly_trend.png'
+    Args:
+        trips: cleaned trips, used only when no summary is given.
+        summary: monthly_counts_summary / PlotSummaryBuilder.monthly().
     """
-    # Period 类型不能直接用于 Matplotlib 的 x 轴, index 是value_counts的列，所以这里是时间
-    #  peak_usage_hours = peak_df.reset_index(name = "counts") 这里改过名，回头在研究一下吧
-    monthly_counts = (
-    trips["start_time"]
-        .dt.to_period("M")
-        .value_counts()
-        .sort_index()
-        .reset_index()
-        .rename(columns={"start_time": "year_month", "count": "trip_count"})
-)
-    
-    monthly_counts["year_month"] = monthly_counts["year_month"].astype(str)
-
-    fig, ax = plt.subplots(figsize=(10, 5))
-    # marker="o" 在页面加点
-    ax.plot(monthly_counts["year_month"], monthly_counts["trip_count"], marker="o",color="blue")
-    ax.set_title("Monthly Trip Count in 2024")
-    ax.set_xlabel("Year - Month")
-    ax.set_ylabel("Trip Counts")
-    
-    _save_figure(fig, "monthly_trip_counts.png")
-    
-    # for test
-    # return monthly_counts  
-
-  
+    _save_job(monthly_trend_job(trips, summary))
+
 
 # ---------------------------------------------------------------------------
 # 3. Histogram — trip duration distribution
 # ---------------------------------------------------------------------------
 
-def plot_duration_histogram(trips: pd.DataFrame) -> None:
+def duration_histogram_job(trips: pd.DataFrame | None = None, summary: pd.DataFrame | None = None) -> "FigureJob":
+    """Histogram job of the trip durations."""
+    # bins = (max - min)/30 ,在这里（200 -0）/30
+    if summary is None:
+        summary = duration_histogram_summary(trips["duration_minutes"], bins=30)
+    return FigureJob("hist", summary, "duration_histogram.png", title="Distribution of Trip Durations",
+                     xlabel="Duration - Minutes", ylabel="Number of Trips")
+
+
+@traced("visualization.plot_duration_histogram", rows="trips")
+def plot_duration_histogram(trips: pd.DataFrame | None = None, summary: pd.DataFrame | None = None) -> None:
     """Histogram of trip durations.
 
-    TODO:
-        - Use trips["duration_minutes"]
-        - Choose an appropriate number of bins bins:区间数量
-        - Add title, axis labels
-        - Save as 'duration_histogram.png'
+    Args:
+        trips: cleaned trips, used only when no summary is given.
+        summary: duration_histogram_summary / PlotSummaryBuilder.histogram().
     """
-    durations = trips["duration_minutes"]
+    _save_job(duration_histogram_job(trips, summary))
 
-    fig, ax = plt.subplots(figsize=(10, 5))
 
-    # bins = (max - min)/30 ,在这里（200 -0）/30
-    ax.hist(durations, bins=30, color="steelblue", edgecolor="white")
-    ax.set_title("Distribution of Trip Durations")
-    ax.set_xlabel("Duration - Minutes")
-    ax.set_ylabel("Number of Trips")
-    ax.grid(axis="y", linestyle="--", alpha=0.5)
+# ---------------------------------------------------------------------------
+# 4. Box plot — duration by user type
+# ---------------------------------------------------------------------------
+
+def duration_by_user_type_job(trips: pd.DataFrame | None = None, summary: pd.DataFrame | None = None) -> "FigureJob":
+    """Box plot job of the trip durations per user type."""
+    if summary is None:
+        summary = box_summary(trips, "duration_minutes", "user_type")
+    return FigureJob("box", summary, "duration_by_user_type.png", title="Trip Duration by User Type",
+                     xlabel="User Type", ylabel="Duration (minutes)")
 
-    _save_figure(fig, "duration_histogram.png")
 
+@traced("visualization.plot_duration_by_user_type", rows="trips")
+def plot_duration_by_user_type(trips: pd.DataFrame | None = None, summary: pd.DataFrame | None = None) -> None:
+    """Box plot comparing trip durations across user types.
+
+    Args:
+        trips: cleaned trips, used only when no summary is given.
+        summary: box_summary / PlotSummaryBuilder.box(); groups with a
+            count of 0 are not drawn.
+    """
+    _save_job(duration_by_user_type_job(trips, summary))
+
+
+def main_figure_jobs(trips: pd.DataFrame, stations: pd.DataFrame) -> list["FigureJob"]:
+    """The four main charts as jobs for render_figures."""
+    return [
+        trips_per_station_job(trips, stations),
+        monthly_trend_job(trips),
+        duration_histogram_job(trips),
+        duration_by_user_type_job(trips),
+    ]
 
 
 # ---------------------------------------------------------------------------
-# 4. Box plot — duration by user type
+# Batch rendering
 # ---------------------------------------------------------------------------
 
-def plot_duration_by_user_type(trips: pd.DataFrame) -> None:
-    """Box plot comparing trip durations across user types.
+RENDER_MANIFEST = ".render_manifest.json"
 
-    TODO:
-        - Group data by user_type
-        - Create side-by-side box plots
-        - Add title, axis labels
-        - Save as 'duration_by_user_type.png'
+
+@dataclass
+class FigureJob:
+    """One figure to render from a pre-aggregated Series or summary frame.
+
+    Args:
+        kind: "barh", "bar", "line" (Series, index = labels / x values),
+            "hist" (duration_histogram_summary) or "box" (box_summary),
+            see _DRAWERS.
+        data: aggregate to plot.
+        filename: PNG name, may contain a sub-directory.
+        title, xlabel, ylabel: chart texts.
     """
+    kind: str
+    data: pd.Series | pd.DataFrame
+    filename: str
+    title: str = ""
+    xlabel: str = ""
+    ylabel: str = ""
+    options: dict = field(default_factory=dict)
+
+    def digest(self) -> str:
+        """Hash of everything that ends up in the PNG."""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(json.dumps([self.kind, self.title, self.xlabel, self.ylabel, self.options], sort_keys=True,
+                            default=str).encode())
+        if isinstance(self.data, pd.DataFrame):
+            h.update(json.dumps([list(map(str, self.data.columns)), self.data.attrs], sort_keys=True,
+                                default=str).encode())
+            for column in self.data.columns:
+                _hash_series(h, self.data[column])
+        else:
+            _hash_series(h, self.data)
+        return h.hexdigest()
+
+
+def _hash_series(h, data: pd.Series) -> None:
+    h.update(np.asarray(data.index.astype("str")).astype("U").tobytes())
+    if data.dtype == object:
+        # box_summary fliers: one array per row
+        for value in data:
+            h.update(np.asarray(value, dtype=np.float64).tobytes() + b"|")
+    else:
+        h.update(np.ascontiguousarray(data.to_numpy(dtype=np.float64)).tobytes())
+
+
+def _draw_barh(ax, data, **options):
+    ax.barh(data.index.astype("str"), data.to_numpy(), color=options.get("color", "steelblue"))
+    ax.invert_yaxis()
+
 
-    fig, ax = plt.subplots(figsize=(10, 5))
+def _draw_bar(ax, data, **options):
+    ax.bar(data.index.astype("str"), data.to_numpy(), color=options.get("color", "steelblue"))
 
+
+def _draw_line(ax, data, **options):
+    ax.plot(data.index.astype("str"), data.to_numpy(), marker=options.get("marker", "o"),
+            color=options.get("color", "blue"))
+    if len(data) > 12:
+        ax.tick_params(axis="x", labelrotation=90, labelsize=7)
+
+
+def _draw_hist(ax, data, **options):
+    edges = np.append(data["left"].to_numpy(), data["right"].iloc[-1])
+    # one weighted sample per bin draws the same bars as the raw values would
+    ax.hist(data["left"], bins=edges, weights=data["count"], color="steelblue", edgecolor="white")
+    ax.grid(axis="y", linestyle="--", alpha=0.5)
+    # 超出范围的行程算在首尾两个柱子里, 图上注明数量
+    clipped = data.attrs.get("clipped", {})
+    notes = [f"{clipped[side]} trips {sign} {edge:g} min counted in the {which} bin"
+             for side, sign, edge, which in (("below", "<", edges[0], "first"), ("above", ">", edges[-1], "last"))
+             if clipped.get(side)]
+    if notes:
+        ax.text(0.99, 0.97, "\n".join(notes), transform=ax.transAxes, ha="right", va="top", fontsize=8)
+
+
+def _draw_box(ax, data, **options):
+    stats = [{"label": label, **row} for label, row in data.to_dict(orient="index").items() if row["count"] > 0]
     # - patch_artist=True → 允许填充颜色,- boxprops → 设置箱子的颜色,ax -> 用我的ax，不是新建
-    # 
-    trips.boxplot(
-        column="duration_minutes",
-        by="user_type",
-        ax=ax,
-        grid=False,
+    # bxp 画的是已经算好的五数概括，不需要原始数据
+    ax.bxp(
+        stats,
         patch_artist=True,
-        boxprops=dict(facecolor="lightsteelblue")
+        boxprops=dict(facecolor="lightsteelblue"),
+        flierprops=dict(marker="o", markerfacecolor="none"),
     )
 
-    ax.set_title("Trip Duration by User Type")
-    ax.set_xlabel("User Type")
-    ax.set_ylabel("Duration (minutes)")
 
-    # 去掉 pandas 自动加的副标题
-    plt.suptitle("")
+_DRAWERS = {"barh": _draw_barh, "bar": _draw_bar, "line": _draw_line, "hist": _draw_hist, "box": _draw_box}
+
+
+def _render_job(job: FigureJob, out_dir: str) -> str:
+    """Draw and save one job (runs inside a worker process)."""
+    fig, ax = plt.subplots(figsize=job.options.get("figsize", (10, 5)))
+    _DRAWERS[job.kind](ax, job.data, **job.options)
+    ax.set_title(job.title)
+    ax.set_xlabel(job.xlabel)
+    ax.set_ylabel(job.ylabel)
+    path = Path(out_dir) / job.filename
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fig.savefig(path, dpi=job.options.get("dpi", 150), bbox_inches="tight")
+    plt.close(fig)
+    return str(path)
+
+
+def _save_job(job: FigureJob) -> None:
+    """Render one job to FIGURES_DIR right away (no manifest check)."""
+    print(f"Saved: {_render_job(job, str(FIGURES_DIR))}")
 
-    _save_figure(fig, "duration_by_user_type.png")
 
-  
\ No newline at end of file
+def _init_worker():
+    matplotlib.use("Agg")
+
+
+@traced("visualization.render_figures", rows="jobs")
+def render_figures(jobs, workers: int | None = None, out_dir: Path = FIGURES_DIR, force: bool = False) -> dict:
+    """Render many figures in parallel, skipping the ones that are up to date.
+
+    The manifest in out_dir maps each PNG to the hash of the aggregate it
+    was drawn from; a job with the same hash and an existing PNG is skipped.
+
+    Args:
+        jobs: iterable of FigureJob.
+        workers: process count (default: os.cpu_count()); 1 renders inline.
+        out_dir: target directory.
+        force: render everything regardless of the manifest.
+
+    Returns:
+        Dict with the rendered and skipped filenames.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / RENDER_MANIFEST
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+
+    todo, skipped, digests = [], [], {}
+    for job in jobs:
+        digests[job.filename] = job.digest()
+        if not force and manifest.get(job.filename) == digests[job.filename] and (out_dir / job.filename).exists():
+            skipped.append(job.filename)
+        else:
+            todo.append(job)
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(todo) <= 1:
+        for job in todo:
+            _render_job(job, str(out_dir))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            # consume the results so worker errors are raised here
+            list(pool.map(_render_job, todo, [str(out_dir)] * len(todo), chunksize=max(1, len(todo) // (workers * 4))))
+
+    for job in todo:
+        manifest[job.filename] = digests[job.filename]
+    manifest_path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    print(f"Rendered {len(todo)} figures, {len(skipped)} unchanged -> {out_dir}")
+    return {"rendered": [job.filename for job in todo], "skipped": skipped}
+
+
+def station_figure_jobs(trips: pd.DataFrame, stations: pd.DataFrame | None = None) -> list[FigureJob]:
+    """One hourly departures bar chart per start station.
+
+    All stations are aggregated by a single groupby before any drawing.
+    """
+    counts = (
+        trips.groupby([trips["start_station_id"].astype("str").to_numpy(), trips["start_time"].dt.hour.to_numpy()])
+        .size()
+        .unstack(fill_value=0)
+        .reindex(columns=range(24), fill_value=0)
+    )
+    names = {}
+    if stations is not None:
+        names = dict(zip(stations["station_id"].astype("str"), stations["station_name"]))
+    return [
+        FigureJob("bar", row.rename_axis("hour"), f"stations/{station_id}_hourly.png",
+                  title=f"Hourly Departures - {names.get(station_id, station_id)}",
+                  xlabel="Hour of Day", ylabel="Number of Trips")
+        for station_id, row in counts.iterrows()
+    ]
+
+
+def monthly_figure_jobs(trips: pd.DataFrame) -> list[FigureJob]:
+    """One daily trip count line chart per month."""
+    start = trips["start_time"]
+    counts = trips.groupby([start.dt.to_period("M").astype("str").to_numpy(), start.dt.day.to_numpy()]).size()
+    return [
+        FigureJob("line", days.droplevel(0), f"months/{month}_daily.png",
+                  title=f"Daily Trip Count - {month}", xlabel="Day of Month", ylabel="Trip Counts")
+        for month, days in counts.groupby(level=0)
+    ]